@@ -0,0 +1,114 @@
+"""
+List query benchmark: BrainDump rows with and without the search columns.
+
+Creates a user with synthetic brain dumps (embeddings, compact embeddings
+and blind index tokens filled like the app does), then times the queries
+behind the list pages (brain_dump_list, the API list, save_post) through
+BrainDump.objects, which defers SEARCH_FIELDS, and through with_vectors(),
+which loads them as every query did before. Reports p50/p99 latency and
+the bytes of row data each query returns. Run against a scratch database;
+the benchmark user is deleted afterwards:
+
+    DJANGO_SETTINGS_MODULE=project.settings.local python benchmarks/deferred_vectors.py --dumps 1000 --page 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from brain_dump_app.blind_index import token_hashes  # noqa: E402
+from brain_dump_app.embeddings import compact_embedding  # noqa: E402
+from brain_dump_app.models import BrainDump  # noqa: E402
+
+DIMENSIONS = 1536
+EMAIL = "bench-deferred@example.com"
+
+
+def create_dumps(user, count):
+    text = "a few sentences of transcription about nothing in particular " * 10
+    created = 0
+    while created < count:
+        batch = []
+        for _ in range(min(500, count - created)):
+            vector = [random.random() - 0.5 for _ in range(DIMENSIONS)]
+            batch.append(
+                BrainDump(
+                    user=user,
+                    transcription=text,
+                    transcription_tokens=token_hashes(text),
+                    embedding=vector,
+                    embedding_compact=compact_embedding(vector),
+                )
+            )
+        BrainDump.objects.bulk_create(batch)
+        created += len(batch)
+        print(f"  {created} dumps created", end="\r", flush=True)
+    print()
+
+
+def row_bytes(queryset):
+    # Size of the rows the query returns, as stored
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT sum(pg_column_size(q.*)) FROM ({sql}) q", params)
+        return cursor.fetchone()[0] or 0
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dumps", type=int, default=1000)
+    parser.add_argument("--page", type=int, default=50, help="Rows per list page")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(0)
+    User = get_user_model()
+    User.objects.filter(email=EMAIL).delete()
+    user = User.objects.create(email=EMAIL, username="benchdeferred")
+    try:
+        create_dumps(user, args.dumps)
+        queries = {
+            "list page": lambda manager: manager.filter(user=user).order_by(
+                "-created_at"
+            )[: args.page],
+            "all rows": lambda manager: manager.filter(user=user),
+        }
+        print(f"{'query':>10} {'columns':>14} {'p50 ms':>8} {'p99 ms':>8} {'KB':>10}")
+        for name, build in queries.items():
+            for label, manager in (
+                ("with vectors", BrainDump.objects.with_vectors()),
+                ("deferred", BrainDump.objects.all()),
+            ):
+                latencies = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    list(build(manager))
+                    latencies.append((time.perf_counter() - start) * 1000)
+                size = row_bytes(build(manager)) / 1024
+                print(
+                    f"{name:>10} {label:>14} {percentile(latencies, 0.5):>8.1f} "
+                    f"{percentile(latencies, 0.99):>8.1f} {size:>10.0f}"
+                )
+    finally:
+        user.delete()
+
+
+if __name__ == "__main__":
+    main()
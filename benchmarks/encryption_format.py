@@ -0,0 +1,74 @@
+"""
+Encryption format benchmark: legacy Fernet tokens vs AES-GCM v1 bytes.
+
+For typical EncryptedTextField values (OAuth tokens, chunk texts, full
+transcriptions) reports the stored size per value in each format and
+encrypt/decrypt throughput in MB of plaintext per second. Needs no
+database:
+
+    DJANGO_SETTINGS_MODULE=project.settings.local python benchmarks/encryption_format.py --sizes 100,1000,5000,50000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from brain_dump_app.fields import decrypt, encrypt, get_cipher_suite  # noqa: E402
+
+
+def fernet_encrypt(text):
+    return get_cipher_suite().encrypt(text.encode("utf-8"))
+
+
+def throughput(function, values, size, repeat):
+    best = min(timed(function, values) for _ in range(repeat))
+    return len(values) * size / best / 1e6
+
+
+def timed(function, values):
+    start = time.perf_counter()
+    for value in values:
+        function(value)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", default="100,1000,5000,50000", help="Plaintext bytes"
+    )
+    parser.add_argument("--values", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{'bytes':>7} {'format':>8} {'stored':>8} {'overhead':>9} "
+        f"{'enc MB/s':>9} {'dec MB/s':>9}"
+    )
+    for size in [int(size) for size in args.sizes.split(",") if size]:
+        texts = [
+            (f"{index:08d} " + "word " * (size // 5 + 1))[:size]
+            for index in range(args.values)
+        ]
+        for name, encrypt_value in (("fernet", fernet_encrypt), ("aes-gcm", encrypt)):
+            tokens = [encrypt_value(text) for text in texts]
+            for text, token in zip(texts, tokens):
+                assert decrypt(token) == text
+            stored = len(tokens[0])
+            print(
+                f"{size:>7} {name:>8} {stored:>8} {stored - size:>9} "
+                f"{throughput(encrypt_value, texts, size, args.repeat):>9.1f} "
+                f"{throughput(decrypt, tokens, size, args.repeat):>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Job queue throughput benchmark.
+
+Enqueues a batch of no-op jobs and measures how fast a WorkerPool drains
+them at different thread counts. Run against a scratch database:
+
+    DJANGO_SETTINGS_MODULE=project.settings.local python benchmarks/job_queue_throughput.py --jobs 2000 --workers 1,2,4,8,16
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from jobs_app.models import Job  # noqa: E402
+from jobs_app.queue import job  # noqa: E402
+from jobs_app.worker import WorkerPool  # noqa: E402
+
+BENCHMARK_QUEUE = "benchmark"
+
+
+@job(name="benchmarks.sleep", queue=BENCHMARK_QUEUE)
+def sleep_task(seconds=0.0):
+    if seconds:
+        time.sleep(seconds)
+
+
+def run_round(jobs, workers, work_seconds):
+    Job.objects.filter(queue=BENCHMARK_QUEUE).delete()
+    Job.objects.bulk_create(
+        [
+            Job(
+                queue=BENCHMARK_QUEUE,
+                task_name=sleep_task.task_name,
+                payload={"seconds": work_seconds},
+                timeout=60,
+            )
+            for _ in range(jobs)
+        ],
+        batch_size=1000,
+    )
+
+    pool = WorkerPool(
+        queues=[BENCHMARK_QUEUE],
+        concurrency=workers,
+        poll_interval=0.05,
+        max_jobs=jobs,
+    )
+    start = time.perf_counter()
+    pool.run()
+    elapsed = time.perf_counter() - start
+
+    succeeded = Job.objects.filter(
+        queue=BENCHMARK_QUEUE, status=Job.SUCCEEDED
+    ).count()
+    Job.objects.filter(queue=BENCHMARK_QUEUE).delete()
+    return succeeded, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument(
+        "--workers", default="1,2,4,8", help="Comma separated thread counts"
+    )
+    parser.add_argument(
+        "--work-ms",
+        type=float,
+        default=0.0,
+        help="Simulated work per job in milliseconds (e.g. 50 for an API call)",
+    )
+    args = parser.parse_args()
+
+    if settings.JOB_QUEUE_EAGER:
+        parser.error("JOB_QUEUE_EAGER is enabled; disable it to benchmark workers.")
+
+    print(f"{'workers':>8} {'jobs':>8} {'seconds':>10} {'jobs/sec':>10}")
+    for workers in [int(w) for w in args.workers.split(",") if w]:
+        succeeded, elapsed = run_round(args.jobs, workers, args.work_ms / 1000.0)
+        print(f"{workers:>8} {succeeded:>8} {elapsed:>10.2f} {succeeded / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+List pagination benchmark: Paginator (COUNT + OFFSET) vs keyset pages.
+
+Creates a user with --dumps brain dumps spread over the past years, then
+times fetching pages at increasing depth of brain_dump_list the way it was
+paged before (Paginator over the TruncDate-annotated, date-sorted queryset:
+a COUNT(*) plus OFFSET) and with keyset_page() from the cursor of the
+previous page. Reports p50/p99 latency per depth. Run against a scratch
+database; the benchmark user is deleted afterwards:
+
+    DJANGO_SETTINGS_MODULE=project.settings.local python benchmarks/keyset_pagination.py --dumps 50000 --page 20
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.paginator import Paginator  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models.functions import TruncDate  # noqa: E402
+
+from brain_dump_app.models import BrainDump  # noqa: E402
+from brain_dump_app.pagination import ORDERING, encode_cursor, keyset_page  # noqa: E402
+
+EMAIL = "bench-keyset@example.com"
+
+
+def create_dumps(user, count):
+    text = "a few sentences of transcription about nothing in particular " * 5
+    created = 0
+    while created < count:
+        batch = [
+            BrainDump(user=user, transcription=text)
+            for _ in range(min(1000, count - created))
+        ]
+        BrainDump.objects.bulk_create(batch)
+        created += len(batch)
+        print(f"  {created} dumps created", end="\r", flush=True)
+    print()
+    # created_at is set on insert; spread the rows 37 minutes apart instead
+    table = BrainDump._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} AS d "
+            "SET created_at = now() - make_interval(mins => n.row * 37) "
+            f"FROM (SELECT id, row_number() OVER () AS row FROM {table} "
+            "WHERE user_id = %s) AS n WHERE n.id = d.id",
+            [user.pk],
+        )
+        cursor.execute(f"ANALYZE {table}")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(function, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentile(latencies, 0.5), percentile(latencies, 0.99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dumps", type=int, default=50000)
+    parser.add_argument("--page", type=int, default=20, help="Rows per page")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    User = get_user_model()
+    User.objects.filter(email=EMAIL).delete()
+    user = User.objects.create(email=EMAIL, username="benchkeyset")
+    try:
+        create_dumps(user, args.dumps)
+        dumps = BrainDump.objects.filter(user=user).defer("transcription")
+        before = dumps.annotate(date=TruncDate("created_at")).order_by(
+            "-date", "-created_at"
+        )
+        paginator = Paginator(before, args.page)
+        # The row ending the previous page, whose cursor the keyset query gets
+        positions = list(dumps.order_by(*ORDERING).only("id", "created_at"))
+
+        last = (args.dumps - 1) // args.page + 1
+        depths = sorted({1, 10, 100, 1000, last // 2, last} - {0})
+        print(f"{'page':>6} {'':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for number in (depth for depth in depths if depth <= last):
+            # A fresh Paginator per request, as the view created one
+            offset = measure(
+                lambda: list(Paginator(before, args.page).page(number)), args.repeat
+            )
+            cursor = (
+                encode_cursor(positions[(number - 1) * args.page - 1])
+                if number > 1
+                else None
+            )
+            keyset = measure(
+                lambda: list(keyset_page(dumps, cursor, args.page)), args.repeat
+            )
+            for label, (p50, p99) in (("offset", offset), ("keyset", keyset)):
+                print(f"{number:>6} {label:>9} {p50:>8.1f} {p99:>8.1f}")
+        print(f"\n{paginator.count} dumps, {paginator.num_pages} pages")
+    finally:
+        user.delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Keyword search benchmark: blind index vs decrypt-and-scan.
+
+Creates a user with synthetic encrypted transcriptions, then times finding
+the dumps that contain given words two ways: loading and decrypting every
+transcription and matching in Python, and one SQL query on the blind index
+(BrainDump.transcription_tokens, GIN). Both must return the same rows. Run
+against a scratch database; the benchmark user is deleted afterwards:
+
+    DJANGO_SETTINGS_MODULE=project.settings.local python benchmarks/keyword_search.py --dumps 1000,10000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+
+from brain_dump_app.blind_index import keyword_filter, tokenize  # noqa: E402
+from brain_dump_app.models import BrainDump  # noqa: E402
+
+EMAIL = "bench-keywords@example.com"
+
+
+def vocabulary(size):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(random.choice(letters) for _ in range(random.randint(3, 9))))
+    return sorted(words)
+
+
+def transcription(words, length):
+    # Zipf-like: a few words are common, most are rare
+    return " ".join(
+        words[min(len(words) - 1, int(random.paretovariate(1.2)) - 1)]
+        for _ in range(length)
+    )
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def decrypt_and_scan(user, query):
+    wanted = tokenize(query)
+    return {
+        brain_dump.pk
+        for brain_dump in BrainDump.objects.filter(user=user).only(
+            "id", "transcription"
+        )
+        if wanted <= tokenize(brain_dump.transcription)
+    }
+
+
+def blind_index(user, query):
+    return set(
+        BrainDump.objects.filter(user=user, **keyword_filter(query)).values_list(
+            "pk", flat=True
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dumps", default="1000,10000")
+    parser.add_argument(
+        "--words", type=int, default=200, help="Words per transcription"
+    )
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(0)
+    words = vocabulary(args.vocabulary)
+    queries = [
+        " ".join(random.sample(words[:200], random.choice((1, 2))))
+        for _ in range(args.queries)
+    ]
+
+    User = get_user_model()
+    User.objects.filter(email=EMAIL).delete()
+    user = User.objects.create(email=EMAIL, username="benchkeywords")
+    created = 0
+    try:
+        print(f"{'dumps':>8} {'method':>16} {'p50 ms':>8} {'p99 ms':>8} {'hits':>6}")
+        for size in [int(size) for size in args.dumps.split(",") if size]:
+            while created < size:
+                # save() encrypts and fills the blind index, like the app does
+                BrainDump(
+                    user=user, transcription=transcription(words, args.words)
+                ).save()
+                created += 1
+            for name, search in (
+                ("decrypt+scan", decrypt_and_scan),
+                ("blind index", blind_index),
+            ):
+                latencies = []
+                hits = 0
+                for query in queries:
+                    start = time.perf_counter()
+                    found = search(user, query)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    hits += len(found)
+                    if name == "blind index":
+                        assert found == decrypt_and_scan(user, query), query
+                print(
+                    f"{size:>8} {name:>16} {percentile(latencies, 0.5):>8.1f} "
+                    f"{percentile(latencies, 0.99):>8.1f} {hits / len(queries):>6.1f}"
+                )
+    finally:
+        user.delete()
+
+
+if __name__ == "__main__":
+    main()
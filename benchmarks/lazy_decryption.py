@@ -0,0 +1,80 @@
+"""
+Lazy decryption micro-benchmark: cost per loaded BrainDump row.
+
+Builds BrainDump instances from encrypted column values the way a queryset
+does (Model.from_db), without a database, and times:
+
+- list: rows loaded, transcriptions never read (brain_dump_list, API list
+  pages that only show metadata, similarity candidates that are cut)
+- search: rows loaded, a fraction of transcriptions read (--read-fraction)
+- read all: every transcription read, i.e. what loading cost before
+  decryption became lazy
+
+    DJANGO_SETTINGS_MODULE=project.settings.local python benchmarks/lazy_decryption.py --rows 1000 --chars 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.utils import timezone  # noqa: E402
+
+from brain_dump_app.models import BrainDump  # noqa: E402
+
+# In model field order, as Model.from_db expects
+FIELDS = ["id", "created_at", "transcription", "user_id"]
+
+
+def load(rows, read_every):
+    start = time.perf_counter()
+    transcription = BrainDump._meta.get_field("transcription")
+    for index, (pk, created_at, encrypted, user_id) in enumerate(rows):
+        # What the queryset iterator does: run converters, then build the model
+        value = transcription.from_db_value(encrypted, None, None)
+        brain_dump = BrainDump.from_db(
+            "default", FIELDS, [pk, created_at, value, user_id]
+        )
+        if read_every and index % read_every == 0:
+            brain_dump.transcription
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--chars", type=int, default=5000, help="Transcription length")
+    parser.add_argument("--read-fraction", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    field = BrainDump._meta.get_field("transcription")
+    text = ("word " * (args.chars // 5 + 1))[: args.chars]
+    user_id = uuid.uuid4()
+    rows = [
+        (uuid.uuid4(), timezone.now(), field.get_prep_value(text), user_id)
+        for _ in range(args.rows)
+    ]
+
+    print(f"{args.rows} rows, {args.chars} character transcriptions")
+    print(f"{'scenario':>12} {'total ms':>10} {'us/row':>8}")
+    search_every = max(1, round(1 / args.read_fraction)) if args.read_fraction else 0
+    for name, read_every in (
+        ("list", 0),
+        ("search", search_every),
+        ("read all", 1),
+    ):
+        best = min(load(rows, read_every) for _ in range(args.repeat))
+        print(f"{name:>12} {best * 1000:>10.1f} {best / args.rows * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
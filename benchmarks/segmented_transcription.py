@@ -0,0 +1,134 @@
+"""
+Segmented transcription benchmark against a local fake transcription server.
+
+Compares one request per recording with silence-split segments transcribed
+concurrently. The fake server sleeps for a fixed per-request latency plus a
+processing time proportional to the audio length it receives (estimated from
+the upload size at the Opus proxy bitrate).
+
+    python benchmarks/segmented_transcription.py --minutes 10 --latency 0.5 \
+        --seconds-per-audio-minute 3 --concurrency 1,2,4,8
+"""
+
+import argparse
+import http.server
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings.local")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+PROXY_BITRATE = 24_000  # bits per second of the Opus transcription proxy
+
+
+class FakeTranscriptionHandler(http.server.BaseHTTPRequestHandler):
+    latency = 0.5
+    seconds_per_audio_minute = 3.0
+
+    def do_POST(self):
+        size = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(size)
+        audio_minutes = size * 8 / PROXY_BITRATE / 60
+        time.sleep(self.latency + audio_minutes * self.seconds_per_audio_minute)
+        body = b"this is a benchmark transcript"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_server(latency, seconds_per_audio_minute):
+    FakeTranscriptionHandler.latency = latency
+    FakeTranscriptionHandler.seconds_per_audio_minute = seconds_per_audio_minute
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), FakeTranscriptionHandler
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def generate_input(path, minutes):
+    """Pink noise gated into 6 s "phrases" separated by 2 s pauses."""
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"anoisesrc=d={minutes * 60}:c=pink:a=0.2",
+            "-af",
+            "volume='if(lt(mod(t,8),6),1,0)':eval=frame",
+            "-ac",
+            "1",
+            "-ar",
+            "16000",
+            "-c:a",
+            "libopus",
+            "-b:a",
+            "24k",
+            path,
+        ],
+        check=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--seconds-per-audio-minute", type=float, default=3.0)
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(args.latency, args.seconds_per_audio_minute)
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.core.files import File
+
+    from brain_dump_app.tasks import _transcribe_single, transcribe_audio_file
+
+    settings.OPENAI_BASE_URL = base_url
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "input.ogg")
+        generate_input(path, args.minutes)
+
+        print(f"{'mode':>22} {'seconds':>8} {'speedup':>8}")
+        with open(path, "rb") as f:
+            start = time.perf_counter()
+            _transcribe_single(File(f, name="input.ogg"))
+            baseline = time.perf_counter() - start
+        print(f"{'single request':>22} {baseline:>8.2f} {1.0:>8.2f}")
+
+        for concurrency in [int(c) for c in args.concurrency.split(",") if c]:
+            settings.TRANSCRIPTION_MAX_CONCURRENCY = concurrency
+            with open(path, "rb") as f:
+                start = time.perf_counter()
+                transcribe_audio_file(File(f, name="input.ogg"))
+                elapsed = time.perf_counter() - start
+            label = f"segmented x{concurrency}"
+            print(f"{label:>22} {elapsed:>8.2f} {baseline / elapsed:>8.2f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
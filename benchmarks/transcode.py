@@ -0,0 +1,180 @@
+"""
+Audio transcoding benchmark: streaming transcoder vs the temp-file implementation.
+
+Generates synthetic recordings of the given lengths with ffmpeg, then converts
+each one to MP3 with both implementations in a fresh process and reports wall
+time, peak RSS (Python process and ffmpeg child) and bytes written to disk.
+
+    python benchmarks/transcode.py --minutes 1,5,10 --format m4a
+
+Disk bytes come from /proc/self/io write_bytes plus the ffmpeg child's
+ru_oublock; Linux accounts both when pages are dirtied, so temp files that
+are deleted before being flushed still count.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.core.files import File  # noqa: E402
+from django.core.files.base import ContentFile  # noqa: E402
+
+from utils.convert_audio import convert_audio_to_mp3  # noqa: E402
+
+INPUT_FORMATS = {
+    # Default mp4 muxing puts the moov atom at the end (exercises the seek fallback)
+    "m4a": ["-c:a", "aac", "-b:a", "96k"],
+    "m4a-faststart": ["-c:a", "aac", "-b:a", "96k", "-movflags", "+faststart"],
+    "webm": ["-c:a", "libopus", "-b:a", "64k"],
+    "wav": ["-c:a", "pcm_s16le"],
+}
+
+
+def legacy_convert_audio_to_mp3(audio_file):
+    """The previous implementation: upload -> temp file -> ffmpeg -> temp file -> memory."""
+    with tempfile.NamedTemporaryFile(
+        suffix=os.path.splitext(audio_file.name)[1], delete=False
+    ) as tmp_orig:
+        for chunk in audio_file.chunks():
+            tmp_orig.write(chunk)
+        tmp_orig_path = tmp_orig.name
+
+    mp3_temp = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
+    mp3_temp_path = mp3_temp.name
+    mp3_temp.close()
+    try:
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-i",
+                tmp_orig_path,
+                "-acodec",
+                "libmp3lame",
+                "-q:a",
+                "2",
+                "-y",
+                mp3_temp_path,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+        with open(mp3_temp_path, "rb") as f:
+            content = f.read()
+        filename = os.path.splitext(os.path.basename(audio_file.name))[0] + ".mp3"
+        return ContentFile(content, name=filename)
+    finally:
+        os.unlink(tmp_orig_path)
+        os.unlink(mp3_temp_path)
+
+
+IMPLEMENTATIONS = {
+    "legacy": legacy_convert_audio_to_mp3,
+    "streaming": convert_audio_to_mp3,
+}
+
+
+def generate_input(path, minutes, input_format):
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"anoisesrc=d={minutes * 60}:c=pink:a=0.1",
+            "-ac",
+            "1",
+            "-ar",
+            "44100",
+            *INPUT_FORMATS[input_format],
+            path,
+        ],
+        check=True,
+    )
+
+
+def _read_write_bytes():
+    with open("/proc/self/io") as f:
+        fields = dict(line.split(": ") for line in f.read().splitlines())
+    return int(fields["write_bytes"])
+
+
+def _measure(implementation, path, results):
+    """Child process body: one conversion, measured in isolation."""
+    convert = IMPLEMENTATIONS[implementation]
+    write_bytes_before = _read_write_bytes()
+    start = time.perf_counter()
+    # A plain File has no filesystem path attribute, like an upload held in
+    # memory or a recording on remote storage
+    with open(path, "rb") as f:
+        mp3 = convert(File(f, name=os.path.basename(path)))
+    elapsed = time.perf_counter() - start
+    output_size = mp3.size if mp3 else 0
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    results.put(
+        {
+            "seconds": elapsed,
+            "python_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "ffmpeg_rss_mb": children.ru_maxrss / 1024,
+            "disk_mb": (
+                _read_write_bytes() - write_bytes_before + children.ru_oublock * 512
+            )
+            / 1024**2,
+            "output_mb": output_size / 1024**2,
+        }
+    )
+
+
+def measure(implementation, path):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_measure, args=(implementation, path, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--minutes", default="1,5,10", help="Comma separated input lengths"
+    )
+    parser.add_argument("--format", choices=sorted(INPUT_FORMATS), default="m4a")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'input':>14} {'impl':>10} {'seconds':>8} {'py rss MB':>10} "
+        f"{'ffmpeg rss MB':>14} {'disk MB':>8} {'out MB':>7}"
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        for minutes in [float(m) for m in args.minutes.split(",") if m]:
+            extension = args.format.split("-")[0]
+            path = os.path.join(workdir, f"input_{minutes:g}min.{extension}")
+            generate_input(path, minutes, args.format)
+            label = f"{minutes:g}min {args.format}"
+            for implementation in IMPLEMENTATIONS:
+                runs = [measure(implementation, path) for _ in range(args.repeat)]
+                best = min(runs, key=lambda r: r["seconds"])
+                print(
+                    f"{label:>14} {implementation:>10} {best['seconds']:>8.2f} "
+                    f"{max(r['python_rss_mb'] for r in runs):>10.1f} "
+                    f"{max(r['ffmpeg_rss_mb'] for r in runs):>14.1f} "
+                    f"{best['disk_mb']:>8.1f} {best['output_mb']:>7.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Transcription upload benchmark: archival MP3 vs the speech proxy.
+
+Encodes a recording both ways and uploads each rendition to the transcription
+endpoint, reporting encode time, upload bytes and end-to-end latency.
+
+    python benchmarks/transcription_proxy.py --input note.m4a
+    python benchmarks/transcription_proxy.py --minutes 5 --uplink-mbps 20
+
+With OPENAI_API_KEY set the real Whisper API is called. Otherwise a local
+server stands in for it, reading the request body at --uplink-mbps to model
+the egress link (it returns a fixed transcript, so only the upload counts).
+"""
+
+import argparse
+import http.server
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.core.files import File  # noqa: E402
+from openai import OpenAI  # noqa: E402
+
+from utils.convert_audio import (  # noqa: E402
+    MP3_CODEC_ARGS,
+    TRANSCRIPTION_PROXY_FORMATS,
+    transcode_audio,
+)
+
+RENDITIONS = {
+    # name: (extension, muxer, encoder arguments)
+    "archival mp3 q2": (".mp3", "mp3", MP3_CODEC_ARGS),
+    **{f"proxy {name}": spec for name, spec in TRANSCRIPTION_PROXY_FORMATS.items()},
+}
+
+
+class ThrottledTranscriptionHandler(http.server.BaseHTTPRequestHandler):
+    """Accepts a transcription upload at a limited rate and returns plain text."""
+
+    bytes_per_second = 2_500_000
+
+    def do_POST(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        start = time.perf_counter()
+        received = 0
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 64 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            received += len(chunk)
+            # Sleep until the modelled link would have delivered this much
+            delay = received / self.bytes_per_second - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        body = b"benchmark transcript"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_server(uplink_mbps):
+    ThrottledTranscriptionHandler.bytes_per_second = uplink_mbps * 1_000_000 / 8
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), ThrottledTranscriptionHandler
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def generate_input(path, minutes):
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"anoisesrc=d={minutes * 60}:c=pink:a=0.1",
+            "-ac",
+            "1",
+            "-c:a",
+            "aac",
+            "-b:a",
+            "96k",
+            "-movflags",
+            "+faststart",
+            path,
+        ],
+        check=True,
+    )
+
+
+def run(client, input_path, rendition):
+    extension, muxer, codec_args = RENDITIONS[rendition]
+    start = time.perf_counter()
+    with open(input_path, "rb") as f:
+        data = transcode_audio(
+            File(f, name=os.path.basename(input_path)),
+            output_format=muxer,
+            codec_args=codec_args,
+        )
+    encoded = time.perf_counter()
+
+    upload_bytes = data.seek(0, os.SEEK_END)
+    data.seek(0)
+    client.audio.transcriptions.create(
+        model="whisper-1",
+        file=(f"recording{extension}", data.read()),
+        response_format="text",
+    )
+    finished = time.perf_counter()
+    return upload_bytes, encoded - start, finished - encoded, finished - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", help="Recording to use (default: synthetic)")
+    parser.add_argument("--minutes", type=float, default=5)
+    parser.add_argument("--uplink-mbps", type=float, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    server = None
+    if os.environ.get("OPENAI_API_KEY"):
+        client = OpenAI()
+        print("Using the OpenAI API")
+    else:
+        server, base_url = start_fake_server(args.uplink_mbps)
+        client = OpenAI(api_key="benchmark", base_url=base_url)
+        print(f"Using a local endpoint throttled to {args.uplink_mbps:g} Mbit/s")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        input_path = args.input
+        if not input_path:
+            input_path = os.path.join(workdir, "input.m4a")
+            generate_input(input_path, args.minutes)
+
+        print(
+            f"{'rendition':>16} {'upload KB':>10} {'encode s':>9} "
+            f"{'transcribe s':>13} {'total s':>8}"
+        )
+        for rendition in RENDITIONS:
+            runs = [run(client, input_path, rendition) for _ in range(args.repeat)]
+            upload_bytes = runs[0][0]
+            encode, transcribe, total = (
+                sorted(r[i] for r in runs)[len(runs) // 2] for i in (1, 2, 3)
+            )
+            print(
+                f"{rendition:>16} {upload_bytes / 1024:>10.0f} {encode:>9.2f} "
+                f"{transcribe:>13.2f} {total:>8.2f}"
+            )
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
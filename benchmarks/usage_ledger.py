@@ -0,0 +1,175 @@
+"""
+Usage ledger benchmark: UsageEvent insert throughput and rollup time.
+
+Creates benchmark users, then measures writing events one INSERT per event
+(what a per-action write costs), through record_usage() (buffered, one
+INSERT per USAGE_EVENTS_BATCH_SIZE events), and bulk loads the ledger up to
+--events rows spread over --days days in time order. With the ledger full it
+times the periodic rollup (USAGE_ROLLUP_DAYS days), a full rebuild of
+UsageDaily, and a user's monthly totals read from the rollup vs aggregated
+from the raw events. Run against a scratch database; the benchmark users and
+their events are deleted afterwards:
+
+    DJANGO_SETTINGS_MODULE=project.settings.local python benchmarks/usage_ledger.py --events 10000000 --users 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Count, Sum  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from subscriptions_app.ledger import (  # noqa: E402
+    flush_usage_events,
+    record_usage,
+    rollup_usage,
+    usage_totals,
+)
+from subscriptions_app.models import UsageDaily, UsageEvent  # noqa: E402
+
+EMAIL = "bench-usage-{}@example.com"
+KINDS = [kind for kind, _ in UsageEvent.KIND_CHOICES]
+
+
+def create_users(count):
+    User = get_user_model()
+    User.objects.filter(email__startswith="bench-usage-").delete()
+    return User.objects.bulk_create(
+        [
+            User(email=EMAIL.format(index), username=f"benchusage{index}")
+            for index in range(count)
+        ]
+    )
+
+
+def timed(label, count, function):
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    print(f"{label:>28} {count:>10} {elapsed:>9.2f}s {count / elapsed:>12,.0f}/s")
+
+
+def bulk_load(users, total, days, chunk=1_000_000):
+    # Time-ordered like real traffic, so the BRIN index stays effective
+    user_ids = [str(user.pk) for user in users]
+    seconds = days * 86400 / total
+    done = 0
+    with connection.cursor() as cursor:
+        while done < total:
+            count = min(chunk, total - done)
+            cursor.execute(
+                f"INSERT INTO {UsageEvent._meta.db_table} "
+                "(user_id, kind, quantity, occurred_at) "
+                "SELECT (%s::uuid[])[1 + g %% %s], (%s::text[])[1 + g %% %s], "
+                "1 + g %% 3, now() - make_interval(secs => (%s - g) * %s) "
+                "FROM generate_series(%s, %s) AS g",
+                [
+                    user_ids,
+                    len(user_ids),
+                    KINDS,
+                    len(KINDS),
+                    total,
+                    seconds,
+                    done,
+                    done + count - 1,
+                ],
+            )
+            done += count
+            print(f"  {done:,} events loaded", end="\r", flush=True)
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=90, help="Days of history")
+    parser.add_argument(
+        "--sample", type=int, default=5000, help="Events per insert method"
+    )
+    args = parser.parse_args()
+
+    users = create_users(args.users)
+    try:
+        print(f"{'':>28} {'events':>10} {'time':>10} {'rate':>13}")
+        timed(
+            "one INSERT per event",
+            args.sample,
+            lambda: [
+                UsageEvent.objects.create(user=users[index % len(users)])
+                for index in range(args.sample)
+            ],
+        )
+
+        def buffered():
+            for index in range(args.sample * 10):
+                record_usage(users[index % len(users)], UsageEvent.CHAT_MESSAGE)
+            flush_usage_events()
+
+        timed(
+            f"record_usage (batch {settings.USAGE_EVENTS_BATCH_SIZE})",
+            args.sample * 10,
+            buffered,
+        )
+        loaded = max(0, args.events - args.sample * 11)
+        timed(
+            "bulk load (generate_series)",
+            loaded,
+            lambda: bulk_load(users, loaded, args.days),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {UsageEvent._meta.db_table}")
+
+        print()
+        for label, days in (
+            (f"rollup, last {settings.USAGE_ROLLUP_DAYS} days", None),
+            (f"rollup, all {args.days + 1} days", args.days + 1),
+        ):
+            start = time.perf_counter()
+            rows = rollup_usage(days=days)
+            print(f"{label:>28} {rows:>10} rows {time.perf_counter() - start:>8.2f}s")
+
+        user = users[0]
+        since = timezone.localdate() - timedelta(days=30)
+        start = time.perf_counter()
+        from_rollup = usage_totals(user, since)
+        rollup_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        from_events = {
+            row["kind"]: row
+            for row in UsageEvent.objects.filter(
+                user=user, occurred_at__date__gte=since
+            )
+            .values("kind")
+            .annotate(events=Count("id"), quantity=Sum("quantity"))
+        }
+        events_ms = (time.perf_counter() - start) * 1000
+        assert sum(total["events"] for total in from_rollup.values()) == sum(
+            row["events"] for row in from_events.values()
+        )
+        print(
+            f"\n30-day totals for one user: {rollup_ms:.1f} ms from UsageDaily, "
+            f"{events_ms:.1f} ms from raw events"
+        )
+    finally:
+        user_ids = [user.pk for user in users]
+        UsageDaily.objects.filter(user_id__in=user_ids).delete()
+        UsageEvent.objects.filter(user_id__in=user_ids).delete()
+        get_user_model().objects.filter(pk__in=user_ids).delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Vector index benchmark: recall@k and latency of IVFFlat vs HNSW on pgvector.
+
+Loads synthetic embeddings (clustered, so nearest neighbours are meaningful)
+into a scratch table spread over many users, computes exact top-k answers
+with a sequential scan, then builds each index configuration and measures
+recall@k and p50/p99 query latency at several probes / ef_search values.
+Queries are run both across the whole table and filtered to one user, the
+way get_similar_dumps / chat retrieval query BrainDump.embedding.
+
+With --compact 512,256 the same is measured for compact copies of the
+vectors (leading dimensions, unit length, halfvec, inner product ops, as in
+BrainDump.embedding_compact), with recall still judged against exact
+full-precision answers. Synthetic vectors carry information evenly across
+dimensions unlike text-embedding-3 ones, so truncated recall here is a lower
+bound; load real embeddings (--keep, then copy them in) for final numbers.
+
+    DJANGO_SETTINGS_MODULE=project.settings.local python benchmarks/vector_index.py \
+        --rows 10000,100000 --users 1000 --queries 100 --k 5
+
+Generation happens inside Postgres; 1M rows at 1536 dimensions takes a
+while (use --dimensions for quicker exploratory runs). Run it against a
+scratch database: the tables are dropped at the end unless --keep is given.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+TABLE = "bench_vector_index"
+QUERIES = "bench_vector_index_queries"
+CENTERS = "bench_vector_index_centers"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def setup_tables(cursor, dimensions, clusters):
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    for table in (TABLE, QUERIES, CENTERS):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.execute(f"CREATE TABLE {CENTERS} (id int PRIMARY KEY, v real[])")
+    cursor.execute(
+        f"INSERT INTO {CENTERS} SELECT c, array_agg(random() - 0.5) "
+        f"FROM generate_series(0, {clusters - 1}) c, generate_series(1, {dimensions}) "
+        f"GROUP BY c"
+    )
+    cursor.execute(
+        f"CREATE TABLE {TABLE} (id bigserial PRIMARY KEY, user_id int NOT NULL, "
+        f"embedding vector({dimensions}) NOT NULL)"
+    )
+    cursor.execute(
+        f"CREATE TABLE {QUERIES} (id serial PRIMARY KEY, user_id int NOT NULL, "
+        f"embedding vector({dimensions}) NOT NULL)"
+    )
+
+
+def _generate_sql(target, count, users, clusters, noise, offset=0):
+    # Each row is a cluster centre plus uniform noise; users own rows from a
+    # handful of clusters, like a person returning to the same topics
+    return (
+        f"INSERT INTO {target} (user_id, embedding) "
+        f"SELECT g % {users}, ("
+        f"  SELECT array_agg(x + (random() - 0.5) * {noise} ORDER BY i) "
+        f"  FROM unnest(c.v) WITH ORDINALITY AS u(x, i)"
+        f")::vector "
+        f"FROM generate_series({offset}, {offset + count - 1}) g "
+        f"JOIN {CENTERS} c ON c.id = ((g % {users}) * 7 + (g / {users}) % 5) % {clusters}"
+    )
+
+
+def load_rows(cursor, start, rows, users, clusters, noise, batch=20000):
+    loaded = start
+    while loaded < rows:
+        count = min(batch, rows - loaded)
+        cursor.execute(_generate_sql(TABLE, count, users, clusters, noise, loaded))
+        loaded += count
+        print(f"  loaded {loaded}/{rows} rows", end="\r", flush=True)
+    print()
+    cursor.execute(f"ANALYZE {TABLE}")
+
+
+def schemas(compact_dimensions):
+    """(label, column, vector type, distance operator, index opclass) to compare."""
+    yield ("vector", "embedding", "vector", "<=>", "vector_cosine_ops")
+    for dimensions in compact_dimensions:
+        yield (
+            f"halfvec({dimensions})",
+            f"compact_{dimensions}",
+            "halfvec",
+            "<#>",
+            "halfvec_ip_ops",
+        )
+
+
+def add_compact_columns(cursor, compact_dimensions):
+    for dimensions in compact_dimensions:
+        for table in (TABLE, QUERIES):
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN compact_{dimensions} halfvec({dimensions})"
+            )
+
+
+def fill_compact_columns(cursor, table, compact_dimensions):
+    # Same transformation as compact_embeddings / embeddings.compact_embedding()
+    for dimensions in compact_dimensions:
+        cursor.execute(
+            f"UPDATE {table} SET compact_{dimensions} = "
+            f"l2_normalize(subvector(embedding, 1, {dimensions}))::halfvec({dimensions}) "
+            f"WHERE compact_{dimensions} IS NULL"
+        )
+
+
+def column_sizes(cursor, column):
+    cursor.execute(
+        f"SELECT avg(pg_column_size({column})), pg_total_relation_size('{TABLE}') "
+        f"FROM {TABLE}"
+    )
+    return cursor.fetchone()
+
+
+def fetch_queries(cursor, columns):
+    cursor.execute(
+        f"SELECT id, user_id, {', '.join(f'{c}::text' for c in columns)} FROM {QUERIES}"
+    )
+    return [(row[0], row[1], dict(zip(columns, row[2:]))) for row in cursor.fetchall()]
+
+
+def exact_answers(cursor, queries, k, per_user):
+    """Ground truth by sequential scan (index scans disabled) at full precision."""
+    cursor.execute("SET enable_indexscan = off")
+    cursor.execute("SET enable_bitmapscan = off")
+    answers = {}
+    for query_id, user_id, vectors in queries:
+        where = f"WHERE user_id = {user_id}" if per_user else ""
+        cursor.execute(
+            f"SELECT id FROM {TABLE} {where} ORDER BY embedding <=> %s::vector LIMIT {k}",
+            [vectors["embedding"]],
+        )
+        answers[query_id] = {row[0] for row in cursor.fetchall()}
+    cursor.execute("RESET enable_indexscan")
+    cursor.execute("RESET enable_bitmapscan")
+    return answers
+
+
+def measure(cursor, queries, answers, k, per_user, schema):
+    _, column, vector_type, operator, _ = schema
+    latencies = []
+    recall = 0.0
+    for query_id, user_id, vectors in queries:
+        where = f"WHERE user_id = {user_id}" if per_user else ""
+        start = time.perf_counter()
+        cursor.execute(
+            f"SELECT id FROM {TABLE} {where} "
+            f"ORDER BY {column} {operator} %s::{vector_type} LIMIT {k}",
+            [vectors[column]],
+        )
+        found = {row[0] for row in cursor.fetchall()}
+        latencies.append((time.perf_counter() - start) * 1000)
+        expected = answers[query_id]
+        if expected:
+            recall += len(found & expected) / len(expected)
+    return (
+        recall / len(queries),
+        percentile(latencies, 0.5),
+        percentile(latencies, 0.99),
+    )
+
+
+def index_configs(rows, lists_values, hnsw_params, schema):
+    _, column, _, _, opclass = schema
+    default_lists = max(1, rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows)))
+    for lists in sorted(
+        set(lists_values or [default_lists // 2, default_lists, default_lists * 2])
+    ):
+        lists = max(1, lists)
+        probes = sorted(
+            {1, max(1, int(math.sqrt(lists))), max(1, lists // 10), max(1, lists // 4)}
+        )
+        yield (
+            f"ivfflat lists={lists}",
+            f"USING ivfflat ({column} {opclass}) WITH (lists = {lists})",
+            [("ivfflat.probes", p) for p in probes],
+        )
+    for m, ef_construction in hnsw_params:
+        yield (
+            f"hnsw m={m} efc={ef_construction}",
+            f"USING hnsw ({column} {opclass}) "
+            f"WITH (m = {m}, ef_construction = {ef_construction})",
+            [("hnsw.ef_search", e) for e in (40, 100, 200)],
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="10000,100000,1000000")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.4)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument(
+        "--lists", help="Comma separated IVFFlat lists (default: around rows/1000)"
+    )
+    parser.add_argument(
+        "--hnsw", default="16:64,32:128", help="m:ef_construction pairs"
+    )
+    parser.add_argument(
+        "--compact", default="", help="Also compare halfvec copies of these dimensions"
+    )
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch tables")
+    args = parser.parse_args()
+
+    lists_values = [int(v) for v in args.lists.split(",")] if args.lists else None
+    hnsw_params = [
+        tuple(int(x) for x in pair.split(":")) for pair in args.hnsw.split(",")
+    ]
+    compact_dimensions = [int(d) for d in args.compact.split(",") if d]
+    compared = list(schemas(compact_dimensions))
+
+    with connection.cursor() as cursor:
+        setup_tables(cursor, args.dimensions, args.clusters)
+        add_compact_columns(cursor, compact_dimensions)
+        cursor.execute(
+            _generate_sql(QUERIES, args.queries, args.users, args.clusters, args.noise)
+        )
+        fill_compact_columns(cursor, QUERIES, compact_dimensions)
+        queries = fetch_queries(cursor, [schema[1] for schema in compared])
+        loaded = 0
+        try:
+            for rows in [int(r) for r in args.rows.split(",") if r]:
+                print(
+                    f"\n== {rows} rows, {args.users} users, {args.dimensions} dims =="
+                )
+                load_rows(cursor, loaded, rows, args.users, args.clusters, args.noise)
+                fill_compact_columns(cursor, TABLE, compact_dimensions)
+                loaded = rows
+                answers = {
+                    per_user: exact_answers(cursor, queries, args.k, per_user)
+                    for per_user in (False, True)
+                }
+                for per_user in (False, True):
+                    _, p50, p99 = measure(
+                        cursor,
+                        queries,
+                        answers[per_user],
+                        args.k,
+                        per_user,
+                        compared[0],
+                    )
+                    scope = "per user" if per_user else "global"
+                    print(f"  exact scan ({scope}): p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+
+                print(
+                    f"{'index':>34} {'param':>18} {'build s':>8} {'MB':>7} "
+                    f"{'recall':>7} {'p50 ms':>7} {'p99 ms':>7} "
+                    f"{'user recall':>11} {'user p50':>8} {'user p99':>8}"
+                )
+                best = None
+                for schema in compared:
+                    value_bytes, table_bytes = column_sizes(cursor, schema[1])
+                    print(
+                        f"  {schema[0]}: {value_bytes:.0f} bytes per vector "
+                        f"(table with all columns {table_bytes / 1024**2:.0f} MB)"
+                    )
+                    for name, definition, params in index_configs(
+                        rows, lists_values, hnsw_params, schema
+                    ):
+                        name = f"{schema[0]} {name}"
+                        start = time.perf_counter()
+                        cursor.execute(
+                            f"CREATE INDEX bench_vector_idx ON {TABLE} {definition}"
+                        )
+                        build = time.perf_counter() - start
+                        cursor.execute("SELECT pg_relation_size('bench_vector_idx')")
+                        size_mb = cursor.fetchone()[0] / 1024**2
+                        for setting, value in params:
+                            cursor.execute(f"SET {setting} = {value}")
+                            results = [
+                                measure(
+                                    cursor,
+                                    queries,
+                                    answers[per_user],
+                                    args.k,
+                                    per_user,
+                                    schema,
+                                )
+                                for per_user in (False, True)
+                            ]
+                            (recall, p50, p99), (u_recall, u_p50, u_p99) = results
+                            print(
+                                f"{name:>34} {setting.split('.')[1] + '=' + str(value):>18} "
+                                f"{build:>8.1f} {size_mb:>7.1f} {recall:>7.3f} {p50:>7.1f} "
+                                f"{p99:>7.1f} {u_recall:>11.3f} {u_p50:>8.1f} {u_p99:>8.1f}"
+                            )
+                            if recall >= args.target_recall and (
+                                best is None or p99 < best[0]
+                            ):
+                                best = (p99, name, f"{setting} = {value}", recall)
+                            cursor.execute(f"RESET {setting}")
+                        cursor.execute("DROP INDEX bench_vector_idx")
+
+                if best:
+                    print(
+                        f"Recommended at {rows} rows: {best[1]} with {best[2]} "
+                        f"(recall {best[3]:.3f}, p99 {best[0]:.1f} ms)"
+                    )
+                else:
+                    print(
+                        f"No configuration reached recall {args.target_recall} at {rows} rows"
+                    )
+        finally:
+            if not args.keep:
+                for table in (TABLE, QUERIES, CENTERS):
+                    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+if __name__ == "__main__":
+    main()
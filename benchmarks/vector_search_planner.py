@@ -0,0 +1,134 @@
+"""
+Similarity search planner benchmark: exact vs index search per user.
+
+Creates one user per corpus size (10, 1k and 100k brain dumps by default)
+with clustered synthetic embeddings, then times embeddings.nearest() for
+each user with the search forced exact, forced through the vector index,
+and as planned (VECTOR_SEARCH_EXACT_MAX_ROWS). Reports p50/p99 latency,
+how many of the requested rows came back and recall against exact search.
+Run against a scratch database; the benchmark users are deleted afterwards:
+
+    DJANGO_SETTINGS_MODULE=project.settings.local python benchmarks/vector_search_planner.py --sizes 10,1000,100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings.local")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from brain_dump_app.embeddings import nearest  # noqa: E402
+from brain_dump_app.models import BrainDump  # noqa: E402
+
+DIMENSIONS = 1536
+EMAIL = "bench-planner-{}@example.com"
+
+
+def clustered_vector(centers, noise):
+    center = random.choice(centers)
+    return [x + (random.random() - 0.5) * noise for x in center]
+
+
+def create_user(size, centers, noise):
+    User = get_user_model()
+    user = User.objects.create(email=EMAIL.format(size), username=f"bench{size}")
+    created = 0
+    while created < size:
+        count = min(2000, size - created)
+        BrainDump.objects.bulk_create(
+            [
+                BrainDump(user=user, embedding=clustered_vector(centers, noise))
+                for _ in range(count)
+            ]
+        )
+        created += count
+        print(f"  user with {size} dumps: {created} created", end="\r", flush=True)
+    print()
+    return user
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(user, queries, limit, exact_max_rows):
+    latencies = []
+    results = []
+    with override_settings(VECTOR_SEARCH_EXACT_MAX_ROWS=exact_max_rows):
+        for query in queries:
+            dumps = BrainDump.objects.filter(user=user, embedding__isnull=False).only(
+                "id"
+            )
+            start = time.perf_counter()
+            rows = nearest(dumps, query, limit)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append([row.pk for row in rows])
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10,1000,100000")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--noise", type=float, default=0.4)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    random.seed(0)
+    centers = [
+        [random.random() - 0.5 for _ in range(DIMENSIONS)] for _ in range(args.clusters)
+    ]
+    queries = [clustered_vector(centers, args.noise) for _ in range(args.queries)]
+
+    User = get_user_model()
+    User.objects.filter(email__in=[EMAIL.format(size) for size in sizes]).delete()
+    users = {}
+    try:
+        for size in sizes:
+            users[size] = create_user(size, centers, args.noise)
+
+        print(
+            f"planned: exact up to {settings.VECTOR_SEARCH_EXACT_MAX_ROWS} rows, "
+            f"limit {args.limit}"
+        )
+        print(
+            f"{'dumps':>8} {'plan':>8} {'p50 ms':>8} {'p99 ms':>8} "
+            f"{'rows':>6} {'recall':>7}"
+        )
+        for size, user in users.items():
+            _, truth = run(user, queries, args.limit, exact_max_rows=size)
+            for plan, exact_max_rows in (
+                ("exact", size),
+                ("index", -1),
+                ("planned", settings.VECTOR_SEARCH_EXACT_MAX_ROWS),
+            ):
+                latencies, results = run(user, queries, args.limit, exact_max_rows)
+                returned = sum(len(rows) for rows in results) / len(results)
+                recall = sum(
+                    len(set(rows) & set(expected)) / max(1, len(expected))
+                    for rows, expected in zip(results, truth)
+                ) / len(results)
+                print(
+                    f"{size:>8} {plan:>8} {percentile(latencies, 0.5):>8.1f} "
+                    f"{percentile(latencies, 0.99):>8.1f} {returned:>6.1f} {recall:>7.3f}"
+                )
+    finally:
+        User.objects.filter(pk__in=[user.pk for user in users.values()]).delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,13 +12,21 @@ from .models import BrainDump, Post, TwitterConnection, PostImage
 
 # from taggit.serializers import TagListSerializerField, TaggitSerializer
 from django.contrib.auth import get_user_model
+from django.urls import reverse
 import logging
+from .blind_index import keyword_filter
+from .embeddings import compact_embedding
+from .pagination import KeysetPagination
 from .tasks import (
+    schedule_chunk_embeddings,
+    schedule_embedding_refresh,
     transcribe_audio_file,
     generate_embedding,
     generate_post,
     generate_chat_response,
+    enqueue_brain_dump_processing,
 )
+from django.conf import settings
 import json
 from .x_api import create_tweet_v2, refresh_oauth2_token
 from subscriptions_app.decorators import limit_check  # Import the decorator
@@ -26,11 +34,13 @@ from subscriptions_app.decorators import limit_check  # Import the decorator
 # Import all necessary utils
 from subscriptions_app.utils import (
     check_recording_length,
-    check_usage,
-    check_and_reset_daily_limits,
+    get_recording_length_limit,
 )
-from mutagen.mp3 import MP3  # To get audio duration
-from utils.convert_audio import convert_audio_to_mp3  # Import conversion utility
+from subscriptions_app.ledger import record_usage
+from subscriptions_app.models import UsageEvent
+from subscriptions_app.usage import reserve
+from utils.convert_audio import prepare_recording, probe_audio
+from .upload_handlers import install_recording_limit_handler
 
 
 User = get_user_model()
@@ -50,8 +60,31 @@ class BrainDumpSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = BrainDump
-        fields = ["id", "created_at", "transcription", "edited", "recording"]
-        read_only_fields = ["id", "created_at", "edited", "recording"]
+        fields = [
+            "id",
+            "created_at",
+            "transcription",
+            "transcription_preview",
+            "transcription_length",
+            "has_transcription",
+            "duration_seconds",
+            "edited",
+            "recording",
+            "processing_status",
+            "processing_error",
+        ]
+        read_only_fields = [
+            "id",
+            "created_at",
+            "transcription_preview",
+            "transcription_length",
+            "has_transcription",
+            "duration_seconds",
+            "edited",
+            "recording",
+            "processing_status",
+            "processing_error",
+        ]
 
     # def get_tags(self, obj):
     #     return list(obj.tags.names())
@@ -100,28 +133,67 @@ class BrainDumpViewSet(viewsets.ModelViewSet):
     serializer_class = BrainDumpSerializer
     permission_classes = [IsAuthenticated]
     authentication_classes = [JWTAuthentication]
+    # ?cursor= from the previous response's `next`
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return BrainDump.objects.filter(user=self.request.user).order_by("-created_at")
+        queryset = BrainDump.objects.filter(user=self.request.user).order_by(
+            "-created_at"
+        )
+        # ?q=words: dumps whose transcription contains all of them (blind index)
+        query = self.request.query_params.get("q")
+        if query:
+            lookup = keyword_filter(query)
+            queryset = queryset.filter(**lookup) if lookup else queryset.none()
+        return queryset
+
+    def _wants_async_ingest(self, request):
+        """
+        Async ingest is on globally via settings, or per request with ?async=true.
+
+        Without a worker (JOB_QUEUE_WORKER off) nothing would process the
+        queued upload, so it is ingested synchronously instead.
+        """
+        if not settings.JOB_QUEUE_WORKER:
+            return False
+        if settings.BRAIN_DUMP_ASYNC_INGEST:
+            return True
+        return request.query_params.get("async", "").lower() in ("1", "true", "yes")
 
     def create(self, request, *args, **kwargs):
         """
         Handle POST request to create a new BrainDump with usage checks.
         """
         user = request.user
-        audio_file = request.FILES.get("audio_file")
-        duration_minutes = 0
-
-        # --- Check and Reset Daily Limits ---
-        check_and_reset_daily_limits(user)
-        # --- End Check and Reset ---
 
         # --- Check Recording Count Limit ---
-        if not check_usage(user, "max_recording"):
+        # Counted now, given back if the upload is rejected or fails
+        reservation = reserve(user, "max_recording")
+        if not reservation:
             return Response(
                 {"detail": "Recording limit reached. Please upgrade your plan."},
                 status=status.HTTP_403_FORBIDDEN,
             )
+        with reservation:
+            response = self._create_recording(request, user, reservation)
+            if response.status_code >= 400:
+                reservation.release()
+        return response
+
+    def _create_recording(self, request, user, reservation):
+        """Store, transcribe and embed an uploaded recording (see create)."""
+        duration_minutes = 0
+
+        # Enforce the length limit while the body streams in; this has to
+        # happen before request.FILES is first accessed
+        max_minutes = get_recording_length_limit(user)
+        upload_limit = install_recording_limit_handler(request, max_minutes)
+        audio_file = request.FILES.get("audio_file")
+        if upload_limit and upload_limit.rejection:
+            return Response(
+                {"detail": upload_limit.rejection},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
 
         if not audio_file:
             return Response(
@@ -129,35 +201,71 @@ class BrainDumpViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # --- Check Recording Length Limit & Convert ---
-        mp3_file_object = None
+        # --- Check Recording Length Limit (before any conversion) ---
+        try:
+            # Duration comes from the container headers; formats without one
+            # are demuxed (not decoded), stopping just past the user's limit
+            audio_info = probe_audio(
+                audio_file, max_duration=max_minutes * 60 if max_minutes else None
+            )
+        except Exception as e:
+            logger.error(f"API Error probing audio: {str(e)}", exc_info=True)
+            raise serializers.ValidationError(f"Error processing audio: {str(e)}")
+        if not audio_info.duration:
+            raise serializers.ValidationError("Could not determine duration.")
+        duration_minutes = audio_info.duration / 60.0
+        if not check_recording_length(user, duration_minutes):
+            raise serializers.ValidationError(
+                f"Recording length ({duration_minutes:.1f} min) exceeds your limit."
+            )
+        # --- End Check Recording Length Limit ---
+
+        # --- Asynchronous Ingest ---
+        # Save the raw upload and return 202; conversion, transcription and
+        # embedding run in the background. The job settles the recording
+        # reservation and records the minutes once it knows the outcome.
+        if self._wants_async_ingest(request):
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            audio_file.seek(0)
+            instance = serializer.save(
+                user=user,
+                recording=audio_file,
+                transcription="",
+                duration_seconds=audio_info.duration,
+                processing_status=BrainDump.QUEUED,
+            )
+            enqueue_brain_dump_processing(instance.id, reservation.defer())
+            status_url = request.build_absolute_uri(
+                reverse("api-brain-dumps-processing-status", kwargs={"pk": instance.id})
+            )
+            return Response(
+                {**self.get_serializer(instance).data, "status_url": status_url},
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Location": status_url},
+            )
+        # --- End Asynchronous Ingest ---
+
+        # --- Convert ---
+        recording_file = None
         try:
             audio_file.seek(0)
-            # Convert first to ensure we check the duration of the actual saved format (MP3)
-            mp3_file_object = convert_audio_to_mp3(audio_file)
-            if not mp3_file_object:
-                raise serializers.ValidationError("Audio conversion to MP3 failed.")
-
-            mp3_file_object.seek(0)
-            audio_info = MP3(mp3_file_object)
-            duration_seconds = audio_info.info.length
-            duration_minutes = duration_seconds / 60.0
-
-            if not check_recording_length(user, duration_minutes):
-                raise serializers.ValidationError(
-                    f"Recording length ({duration_minutes:.1f} min) exceeds your limit."
-                )
+            # Store the upload as-is when its format is already accepted,
+            # otherwise remux/convert it (see AUDIO_PASSTHROUGH_FORMATS)
+            recording_file, audio_info, transcription_proxy = prepare_recording(
+                audio_file, info=audio_info
+            )
+            if not recording_file:
+                raise serializers.ValidationError("Audio conversion failed.")
 
             # Reset pointer for saving/transcription
-            mp3_file_object.seek(0)
+            recording_file.seek(0)
 
         except Exception as e:
-            logger.error(
-                f"API Error converting/checking duration: {str(e)}", exc_info=True
-            )
+            logger.error(f"API Error converting audio: {str(e)}", exc_info=True)
             # Return DRF validation error
             raise serializers.ValidationError(f"Error processing audio: {str(e)}")
-        # --- End Convert & Check ---
+        # --- End Convert ---
 
         # Proceed with standard DRF object creation via serializer
         # We need to pass the converted file and user to perform_create or handle saving here.
@@ -167,21 +275,30 @@ class BrainDumpViewSet(viewsets.ModelViewSet):
 
         try:
             # Save the instance manually first to get an ID if needed by tasks
-            # Pass the *converted* mp3_file_object
+            # Pass the *converted* recording_file
             instance = serializer.save(
-                user=user, recording=mp3_file_object, transcription=""
+                user=user,
+                recording=recording_file,
+                transcription="",
+                duration_seconds=audio_info.duration,
             )  # Save basic instance
 
             # Transcribe
-            transcription = transcribe_audio_file(mp3_file_object)
+            # Send the small speech proxy when there is one, else the stored file
+            transcription = transcribe_audio_file(
+                transcription_proxy or recording_file, user=request.user
+            )
             if transcription:
                 instance.transcription = transcription
                 # Generate embedding
+                # No dump_id: the new transcription is not saved on the row yet
                 embedding = generate_embedding(
-                    dump_id=instance.id, transcription=transcription
-                )  # Use instance ID
+                    dump_id=None, transcription=transcription
+                )
                 if embedding:
                     instance.embedding = embedding
+                    instance.embedding_compact = compact_embedding(embedding)
+                    instance.embedding_model = settings.EMBEDDING_MODEL
                 else:
                     logger.error(
                         f"API: Failed to generate embedding for user {user.email}, dump {instance.id}"
@@ -191,6 +308,9 @@ class BrainDumpViewSet(viewsets.ModelViewSet):
 
             # Save again with transcription/embedding
             instance.save()
+            if transcription:
+                schedule_chunk_embeddings(instance)
+            record_usage(user, UsageEvent.RECORDING_MINUTES, duration_minutes)
 
             # Update tags
             # if transcription:
@@ -215,6 +335,24 @@ class BrainDumpViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @action(detail=True, methods=["get"], url_path="status")
+    def processing_status(self, request, pk=None):
+        """
+        Lightweight polling endpoint for asynchronous ingest.
+        Only reads the status columns, so the transcription is never decrypted.
+        """
+        dump_status = (
+            self.get_queryset()
+            .filter(id=pk)
+            .values("id", "processing_status", "processing_error")
+            .first()
+        )
+        if not dump_status:
+            return Response(
+                {"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(dump_status)
+
     # perform_create is not needed as logic moved to create
     def perform_create(self, serializer):
         pass  # Logic moved to 'create'
@@ -235,16 +373,24 @@ class BrainDumpViewSet(viewsets.ModelViewSet):
         if transcription:
             brain_dump.transcription = transcription
             brain_dump.edited = True
-            brain_dump.save(update_fields=["transcription", "edited"])
+            brain_dump.embedding_stale = True
+            brain_dump.save(
+                update_fields=[
+                    "transcription",
+                    "edited",
+                    "embedding_stale",
+                    "modified_at",
+                ]
+            )
 
             # Update tags
             # brain_dump.update_tags_from_transcription()
 
-            # Regenerate embedding
+            # Re-embed in the background once the edits settle
             try:
-                generate_embedding(dump_id=brain_dump.id)
+                schedule_embedding_refresh(brain_dump.id)
             except Exception as e:
-                logger.error(f"Error regenerating embedding: {e}")
+                logger.error(f"Error scheduling embedding refresh: {e}")
 
         serializer = self.get_serializer(brain_dump)
         return Response(serializer.data)
@@ -277,6 +423,8 @@ class PostViewSet(viewsets.ModelViewSet):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
     authentication_classes = [JWTAuthentication]
+    # ?cursor= from the previous response's `next`
+    pagination_class = KeysetPagination
 
     def _handle_uploaded_images(self, request, post_instance):
         logger.info(f"API: _handle_uploaded_images called for post {post_instance.id}.")
@@ -346,7 +494,12 @@ class PostViewSet(viewsets.ModelViewSet):
         return processing_notes
 
     def get_queryset(self):
-        return Post.objects.filter(user=self.request.user).order_by("-created_at")
+        queryset = Post.objects.filter(user=self.request.user).order_by("-created_at")
+        if self.action == "list":
+            # PostSerializer nests the images; one query for the whole page.
+            # Not for updates, which add images after loading the post
+            queryset = queryset.prefetch_related("images")
+        return queryset
 
     def update(self, request, *args, **kwargs):
         """
@@ -368,7 +521,9 @@ class PostViewSet(viewsets.ModelViewSet):
             # post_type = request.data.get("post_type", instance.post_type or "twitter") # Already part of instance
 
             # --- Check Usage Limit for Publishing ---
-            if not check_usage(request.user, "max_post_submissions"):
+            # Counted now, given back below unless the post is published
+            reservation = reserve(request.user, "max_post_submissions")
+            if not reservation:
                 # Even if limit reached, save other changes as draft
                 instance.content = content  # Save content changes
                 # Apply other non-status, non-content changes from request.data if any
@@ -438,16 +593,7 @@ class PostViewSet(viewsets.ModelViewSet):
                         ]:
                             setattr(instance, key, value)
                     instance.save()
-
-                    try:  # Increment usage
-                        user = request.user
-                        user.current_post_submissions += 1
-                        user.save(update_fields=["current_post_submissions"])
-                    except Exception as e:
-                        logger.error(
-                            f"API: Failed to update post submission counter: {e}"
-                        )
-
+                    reservation.commit()
                     detail_message = "Successfully published to Twitter."
                 else:
                     error_detail = "Failed to publish to Twitter."
@@ -498,6 +644,8 @@ class PostViewSet(viewsets.ModelViewSet):
                         setattr(instance, key, value)
                 instance.save()
                 detail_message = f"Error publishing to Twitter: {str(e)[:100]}. Post remains as draft."
+            # Not published (no-op after commit)
+            reservation.release()
 
             final_serializer_data = self.get_serializer(instance).data
             final_serializer_data["detail"] = detail_message
@@ -544,22 +692,18 @@ class PostViewSet(viewsets.ModelViewSet):
                 {"detail": "Content is required"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        # --- Check and Reset Daily Limits ---
-        # Check before checking specific limits like publishing
-        check_and_reset_daily_limits(request.user)
-        # --- End Check and Reset ---
-
         # --- Check Usage Limit for Publishing ---
-        should_increment_publish = False
+        # Counted now, given back below unless the post is published
+        reservation = None
         if status_value == Post.POSTED:
-            if not check_usage(request.user, "max_post_submissions"):
+            reservation = reserve(request.user, "max_post_submissions")
+            if not reservation:
                 return Response(
                     {
                         "detail": "Post submission limit reached. Save as draft or upgrade your plan."
                     },
                     status=status.HTTP_403_FORBIDDEN,
                 )
-            should_increment_publish = True  # Mark for increment later if successful
         # --- End Check Usage Limit ---
 
         # Create new post instance (don't save yet if publishing to link IDs first)
@@ -717,19 +861,8 @@ class PostViewSet(viewsets.ModelViewSet):
                                 f"API: Error associating brain dumps with published post: {e}"
                             )
 
-                    # Increment usage counter on successful publish
-                    try:
-                        user = request.user
-                        user.current_post_submissions += 1
-                        user.save(update_fields=["current_post_submissions"])
-                        logger.info(
-                            f"API Usage updated for user {user.email}: post_submissions={user.current_post_submissions}"
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"API: Failed to update post submission counter for user {request.user.email}: {e}",
-                            exc_info=True,
-                        )
+                    # Keep the submission counted on successful publish
+                    reservation.commit()
 
                     # Return successful result
                     image_processing_notes = self._handle_uploaded_images(
@@ -816,6 +949,9 @@ class PostViewSet(viewsets.ModelViewSet):
                     f"Error publishing to Twitter: {str(e)[:100]}. Post saved as draft."
                 )
                 return Response(final_serializer_data, status=status.HTTP_200_OK)
+            finally:
+                # Saved as draft instead (no-op after commit)
+                reservation.release()
 
         # Fallback for unhandled status_value, though logic should cover DRAFT and POSTED
         # This part should ideally not be reached if status_value is validated or defaults correctly
@@ -884,21 +1020,7 @@ class PostViewSet(viewsets.ModelViewSet):
                 max_chars=max_chars,
             )
             posts = json.loads(posts_json)
-
-            # --- Increment Usage Counter ---
-            try:
-                user = request.user
-                user.current_post_generations += 1
-                user.save(update_fields=["current_post_generations"])
-                logger.info(
-                    f"API Usage updated for user {user.email}: post_generations={user.current_post_generations}"
-                )
-            except Exception as e:
-                logger.error(
-                    f"API: Failed to update post generation counter for user {request.user.email}: {e}",
-                    exc_info=True,
-                )
-            # --- End Increment ---
+            # The generation was counted by limit_check
 
             # Include the user's character limit in the response
             return Response({"posts": posts, "char_limit": char_limit})
@@ -976,17 +1098,6 @@ class BrainDumpChatAPIView(views.APIView):
     # Apply limit check within the post method for APIView
     def post(self, request):
         user = request.user
-        # --- Check and Reset Daily Limits ---
-        check_and_reset_daily_limits(user)
-        # --- End Check and Reset ---
-
-        # --- Check Usage Limit ---
-        if not check_usage(user, "max_chat_messages"):
-            return Response(
-                {"detail": "Chat message limit reached. Please upgrade your plan."},
-                status=status.HTTP_403_FORBIDDEN,
-            )
-        # --- End Check ---
 
         # Get user's message from request
         message = request.data.get("message")
@@ -995,32 +1106,30 @@ class BrainDumpChatAPIView(views.APIView):
                 {"detail": "Message is required"}, status=status.HTTP_400_BAD_REQUEST
             )
 
+        # --- Check Usage Limit ---
+        # Counted now; only answered messages keep counting
+        reservation = reserve(user, "max_chat_messages")
+        if not reservation:
+            return Response(
+                {"detail": "Chat message limit reached. Please upgrade your plan."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        # --- End Check ---
+
         try:
             # Use the helper function to generate the response
             response_data, status_code = generate_chat_response(
                 user=request.user, message=message
             )
-
-            # --- Increment Usage Counter on Success ---
-            # Check status_code from the response tuple
             if status_code == status.HTTP_200_OK:
-                try:
-                    user.current_chat_messages += 1
-                    user.save(update_fields=["current_chat_messages"])
-                    logger.info(
-                        f"API Usage updated for user {user.email}: chat_messages={user.current_chat_messages}"
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"API: Failed to update chat message counter for user {user.email}: {e}",
-                        exc_info=True,
-                    )
-            # --- End Increment ---
-
+                reservation.commit()
+            else:
+                reservation.release()
             return Response(response_data, status=status_code)
 
         except Exception as e:
             logger.error(f"API Error in brain dump chat: {str(e)}", exc_info=True)
+            reservation.release()
             return Response(
                 {"detail": "An error occurred while processing your request"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -0,0 +1,111 @@
+# Blind keyword index for encrypted transcriptions: each distinct word is
+# stored as a keyed hash (HMAC-SHA256, 64 bits) in BrainDump.transcription_tokens,
+# so whole-word searches run in SQL against a GIN index without decrypting.
+# The hashes reveal which rows share a word, not the word itself.
+import base64
+import hashlib
+import hmac
+import re
+
+from django.conf import settings
+from django.db.models.expressions import RawSQL
+
+_KEY = None
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Too common to narrow a search; leaving them out keeps the arrays small
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from had has have he her his i if in is it
+    its me my no not of on or our she so that the their them then there they
+    this to up us was we were what when which who will with you your
+    """.split())
+
+
+def get_key():
+    """BLIND_INDEX_KEY, or a key derived from SECRET_KEY (distinct from the cipher's)."""
+    global _KEY
+    if _KEY is None:
+        if settings.BLIND_INDEX_KEY:
+            _KEY = base64.urlsafe_b64decode(settings.BLIND_INDEX_KEY)
+        else:
+            _KEY = hashlib.sha256(
+                b"blind-index:" + settings.SECRET_KEY.encode("utf-8")
+            ).digest()
+    return _KEY
+
+
+def tokenize(text):
+    """
+    The distinct searchable words of a text.
+
+    Words are lowercased; stopwords and words shorter than
+    BLIND_INDEX_MIN_TOKEN_LENGTH are dropped.
+
+    Returns:
+        set: Words
+    """
+    minimum = settings.BLIND_INDEX_MIN_TOKEN_LENGTH
+    return {
+        word
+        for word in _WORD.findall((text or "").lower())
+        if len(word) >= minimum and word not in STOPWORDS
+    }
+
+
+def token_hash(word):
+    digest = hmac.new(get_key(), word.encode("utf-8"), hashlib.sha256).digest()
+    # Signed so it fits a bigint column
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def token_hashes(text):
+    """
+    Blind index entries for a text (the value of BrainDump.transcription_tokens).
+
+    Returns:
+        list: Sorted 64-bit hashes of the text's distinct words
+    """
+    return sorted(token_hash(word) for word in tokenize(text))
+
+
+def keyword_filter(text, match_all=True):
+    """
+    Lookup for BrainDumps whose transcription contains the words of `text`.
+
+    Args:
+        text: Search query; only whole words match
+        match_all: Require every word (AND) rather than any of them (OR)
+
+    Returns:
+        dict: Filter kwargs, or None when the query has no searchable words
+    """
+    hashes = token_hashes(text)
+    if not hashes:
+        return None
+    lookup = "contains" if match_all else "overlap"
+    return {f"transcription_tokens__{lookup}": hashes}
+
+
+def keyword_matches(queryset, text, limit):
+    """
+    BrainDumps sharing words with `text`, most matching words first.
+
+    Returns:
+        QuerySet: Annotated with `keyword_score` (number of query words
+        present), or None when the query has no searchable words
+    """
+    hashes = token_hashes(text)
+    if not hashes:
+        return None
+    table = queryset.model._meta.db_table
+    score = RawSQL(
+        f'(SELECT count(*) FROM unnest("{table}".transcription_tokens) AS t '
+        f"WHERE t = ANY(%s))",
+        (hashes,),
+    )
+    return (
+        queryset.filter(transcription_tokens__overlap=hashes)
+        .annotate(keyword_score=score)
+        .order_by("-keyword_score", "-created_at")[:limit]
+    )
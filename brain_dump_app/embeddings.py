@@ -0,0 +1,590 @@
+# Embedding service: text-hash cache in front of a micro-batching API client,
+# plus chunking and chunk-level search for long transcriptions, and the
+# exact-or-index planner behind similarity searches
+import hashlib
+import hmac
+import logging
+import math
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+from pgvector.django import CosineDistance, MaxInnerProduct
+
+from utils import providers
+from utils.lru import LRUCache
+
+from . import blind_index
+from .models import COMPACT_EMBEDDING_DIMENSIONS, ChunkEmbedding, EmbeddingCacheEntry
+
+logger = logging.getLogger("project")
+
+# Recently used embeddings keyed by (text digest, model)
+_memory = LRUCache(
+    maxsize=settings.EMBEDDING_CACHE_LRU_SIZE,
+    ttl=settings.EMBEDDING_CACHE_TTL_DAYS * 86400,
+)
+
+_counter_lock = threading.Lock()
+_counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "api_calls": 0}
+
+
+def _count(name, amount=1):
+    with _counter_lock:
+        _counters[name] += amount
+
+
+def cache_stats():
+    """
+    Cache and batching counters for this process.
+
+    Returns:
+        dict: memory_hits, db_hits, misses, api_calls and the LRU size
+    """
+    with _counter_lock:
+        stats = dict(_counters)
+    stats["memory_size"] = len(_memory)
+    return stats
+
+
+_DIGEST_KEY = None
+
+
+def text_digest(text):
+    """
+    The cache key of a text: HMAC-SHA256 under a key derived from the blind
+    index key, so a stored digest cannot be checked against guessed texts.
+    """
+    global _DIGEST_KEY
+    if _DIGEST_KEY is None:
+        _DIGEST_KEY = hmac.new(
+            blind_index.get_key(), b"embedding-cache", hashlib.sha256
+        ).digest()
+    return hmac.new(_DIGEST_KEY, text.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def compact_embedding(vector):
+    """
+    The compact form of an embedding, for BrainDump.embedding_compact.
+
+    text-embedding-3 vectors can be shortened by keeping the leading
+    dimensions and rescaling to unit length (which is what the API's
+    `dimensions` parameter does), so no extra API call is needed.
+
+    Returns:
+        list: COMPACT_EMBEDDING_DIMENSIONS floats of unit length, or None
+    """
+    if vector is None:
+        return None
+    head = [float(x) for x in vector[:COMPACT_EMBEDDING_DIMENSIONS]]
+    norm = math.sqrt(sum(x * x for x in head))
+    return [x / norm for x in head] if norm else head
+
+
+def request_embeddings(texts):
+    """
+    Embed several texts with one API call.
+
+    Returns:
+        list: One vector per text, in order
+    """
+    response = providers.call(
+        providers.OPENAI,
+        "embeddings",
+        providers.get_openai_client().embeddings.create,
+        input=texts,
+        model=settings.EMBEDDING_MODEL,
+        timeout=settings.EMBEDDING_TIMEOUT,
+    )
+    _count("api_calls")
+    vectors = [None] * len(texts)
+    for item in response.data:
+        vectors[item.index] = item.embedding
+    return vectors
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embedding requests into multi-input API calls.
+
+    Callers get a Future from submit(). A background thread waits for the
+    first request, collects whatever else arrives within `window` seconds (up
+    to `max_size` texts) and sends them as one request.
+    """
+
+    def __init__(self, embed_batch, window, max_size):
+        self.embed_batch = embed_batch
+        self.window = window
+        self.max_size = max_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        # Worker processes may be forked after the thread was started
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, text):
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Identical texts in the same window share one input
+            waiting = {}
+            for text, future in batch:
+                waiting.setdefault(text, []).append(future)
+            texts = list(waiting)
+            try:
+                vectors = self.embed_batch(texts)
+            except Exception as e:
+                for futures in waiting.values():
+                    for future in futures:
+                        future.set_exception(e)
+                continue
+            if len(texts) > 1:
+                logger.debug(f"Embedded {len(texts)} texts in one request")
+            for text, vector in zip(texts, vectors):
+                for future in waiting[text]:
+                    future.set_result(vector)
+
+
+_batcher = EmbeddingBatcher(
+    request_embeddings,
+    window=settings.EMBEDDING_BATCH_WINDOW_MS / 1000.0,
+    max_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+)
+
+
+def _expiry_cutoff():
+    return timezone.now() - timedelta(days=settings.EMBEDDING_CACHE_TTL_DAYS)
+
+
+def _lookup(digests):
+    """Cached vectors for the given digests: LRU first, then the table."""
+    model = settings.EMBEDDING_MODEL
+    found = {}
+    missing = []
+    for digest in digests:
+        vector = _memory.get((digest, model))
+        if vector is not None:
+            found[digest] = vector
+        else:
+            missing.append(digest)
+    _count("memory_hits", len(found))
+    if not missing:
+        return found
+
+    rows = EmbeddingCacheEntry.objects.filter(
+        text_hmac__in=missing, model=model, last_used_at__gte=_expiry_cutoff()
+    ).values_list("pk", "text_hmac", "embedding")
+    used = []
+    for pk, digest, vector in rows:
+        vector = list(vector)
+        found[digest] = vector
+        _memory.set((digest, model), vector)
+        used.append(pk)
+    if used:
+        EmbeddingCacheEntry.objects.filter(pk__in=used).update(
+            last_used_at=timezone.now()
+        )
+    _count("db_hits", len(used))
+    return found
+
+
+def _store(vectors_by_digest):
+    model = settings.EMBEDDING_MODEL
+    for digest, vector in vectors_by_digest.items():
+        _memory.set((digest, model), vector)
+    EmbeddingCacheEntry.objects.bulk_create(
+        [
+            EmbeddingCacheEntry(text_hmac=digest, model=model, embedding=vector)
+            for digest, vector in vectors_by_digest.items()
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def embed_texts(texts):
+    """
+    Embeddings for several texts, using the cache and as few API calls as possible.
+
+    Args:
+        texts: Strings to embed (stripped before hashing and sending)
+
+    Returns:
+        list: One vector (list of floats) per text, None for empty texts
+
+    Raises:
+        openai.APIError and friends when the API call fails
+    """
+    texts = [(text or "").strip() for text in texts]
+    digests = {text: text_digest(text) for text in texts if text}
+    try:
+        cached = _lookup(set(digests.values()))
+    except Exception as e:
+        logger.warning(f"Embedding cache lookup failed: {e}")
+        cached = {}
+
+    pending = [text for text, digest in digests.items() if digest not in cached]
+    _count("misses", len(pending))
+    if pending:
+        if len(pending) == 1 and settings.EMBEDDING_BATCH_WINDOW_MS > 0:
+            fresh = [_batcher.submit(pending[0]).result()]
+        else:
+            fresh = []
+            size = settings.EMBEDDING_BATCH_MAX_SIZE
+            for start in range(0, len(pending), size):
+                fresh.extend(request_embeddings(pending[start : start + size]))
+        new_vectors = {digests[text]: vector for text, vector in zip(pending, fresh)}
+        cached.update(new_vectors)
+        try:
+            _store(new_vectors)
+        except Exception as e:
+            logger.warning(f"Could not store embeddings in cache: {e}")
+
+    return [cached[digests[text]] if text else None for text in texts]
+
+
+def embed_text(text):
+    """
+    Embedding of one text (cached, batched with concurrent callers).
+
+    Returns:
+        list: The vector, or None if the text is empty
+
+    Raises:
+        openai.APIError and friends when the API call fails
+    """
+    return embed_texts([text])[0]
+
+
+def prune_embedding_cache():
+    """
+    Delete cached embeddings not used within EMBEDDING_CACHE_TTL_DAYS.
+
+    Returns:
+        int: Number of rows deleted
+    """
+    deleted, _ = EmbeddingCacheEntry.objects.filter(
+        last_used_at__lt=_expiry_cutoff()
+    ).delete()
+    return deleted
+
+
+# --- Chunks ---
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_into_chunks(text, chunk_size=None, overlap=None):
+    """
+    Split a transcription into chunks of whole sentences.
+
+    Sentences are packed until a chunk would exceed chunk_size characters;
+    the next chunk starts with the trailing sentences of the previous one (up
+    to `overlap` characters) so a passage cut at a boundary is still found.
+    Sentences longer than a chunk are split between words.
+
+    Returns:
+        list: Chunk strings, in order
+    """
+    chunk_size = chunk_size or settings.EMBEDDING_CHUNK_SIZE
+    overlap = settings.EMBEDDING_CHUNK_OVERLAP if overlap is None else overlap
+
+    sentences = []
+    for sentence in _SENTENCE_END.split((text or "").strip()):
+        while len(sentence) > chunk_size:
+            cut = sentence.rfind(" ", 0, chunk_size)
+            cut = cut if cut > 0 else chunk_size
+            sentences.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            sentences.append(sentence)
+
+    chunks = []
+    current = []
+    length = 0
+    for sentence in sentences:
+        if current and length + len(sentence) + 1 > chunk_size:
+            chunks.append(" ".join(current))
+            # Carry the tail of this chunk over into the next one
+            carried = []
+            carried_length = 0
+            for previous in reversed(current):
+                if carried_length + len(previous) + 1 > overlap:
+                    break
+                carried.insert(0, previous)
+                carried_length += len(previous) + 1
+            current = carried
+            length = carried_length
+        current.append(sentence)
+        length += len(sentence) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def generate_chunk_embeddings(brain_dump):
+    """
+    Replace a BrainDump's chunk embeddings with ones for its current text.
+
+    All chunks are embedded with as few multi-input API calls as possible
+    (unchanged chunks of an edited transcription come from the cache).
+
+    Returns:
+        int: Number of chunks stored
+
+    Raises:
+        openai.APIError and friends when the API call fails
+    """
+    chunks = split_into_chunks(brain_dump.transcription)
+    vectors = embed_texts(chunks) if chunks else []
+    with transaction.atomic():
+        ChunkEmbedding.objects.filter(brain_dump=brain_dump).delete()
+        ChunkEmbedding.objects.bulk_create(
+            [
+                ChunkEmbedding(
+                    brain_dump=brain_dump,
+                    user_id=brain_dump.user_id,
+                    chunk_index=index,
+                    chunk_text=chunk,
+                    embedding=vector,
+                )
+                for index, (chunk, vector) in enumerate(zip(chunks, vectors))
+            ]
+        )
+    return len(chunks)
+
+
+def get_similar_chunks(user, query_embedding, limit=None):
+    """
+    The user's transcription chunks closest to a query embedding.
+
+    Chunks of dumps edited since they were embedded are pushed down by
+    EMBEDDING_STALE_PENALTY (or left out when it is None).
+
+    Returns:
+        list: ChunkEmbedding objects with a `similarity` distance, best first
+    """
+    limit = limit or settings.CHAT_CONTEXT_CHUNKS
+    chunks = (
+        ChunkEmbedding.objects.filter(user=user)
+        .select_related("brain_dump")
+        .only(
+            "id",
+            "chunk_index",
+            "chunk_text",
+            "brain_dump__id",
+            "brain_dump__created_at",
+            "brain_dump__embedding_stale",
+        )
+    )
+    if settings.EMBEDDING_STALE_PENALTY is None:
+        chunks = chunks.filter(brain_dump__embedding_stale=False)
+    candidates = nearest(
+        chunks,
+        query_embedding,
+        limit * 2 if settings.EMBEDDING_STALE_PENALTY else limit,
+    )
+    return apply_stale_penalty(
+        candidates, lambda chunk: chunk.brain_dump.embedding_stale, limit
+    )
+
+
+def apply_stale_penalty(candidates, is_stale, limit):
+    """
+    Re-rank search results with EMBEDDING_STALE_PENALTY added to stale ones.
+
+    The penalty is applied after the search, which orders by plain distance
+    so the vector index can serve it; fetch a few extra candidates.
+
+    Args:
+        candidates: Results of nearest(), nearest first
+        is_stale: Function telling whether a result's embedding is stale
+        limit: Number of results to keep
+
+    Returns:
+        list: The best `limit` results
+    """
+    penalty = settings.EMBEDDING_STALE_PENALTY
+    if penalty:
+        for candidate in candidates:
+            if is_stale(candidate):
+                candidate.similarity += penalty
+        candidates.sort(key=lambda candidate: candidate.similarity)
+    return candidates[:limit]
+
+
+def fuse_rankings(rankings, k=60):
+    """
+    Merge best-first result lists by reciprocal rank fusion.
+
+    A result scores the sum of 1 / (k + rank) over the lists it appears in,
+    so results found by several searches rise without having to compare
+    their scores (cosine distances vs. keyword counts).
+
+    Args:
+        rankings: Lists of model instances, best first
+        k: Damping constant; 60 is the usual choice
+
+    Returns:
+        list: Distinct instances (by pk), best first; the first list's copy
+        of an instance is kept
+    """
+    scores = {}
+    instances = {}
+    for ranking in rankings:
+        for rank, instance in enumerate(ranking, start=1):
+            scores[instance.pk] = scores.get(instance.pk, 0.0) + 1.0 / (k + rank)
+            instances.setdefault(instance.pk, instance)
+    return [instances[pk] for pk in sorted(scores, key=scores.get, reverse=True)]
+
+
+# --- Search planning ---
+
+# Whether the database's pgvector has iterative index scans (0.8+); None
+# until the first index search finds out
+_iterative_scans = None
+
+
+def _set_local(cursor, values):
+    """
+    Set Postgres settings for the rest of the current transaction.
+
+    Returns:
+        dict: The values they had before
+    """
+    names = list(values)
+    cursor.execute(
+        "SELECT " + ", ".join(["current_setting(%s, true)"] * len(names)), names
+    )
+    previous = dict(zip(names, cursor.fetchone()))
+    cursor.execute(
+        "SELECT " + ", ".join(["set_config(%s, %s, true)"] * len(names)),
+        [part for name in names for part in (name, str(values[name]))],
+    )
+    return previous
+
+
+def _index_settings():
+    return {"hnsw.ef_search": settings.VECTOR_SEARCH_HNSW_EF_SEARCH}
+
+
+def _iterative_scan_settings():
+    # relaxed_order: keep scanning the index until enough rows pass the
+    # filter, at the cost of results being only roughly ordered
+    return {"hnsw.iterative_scan": "relaxed_order"}
+
+
+def _run_search(queryset, exact):
+    """Evaluate a distance-ordered queryset with the planner settings applied."""
+    global _iterative_scans
+    connection = connections[queryset.db]
+    nested = connection.in_atomic_block
+    with transaction.atomic(using=queryset.db), connection.cursor() as cursor:
+        if exact:
+            # Bitmap scans (of the user_id index) stay allowed
+            previous = _set_local(cursor, {"enable_indexscan": "off"})
+        else:
+            previous = _set_local(cursor, _index_settings())
+            if _iterative_scans is not False:
+                try:
+                    with transaction.atomic(using=queryset.db):
+                        previous.update(_set_local(cursor, _iterative_scan_settings()))
+                    _iterative_scans = True
+                except DatabaseError:
+                    logger.info(
+                        "pgvector has no iterative index scans; upgrade to 0.8+"
+                    )
+                    _iterative_scans = False
+        rows = list(queryset)
+        if nested:
+            # Otherwise the settings would last until the caller's transaction ends
+            restore = {name: value for name, value in previous.items() if value}
+            if restore:
+                _set_local(cursor, restore)
+    return rows
+
+
+def nearest(queryset, query_embedding, limit, field="embedding", unit_vectors=False):
+    """
+    The `limit` rows of a queryset nearest to a query embedding.
+
+    The search is planned per call. Up to VECTOR_SEARCH_EXACT_MAX_ROWS rows
+    (a typical user's vectors), index scans are switched off so every
+    distance is computed and the answer is exact: the vector indexes are
+    global, and scanning one then filtering by user can return fewer than
+    `limit` rows. Larger querysets use the index with iterative scans, and
+    are searched exactly after all if the index still comes up short.
+
+    Args:
+        queryset: The rows to search, already filtered (e.g. by user)
+        query_embedding: Vector to compare with
+        limit: Number of results wanted
+        field: Vector field to compare
+        unit_vectors: The field and query are normalized: rank by inner
+            product (cheaper, same order as cosine distance)
+
+    Returns:
+        list: Instances with a `similarity` cosine distance, nearest first
+    """
+    distance = (MaxInnerProduct if unit_vectors else CosineDistance)(
+        field, query_embedding
+    )
+    queryset = queryset.filter(**{f"{field}__isnull": False})
+    ranked = queryset.annotate(similarity=distance).order_by("similarity")[:limit]
+    if connections[queryset.db].vendor != "postgresql":
+        rows = list(ranked)
+    else:
+        size = queryset.count()
+        rows = None
+        if size > settings.VECTOR_SEARCH_EXACT_MAX_ROWS:
+            rows = _run_search(ranked, exact=False)
+            if len(rows) >= min(limit, size):
+                # Iterative scans return rows only roughly in order
+                rows.sort(key=lambda row: row.similarity)
+            else:
+                logger.info(
+                    f"Vector index returned {len(rows)} of {limit} rows, searching exactly"
+                )
+                rows = None
+        if rows is None:
+            rows = _run_search(ranked, exact=True) if size else []
+    if unit_vectors:
+        # <#> is the negative inner product; for unit vectors 1 + it is the
+        # cosine distance, so similarity means the same either way
+        for row in rows:
+            row.similarity += 1
+    return rows
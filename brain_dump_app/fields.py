@@ -1,10 +1,12 @@
 # brain_dump_app/fields.py
 from django.db import models
+from django.db.models.query_utils import DeferredAttribute
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 import base64
 import hashlib
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -47,10 +49,209 @@ def get_cipher_suite():
     return _CIPHER_SUITE
 
 
+# Storage format, as raw bytes (bytea on PostgreSQL):
+#   version (0x01) | key id (1 byte) | nonce (12 bytes) | AES-256-GCM ciphertext + tag
+# 30 bytes of overhead, against 57+ plus base64 (a third) for Fernet. Values
+# written before are Fernet tokens ("gAAAAA..."), still readable with the
+# SECRET_KEY derived key; rotate_encryption rewrites them.
+FORMAT_V1 = 1
+NONCE_SIZE = 12
+V1_OVERHEAD = 2 + NONCE_SIZE + 16
+# Key id of the AES-GCM key derived from SECRET_KEY. It is always loaded, so
+# values written before ENCRYPTION_KEYS was configured stay readable (and
+# rotate_encryption can move them to a configured key).
+DERIVED_KEY_ID = 1
+_FERNET_PREFIX = b"gAAAAA"
+_AEAD_KEYS = None
+
+
+class DecryptionError(ValueError):
+    """An AES-GCM value that does not decrypt: tampered, truncated or under another key."""
+
+
+def get_encryption_keys():
+    """
+    AES-GCM ciphers by key id.
+
+    Key DERIVED_KEY_ID (1) derived from SECRET_KEY, plus ENCRYPTION_KEYS
+    ({id: urlsafe base64 32-byte key}, ids 2-255).
+    """
+    global _AEAD_KEYS
+    if _AEAD_KEYS is None:
+        try:
+            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        except ImportError:
+            raise ImproperlyConfigured(
+                "Cryptography library is not installed. Please install it to use EncryptedTextField."
+            )
+        keys = {
+            int(key_id): base64.urlsafe_b64decode(key)
+            for key_id, key in settings.ENCRYPTION_KEYS.items()
+        }
+        for key_id, key in keys.items():
+            if not DERIVED_KEY_ID < key_id <= 255 or len(key) != 32:
+                raise ImproperlyConfigured(
+                    f"ENCRYPTION_KEYS[{key_id}]: ids must be 2-255 (1 is the "
+                    "SECRET_KEY derived key) and keys 32 bytes"
+                )
+        keys[DERIVED_KEY_ID] = hashlib.sha256(b"aes-gcm:" + get_key()).digest()
+        _AEAD_KEYS = {key_id: AESGCM(key) for key_id, key in keys.items()}
+    return _AEAD_KEYS
+
+
+def primary_key_id():
+    """The key new values are encrypted with: ENCRYPTION_PRIMARY_KEY_ID or the highest id."""
+    keys = get_encryption_keys()
+    key_id = settings.ENCRYPTION_PRIMARY_KEY_ID or max(keys)
+    if key_id not in keys:
+        raise ImproperlyConfigured(f"ENCRYPTION_PRIMARY_KEY_ID {key_id} has no key")
+    return key_id
+
+
+def _as_bytes(token):
+    # psycopg2 returns bytea as memoryview, psycopg 3 as bytes; text columns
+    # (not migrated yet, other backends) give str
+    if isinstance(token, str):
+        return token.encode("utf-8")
+    return bytes(token)
+
+
+def key_id_of(token):
+    """
+    Key id a stored value was encrypted with.
+
+    Returns:
+        int: The key id, or None for legacy Fernet (or unencrypted) values
+    """
+    token = _as_bytes(token)
+    if len(token) > 2 + NONCE_SIZE and token[0] == FORMAT_V1:
+        return token[1]
+    return None
+
+
+def encrypt(text):
+    """
+    Encrypt a string with the primary key.
+
+    Returns:
+        bytes: version | key id | nonce | ciphertext and tag
+    """
+    key_id = primary_key_id()
+    nonce = os.urandom(NONCE_SIZE)
+    sealed = get_encryption_keys()[key_id].encrypt(nonce, text.encode("utf-8"), None)
+    return bytes((FORMAT_V1, key_id)) + nonce + sealed
+
+
+def decrypt(value):
+    """
+    Decrypt a value stored by EncryptedTextField, in either format.
+
+    Values that are neither (e.g. written before encryption was added) are
+    returned as they are.
+
+    Raises:
+        DecryptionError: If an AES-GCM value fails authentication
+        ImproperlyConfigured: If its key id is not configured
+    """
+    token = _as_bytes(value)
+    key_id = key_id_of(token)
+    if key_id is None:
+        return _decrypt_fernet(token)
+    from cryptography.exceptions import InvalidTag
+
+    cipher = get_encryption_keys().get(key_id)
+    if cipher is None:
+        raise ImproperlyConfigured(f"No encryption key with id {key_id}")
+    nonce = token[2 : 2 + NONCE_SIZE]
+    try:
+        return cipher.decrypt(nonce, token[2 + NONCE_SIZE :], None).decode("utf-8")
+    except InvalidTag:
+        raise DecryptionError(
+            f"Value under key {key_id} does not decrypt (corrupted or tampered)"
+        )
+
+
+def _decrypt_fernet(token):
+    from cryptography.fernet import InvalidToken
+
+    try:
+        return get_cipher_suite().decrypt(token).decode("utf-8")
+    except InvalidToken:
+        value = token.decode("utf-8", errors="replace")
+        if token.startswith(_FERNET_PREFIX):
+            logger.warning(
+                f"InvalidToken: Could not decrypt value from DB (value might be corrupted): {value[:50]}..."
+            )
+        # Return the original value if it cannot be decrypted (e.g., if it was never encrypted)
+        return value
+
+
+class Ciphertext:
+    """
+    An encrypted value as loaded from the database, not decrypted yet.
+
+    Model attributes never expose it: the field's descriptor decrypts it on
+    first access and keeps the plaintext. values()/values_list() results
+    hold it as is; str() decrypts.
+    """
+
+    __slots__ = ("token",)
+
+    def __init__(self, token):
+        self.token = token
+
+    def __str__(self):
+        return decrypt(self.token)
+
+    def __repr__(self):
+        return "<Ciphertext>"
+
+
+class DecryptOnAccess(DeferredAttribute):
+    """
+    Field descriptor that decrypts a loaded Ciphertext on first access.
+
+    It is a data descriptor (defines __set__) so reads go through __get__
+    even though the value lives in the instance __dict__.
+    """
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, Ciphertext):
+            value = instance.__dict__[self.field.attname] = decrypt(value.token)
+        return value
+
+
 class EncryptedTextField(models.TextField):
     description = (
-        "A TextField that automatically encrypts and decrypts its content using Fernet."
+        "A TextField that automatically encrypts and decrypts its content "
+        "(AES-GCM with versioned keys; legacy Fernet values are still read)."
     )
+    # Rows are decrypted field by field when read, not when loaded: list and
+    # search queries often never touch the text
+    descriptor_class = DecryptOnAccess
+
+    def pre_save(self, model_instance, add):
+        # A value that was never read is saved back as the same ciphertext
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, Ciphertext):
+            return value
+        return super().pre_save(model_instance, add)
+
+    def get_internal_type(self):
+        # Not "TextField": the schema editor compares internal types to decide
+        # whether altering a column needs a USING cast, and text -> bytea does
+        # (the AlterFields of migrations 0017 and 0018, on a new database)
+        return "EncryptedTextField"
+
+    def db_type(self, connection):
+        # Ciphertext is stored as raw bytes
+        if connection.vendor == "postgresql":
+            return "bytea"
+        return connection.data_types["TextField"] % self.db_type_parameters(connection)
 
     def get_prep_value(self, value):
         """
@@ -59,18 +260,15 @@ class EncryptedTextField(models.TextField):
         """
         if value is None:
             return None
+        if isinstance(value, Ciphertext):
+            return value.token
 
-        # Ensure value is a string, then encode to bytes for encryption
+        # Ensure value is a string before encrypting
         if not isinstance(value, str):
             value = str(value)
 
-        value_bytes = value.encode("utf-8")
-
         try:
-            cipher_suite = get_cipher_suite()
-            encrypted_data = cipher_suite.encrypt(value_bytes)
-            # Store as a string (Fernet output is bytes, so decode to UTF-8)
-            return encrypted_data.decode("utf-8")
+            return encrypt(value)
         except Exception as e:
             logger.error(
                 f"Encryption failed for value: {str(value)[:50]}... Error: {e}"
@@ -81,49 +279,23 @@ class EncryptedTextField(models.TextField):
 
     def from_db_value(self, value, expression, connection):
         """
-        Decrypts the value when loading from the database.
-        Value from DB is expected to be a string (the encrypted representation).
+        Wraps the encrypted value loaded from the database; it is decrypted
+        when the model attribute is first read (see DecryptOnAccess).
         """
         if value is None:
             return None
-
-        # Value from DB should be a string
-        if not isinstance(value, str):
-            # This case should ideally not happen if get_prep_value stores as str
-            logger.warning(
-                f"EncryptedTextField received non-string value from DB: {type(value)}"
-            )
-            value = str(value)
-
-        value_bytes = value.encode("utf-8")
-
-        try:
-            from cryptography.fernet import InvalidToken
-
-            cipher_suite = get_cipher_suite()
-            decrypted_data = cipher_suite.decrypt(value_bytes)
-            return decrypted_data.decode("utf-8")
-        except InvalidToken:
-            logger.warning(
-                f"InvalidToken: Could not decrypt value from DB (value might be unencrypted or corrupted): {value[:50]}..."
-            )
-            # Return the original value if it cannot be decrypted (e.g., if it was never encrypted)
-            return value
-        except Exception as e:
-            logger.error(
-                f"Decryption error for value {value[:50]}...: {e}. Returning raw value."
-            )
-            # Fallback for other decryption errors
-            return value
+        return Ciphertext(_as_bytes(value))
 
     def to_python(self, value):
         """
         Converts value to a Python string.
-        This is called after from_db_value when loading from DB,
-        and also when assigning a value to the field in Python code.
+        This is called when assigning a value to the field in Python code
+        (forms, deserialization).
         """
         if isinstance(value, str) or value is None:
             return value
-        if isinstance(value, bytes):  # Should ideally be handled by from_db_value
-            return value.decode("utf-8")
+        if isinstance(value, Ciphertext):
+            return decrypt(value.token)
+        if isinstance(value, (bytes, memoryview)):  # Should ideally be handled by from_db_value
+            return decrypt(value)
         return str(value)
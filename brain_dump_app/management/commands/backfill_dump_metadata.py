@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from brain_dump_app.models import BrainDump
+from utils.convert_audio import probe_audio
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the BrainDump columns derived from the transcription (preview, "
+        "length, has_transcription, blind index) for dumps saved before they "
+        "existed (migration 0031 does this once, but for the blind index), "
+        "and with --durations the recording length from the audio files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Rows decrypted per batch"
+        )
+        parser.add_argument("--all", action="store_true", help="Recompute every row")
+        parser.add_argument(
+            "--durations",
+            action="store_true",
+            help="Also probe recordings without duration_seconds (reads the files)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        queryset = BrainDump.objects.only("id", "transcription")
+        if not options["all"]:
+            # Never computed; empty transcriptions are cheap to redo
+            queryset = queryset.filter(has_transcription=False)
+        done = self._batches(
+            queryset,
+            batch_size,
+            self._update_metadata,
+            list(BrainDump.TRANSCRIPTION_DERIVED_FIELDS),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Updated metadata of {done} dumps"))
+
+        if options["durations"]:
+            queryset = (
+                BrainDump.objects.only("id", "recording")
+                .filter(duration_seconds__isnull=True)
+                .exclude(recording="")
+            )
+            done = self._batches(
+                queryset, batch_size, self._update_duration, ["duration_seconds"]
+            )
+            self.stdout.write(self.style.SUCCESS(f"Probed {done} recordings"))
+
+    def _batches(self, queryset, batch_size, update, fields):
+        # Keyset pagination by id, so the command can be stopped and rerun
+        last_id = None
+        done = 0
+        start = time.monotonic()
+        while True:
+            page = queryset.order_by("pk")
+            if last_id is not None:
+                page = page.filter(pk__gt=last_id)
+            batch = list(page[:batch_size])
+            if not batch:
+                break
+            for brain_dump in batch:
+                update(brain_dump)
+            BrainDump.objects.bulk_update(batch, fields)
+            last_id = batch[-1].pk
+            done += len(batch)
+            self.stdout.write(
+                f"{done} done in {time.monotonic() - start:.1f}s, last id {last_id}"
+            )
+        return done
+
+    def _update_metadata(self, brain_dump):
+        brain_dump.update_transcription_metadata()
+
+    def _update_duration(self, brain_dump):
+        try:
+            with brain_dump.recording.open("rb") as recording:
+                brain_dump.duration_seconds = probe_audio(recording).duration
+        except Exception as e:
+            self.stderr.write(f"Could not probe {brain_dump.recording.name}: {e}")
@@ -0,0 +1,212 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from brain_dump_app.embeddings import (
+    compact_embedding,
+    request_embeddings,
+    split_into_chunks,
+)
+from brain_dump_app.models import BrainDump, ChunkEmbedding
+from utils.rate_limit import RateLimiter
+
+logger = logging.getLogger("project")
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate embeddings for brain dumps that have none (or, with --reembed, "
+        "that were embedded with another model) using batched API calls"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Texts per embeddings request",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Embeddings requests in flight at once",
+        )
+        parser.add_argument(
+            "--requests-per-minute",
+            type=float,
+            default=300,
+            help="Upper bound on embeddings requests per minute",
+        )
+        parser.add_argument(
+            "--reembed",
+            action="store_true",
+            help=f"Also redo embeddings not made with EMBEDDING_MODEL ({settings.EMBEDDING_MODEL})",
+        )
+        parser.add_argument(
+            "--chunks",
+            action="store_true",
+            help="Build chunk embeddings for brain dumps that have none",
+        )
+        parser.add_argument(
+            "--after",
+            help="Resume after this brain dump id (printed as progress is made)",
+        )
+        parser.add_argument("--limit", type=int, help="Stop after this many brain dumps")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        concurrency = max(1, options["concurrency"])
+        limiter = RateLimiter(
+            options["requests_per_minute"] / 60.0, burst=concurrency
+        )
+        model = settings.EMBEDDING_MODEL
+        chunk_mode = options["chunks"]
+
+        if chunk_mode:
+            queryset = BrainDump.objects.filter(chunk_embeddings__isnull=True)
+            what = "chunk embeddings"
+        else:
+            candidates = Q(embedding__isnull=True)
+            if options["reembed"]:
+                candidates |= ~Q(embedding_model=model)
+            queryset = BrainDump.objects.filter(candidates)
+            what = "embeddings"
+        queryset = queryset.only("id", "user", "transcription")
+        total = queryset.count()
+        if options["limit"]:
+            total = min(total, options["limit"])
+        self.stdout.write(f"{total} brain dumps need {what} ({model})")
+
+        def embed_texts(texts):
+            vectors = []
+            for start in range(0, len(texts), batch_size):
+                limiter.acquire()
+                vectors.extend(request_embeddings(texts[start : start + batch_size]))
+            return vectors
+
+        def write(batch, texts_per_dump, vectors):
+            if not chunk_mode:
+                for brain_dump, vector in zip(batch, vectors):
+                    brain_dump.embedding = vector
+                    brain_dump.embedding_compact = compact_embedding(vector)
+                    brain_dump.embedding_model = model
+                    brain_dump.embedding_stale = False
+                BrainDump.objects.bulk_update(
+                    batch,
+                    [
+                        "embedding",
+                        "embedding_compact",
+                        "embedding_model",
+                        "embedding_stale",
+                    ],
+                    batch_size=batch_size,
+                )
+                return
+            rows = []
+            position = 0
+            for brain_dump, chunks in zip(batch, texts_per_dump):
+                for index, chunk in enumerate(chunks):
+                    rows.append(
+                        ChunkEmbedding(
+                            brain_dump=brain_dump,
+                            user_id=brain_dump.user_id,
+                            chunk_index=index,
+                            chunk_text=chunk,
+                            embedding=vectors[position],
+                        )
+                    )
+                    position += 1
+            with transaction.atomic():
+                ChunkEmbedding.objects.filter(brain_dump__in=batch).delete()
+                ChunkEmbedding.objects.bulk_create(rows, batch_size=500)
+
+        # Rows are read by primary key (keyset pagination, no OFFSET) and
+        # written back in the same order, so the last id written is always a
+        # safe --after resume point. Rerunning without --after also resumes,
+        # since finished rows no longer match.
+        last_id = options["after"]
+        done = skipped = failed = 0
+        start = time.monotonic()
+        in_flight = deque()
+
+        def write_oldest():
+            nonlocal done, failed, last_id
+            batch, texts_per_dump, future = in_flight.popleft()
+            try:
+                write(batch, texts_per_dump, future.result())
+            except Exception as e:
+                failed += len(batch)
+                logger.error(f"Embedding backfill batch failed: {e}")
+            else:
+                done += len(batch)
+            if not failed:
+                # After a failure, keep pointing before the failed rows
+                last_id = batch[-1].pk
+            elapsed = time.monotonic() - start
+            self.stdout.write(
+                f"{done}/{total} embedded ({failed} failed, {skipped} empty), "
+                f"{done / elapsed if elapsed else 0:.1f} rows/sec, last id {last_id}"
+            )
+
+        seen = 0
+        try:
+            with ThreadPoolExecutor(
+                max_workers=concurrency, thread_name_prefix="backfill"
+            ) as executor:
+                cursor = last_id
+                while not options["limit"] or seen < options["limit"]:
+                    page_size = batch_size
+                    if options["limit"]:
+                        page_size = min(page_size, options["limit"] - seen)
+                    page = queryset.order_by("pk")
+                    if cursor:
+                        page = page.filter(pk__gt=cursor)
+                    page = list(page[:page_size])
+                    if not page:
+                        break
+                    cursor = page[-1].pk
+                    seen += len(page)
+
+                    batch = [
+                        d for d in page if d.transcription and d.transcription.strip()
+                    ]
+                    skipped += len(page) - len(batch)
+                    if not batch:
+                        continue
+                    if chunk_mode:
+                        texts_per_dump = [
+                            split_into_chunks(d.transcription) for d in batch
+                        ]
+                    else:
+                        texts_per_dump = [[d.transcription.strip()] for d in batch]
+                    texts = [text for texts in texts_per_dump for text in texts]
+                    in_flight.append(
+                        (batch, texts_per_dump, executor.submit(embed_texts, texts))
+                    )
+                    if len(in_flight) >= concurrency:
+                        write_oldest()
+                while in_flight:
+                    write_oldest()
+        except KeyboardInterrupt:
+            self.stderr.write(
+                f"Interrupted. Resume with --after {last_id}"
+                if last_id
+                else "Interrupted before any batch was written."
+            )
+            return
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Embedded {done} brain dumps in {elapsed:.1f}s "
+                f"({done / elapsed if elapsed else 0:.1f} rows/sec); "
+                f"{failed} failed, {skipped} without transcription"
+            )
+        )
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from brain_dump_app.blind_index import token_hashes
+from brain_dump_app.models import BrainDump
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill BrainDump.transcription_tokens (the blind keyword index) for dumps "
+        "saved before it existed, or for all dumps with --all after changing "
+        "BLIND_INDEX_KEY or the tokenizer"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Rows decrypted per batch"
+        )
+        parser.add_argument("--all", action="store_true", help="Rebuild every row")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        queryset = BrainDump.objects.only("id", "transcription")
+        if not options["all"]:
+            # Empty transcriptions also have no tokens; they are cheap to redo
+            queryset = queryset.filter(transcription_tokens=[])
+
+        # Keyset pagination by id: rows that are done drop out of the filter,
+        # so the command can be stopped and rerun at any time
+        last_id = None
+        done = 0
+        start = time.monotonic()
+        while True:
+            page = queryset.order_by("pk")
+            if last_id is not None:
+                page = page.filter(pk__gt=last_id)
+            batch = list(page[:batch_size])
+            if not batch:
+                break
+            for brain_dump in batch:
+                brain_dump.transcription_tokens = token_hashes(brain_dump.transcription)
+            BrainDump.objects.bulk_update(batch, ["transcription_tokens"])
+            last_id = batch[-1].pk
+            done += len(batch)
+            self.stdout.write(f"{done} indexed, last id {last_id}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {done} brain dumps in {time.monotonic() - start:.1f}s"
+            )
+        )
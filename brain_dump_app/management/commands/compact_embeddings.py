@@ -0,0 +1,71 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from brain_dump_app.models import COMPACT_EMBEDDING_DIMENSIONS, BrainDump
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill BrainDump.embedding_compact from the full embeddings, in batches, "
+        "inside the database (no API calls). Run after deploying the column and "
+        "before turning on EMBEDDING_SEARCH_COMPACT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Rows updated per statement"
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute every row, e.g. after changing COMPACT_EMBEDDING_DIMENSIONS",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Seconds to sleep between batches to limit load",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Compact embeddings need PostgreSQL with pgvector 0.7+")
+
+        table = BrainDump._meta.db_table
+        dimensions = COMPACT_EMBEDDING_DIMENSIONS
+        pending = "" if options["all"] else "AND embedding_compact IS NULL"
+        # Same as embeddings.compact_embedding(): leading dimensions, unit length
+        sql = (
+            f'UPDATE "{table}" SET embedding_compact = '
+            f"l2_normalize(subvector(embedding, 1, {dimensions}))::halfvec({dimensions}) "
+            f'WHERE id IN (SELECT id FROM "{table}" '
+            f"WHERE embedding IS NOT NULL {pending} AND id > %s ORDER BY id LIMIT %s) "
+            f"RETURNING id"
+        )
+
+        # Keyset pagination by id, each batch committed on its own, so the
+        # command can be stopped and rerun at any time
+        last_id = uuid.UUID(int=0)
+        done = 0
+        start = time.monotonic()
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [last_id, options["batch_size"]])
+                ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            last_id = max(ids)
+            done += len(ids)
+            self.stdout.write(f"{done} compacted, last id {last_id}")
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compacted {done} embeddings to {dimensions} dimensions "
+                f"in {time.monotonic() - start:.1f}s"
+            )
+        )
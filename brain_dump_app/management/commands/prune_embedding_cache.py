@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from brain_dump_app.embeddings import prune_embedding_cache
+
+
+class Command(BaseCommand):
+    help = "Delete cached embeddings not used within EMBEDDING_CACHE_TTL_DAYS"
+
+    def handle(self, *args, **options):
+        deleted = prune_embedding_cache()
+        self.stdout.write(
+            f"Deleted {deleted} embedding cache entries unused for "
+            f"{settings.EMBEDDING_CACHE_TTL_DAYS} days"
+        )
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from brain_dump_app.transcription_cache import prune_transcription_cache
+
+
+class Command(BaseCommand):
+    help = "Delete cached transcriptions not used within TRANSCRIPTION_CACHE_TTL_DAYS"
+
+    def handle(self, *args, **options):
+        deleted = prune_transcription_cache()
+        self.stdout.write(
+            f"Deleted {deleted} transcription cache entries unused for "
+            f"{settings.TRANSCRIPTION_CACHE_TTL_DAYS} days"
+        )
@@ -0,0 +1,134 @@
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from brain_dump_app.fields import (
+    Ciphertext,
+    DecryptionError,
+    EncryptedTextField,
+    V1_OVERHEAD,
+    decrypt,
+    key_id_of,
+    primary_key_id,
+)
+
+
+def encrypted_models():
+    """(model, [EncryptedTextField, ...]) for every model that has such fields."""
+    for model in apps.get_models():
+        fields = [
+            field
+            for field in model._meta.concrete_fields
+            if isinstance(field, EncryptedTextField)
+        ]
+        if fields:
+            yield model, fields
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-encrypt EncryptedTextField values that are legacy Fernet tokens or "
+        "use a key other than the primary one (ENCRYPTION_PRIMARY_KEY_ID), in "
+        "keyset-paginated batches. Values that do not decrypt are left as "
+        "they are and reported. Safe to stop and rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--model",
+            action="append",
+            help="Only this model (app_label.ModelName); can be repeated",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Count what would be rewritten"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        key_id = primary_key_id()
+        targets = list(encrypted_models())
+        if options["model"]:
+            wanted = {label.lower() for label in options["model"]}
+            targets = [(m, f) for m, f in targets if m._meta.label_lower in wanted]
+            if len(targets) != len(wanted):
+                raise CommandError("Unknown model or model without encrypted fields")
+
+        self.stdout.write(f"Rotating to key {key_id}")
+        for model, fields in targets:
+            self._rotate(model, fields, key_id, batch_size, options["dry_run"])
+
+    def _rotate(self, model, fields, key_id, batch_size, dry_run):
+        names = [field.attname for field in fields]
+        queryset = model._default_manager.only(model._meta.pk.name, *names).order_by(
+            "pk"
+        )
+        scanned = rewritten = bytes_before = bytes_after = 0
+        failed = []
+        last_pk = None
+        start = time.monotonic()
+        while True:
+            # Rows are locked while they are re-encrypted so a concurrent edit
+            # is neither overwritten nor lost
+            with transaction.atomic():
+                page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+                batch = list(page.select_for_update()[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                # Rows by the fields they need rewritten: only those are
+                # written back, never one that failed to decrypt
+                changed = defaultdict(list)
+                for instance in batch:
+                    dirty = []
+                    for name in names:
+                        # The raw value, still encrypted (see DecryptOnAccess)
+                        value = instance.__dict__.get(name)
+                        if not isinstance(value, Ciphertext):
+                            continue
+                        if key_id_of(value.token) == key_id:
+                            continue
+                        try:
+                            plaintext = decrypt(value.token)
+                        except DecryptionError as e:
+                            failed.append((instance.pk, name))
+                            self.stderr.write(
+                                f"{model._meta.label} {instance.pk} {name}: {e}"
+                            )
+                            continue
+                        # bulk_update encrypts it again, with the primary key
+                        setattr(instance, name, plaintext)
+                        bytes_before += len(value.token)
+                        bytes_after += len(plaintext.encode("utf-8")) + V1_OVERHEAD
+                        dirty.append(name)
+                    if dirty:
+                        changed[tuple(dirty)].append(instance)
+                if not dry_run:
+                    for dirty, instances in changed.items():
+                        model._default_manager.bulk_update(instances, dirty)
+            scanned += len(batch)
+            rewritten += sum(len(instances) for instances in changed.values())
+            self.stdout.write(
+                f"{model._meta.label}: {scanned} scanned, {rewritten} rewritten, "
+                f"last pk {last_pk}"
+            )
+
+        if failed:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{model._meta.label}: {len(failed)} values did not decrypt "
+                    f"and were left unchanged (pk, field): {failed}"
+                )
+            )
+        saved = bytes_before - bytes_after
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{model._meta.label}: {'would rewrite' if dry_run else 'rewrote'} "
+                f"{rewritten} of {scanned} rows in {time.monotonic() - start:.1f}s; "
+                f"{bytes_before} -> {bytes_after} bytes "
+                f"({saved / bytes_before * 100 if bytes_before else 0:.0f}% saved)"
+            )
+        )
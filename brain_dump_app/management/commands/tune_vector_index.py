@@ -0,0 +1,147 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from brain_dump_app.models import BrainDump
+
+INDEX_NAME = "embedding_hnsw_idx"
+
+
+def model_index():
+    """The HnswIndex BrainDump declares on `embedding`: the configuration to build."""
+    for index in BrainDump._meta.indexes:
+        if index.name == INDEX_NAME:
+            return index
+    raise CommandError(f"BrainDump declares no index named {INDEX_NAME}")
+
+
+def index_parameters(indexdef):
+    """(m, ef_construction) from an index definition; None when not set."""
+    found = []
+    for name in ("m", "ef_construction"):
+        match = re.search(rf"\b{name}\s*=\s*'?(\d+)", indexdef or "")
+        found.append(int(match.group(1)) if match else None)
+    return tuple(found)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the BrainDump.embedding HNSW index with the configuration "
+        "the model declares (what benchmarks/vector_index.py recommended) and "
+        "rebuild it concurrently when they differ, or with --force after many "
+        "updates and deletes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Rebuild the index if it differs from the configuration (default: report only)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rebuild even if the index already has the configuration",
+        )
+        parser.add_argument(
+            "--m",
+            type=int,
+            help="Use this m instead of the model's (e.g. to try a benchmark result)",
+        )
+        parser.add_argument(
+            "--ef-construction",
+            type=int,
+            help="Use this ef_construction instead of the model's",
+        )
+        parser.add_argument(
+            "--maintenance-work-mem",
+            help="maintenance_work_mem for the build, e.g. 1GB (faster on large tables)",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Vector indexes need PostgreSQL with pgvector")
+
+        index = model_index()
+        m = options["m"] or index.m
+        ef_construction = options["ef_construction"] or index.ef_construction
+        table = BrainDump._meta.db_table
+        rows = BrainDump.objects.filter(embedding__isnull=False).count()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname = %s",
+                [table, INDEX_NAME],
+            )
+            row = cursor.fetchone()
+        current = index_parameters(row[0]) if row else None
+
+        if current is None:
+            described = "missing"
+        else:
+            described = f"m={current[0]}, ef_construction={current[1]}"
+        self.stdout.write(
+            f"{rows} embedded brain dumps; {INDEX_NAME} has {described}, "
+            f"configured m={m}, ef_construction={ef_construction}"
+        )
+
+        if current == (m, ef_construction) and not options["force"]:
+            self.stdout.write(self.style.SUCCESS("Index matches the configuration"))
+            return
+        if not (options["apply"] or options["force"]):
+            self.stdout.write("Run with --apply to rebuild the index")
+            return
+        if (m, ef_construction) != (index.m, index.ef_construction):
+            self.stdout.write(
+                self.style.WARNING(
+                    "Building a configuration the model does not declare; update "
+                    "BrainDump.Meta.indexes and its migration to keep it"
+                )
+            )
+
+        self._rebuild(table, m, ef_construction, options["maintenance_work_mem"])
+
+    def _rebuild(self, table, m, ef_construction, maintenance_work_mem):
+        # Build the replacement next to the live index so queries keep using
+        # the old one, then swap the names in one short transaction and drop
+        # the old index last: there is always an index to search. The final
+        # name stays embedding_hnsw_idx, so migration state is unaffected.
+        # CONCURRENTLY cannot run inside a transaction; management commands
+        # run in autocommit mode.
+        if connection.in_atomic_block:
+            raise CommandError("Cannot rebuild the index inside a transaction")
+        new_name = f"{INDEX_NAME}_new"
+        old_name = f"{INDEX_NAME}_old"
+        start = time.monotonic()
+        with connection.cursor() as cursor:
+            if maintenance_work_mem:
+                cursor.execute(
+                    "SELECT set_config('maintenance_work_mem', %s, false)",
+                    [maintenance_work_mem],
+                )
+            # Left behind (possibly invalid) by an interrupted earlier run
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{new_name}"')
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{old_name}"')
+            self.stdout.write(
+                f"Building {new_name} with m={m}, ef_construction={ef_construction}..."
+            )
+            cursor.execute(
+                f'CREATE INDEX CONCURRENTLY "{new_name}" ON "{table}" '
+                f"USING hnsw (embedding vector_cosine_ops) "
+                f"WITH (m = {m}, ef_construction = {ef_construction})"
+            )
+            with transaction.atomic():
+                cursor.execute(
+                    f'ALTER INDEX IF EXISTS "{INDEX_NAME}" RENAME TO "{old_name}"'
+                )
+                cursor.execute(f'ALTER INDEX "{new_name}" RENAME TO "{INDEX_NAME}"')
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{old_name}"')
+            cursor.execute(f'ANALYZE "{table}"')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {INDEX_NAME} with m={m}, ef_construction={ef_construction} "
+                f"in {time.monotonic() - start:.1f}s"
+            )
+        )
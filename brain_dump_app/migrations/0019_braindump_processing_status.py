@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brain_dump_app', '0018_alter_braindump_transcription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='braindump',
+            name='processing_error',
+            field=models.TextField(blank=True, help_text='Reason the background processing failed, if it did.'),
+        ),
+        migrations.AddField(
+            model_name='braindump',
+            name='processing_status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('converting', 'Converting'), ('transcribing', 'Transcribing'), ('embedding', 'Embedding'), ('done', 'Done'), ('failed', 'Failed')], default='done', help_text='Where the recording is in the convert/transcribe/embed pipeline.', max_length=20),
+        ),
+    ]
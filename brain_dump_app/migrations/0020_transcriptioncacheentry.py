@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-16 11:20
+
+import brain_dump_app.fields
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("brain_dump_app", "0019_braindump_processing_status"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TranscriptionCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("audio_sha256", models.CharField(max_length=64)),
+                ("model", models.CharField(max_length=50)),
+                ("transcription", brain_dump_app.fields.EncryptedTextField()),
+                ("hit_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Transcription Cache Entry",
+                "verbose_name_plural": "Transcription Cache Entries",
+                "indexes": [
+                    models.Index(
+                        fields=["last_used_at"], name="transcription_cache_used_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "audio_sha256", "model"),
+                        name="transcription_cache_unique_audio",
+                    )
+                ],
+            },
+        ),
+    ]
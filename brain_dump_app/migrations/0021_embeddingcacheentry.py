@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-16 12:05
+
+import django.utils.timezone
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("brain_dump_app", "0020_transcriptioncacheentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmbeddingCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("text_sha256", models.CharField(max_length=64)),
+                ("model", models.CharField(max_length=50)),
+                ("embedding", pgvector.django.vector.VectorField(dimensions=1536)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "verbose_name": "Embedding Cache Entry",
+                "verbose_name_plural": "Embedding Cache Entries",
+                "indexes": [
+                    models.Index(
+                        fields=["last_used_at"], name="embedding_cache_used_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("text_sha256", "model"),
+                        name="embedding_cache_unique_text",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-16 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("brain_dump_app", "0021_embeddingcacheentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="braindump",
+            name="embedding_model",
+            field=models.CharField(
+                blank=True,
+                help_text="Embedding model that produced `embedding` (empty if unknown).",
+                max_length=50,
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("brain_dump_app", "0022_braindump_embedding_model"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="braindump",
+            name="embedding_stale",
+            field=models.BooleanField(
+                default=False,
+                help_text="The transcription was edited after `embedding` was computed.",
+            ),
+        ),
+    ]
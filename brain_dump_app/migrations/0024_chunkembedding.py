@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-16 14:02
+
+import brain_dump_app.fields
+import django.db.models.deletion
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("brain_dump_app", "0023_braindump_embedding_stale"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChunkEmbedding",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("chunk_index", models.PositiveIntegerField()),
+                ("chunk_text", brain_dump_app.fields.EncryptedTextField()),
+                ("embedding", pgvector.django.vector.VectorField(dimensions=1536)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "brain_dump",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chunk_embeddings",
+                        to="brain_dump_app.braindump",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Chunk Embedding",
+                "verbose_name_plural": "Chunk Embeddings",
+                "indexes": [
+                    pgvector.django.indexes.HnswIndex(
+                        ef_construction=64,
+                        fields=["embedding"],
+                        m=16,
+                        name="hnsw_chunk_embedding_idx",
+                        opclasses=["vector_cosine_ops"],
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("brain_dump", "chunk_index"),
+                        name="chunk_embedding_unique_index",
+                    )
+                ],
+            },
+        ),
+    ]
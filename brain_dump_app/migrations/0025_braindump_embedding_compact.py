@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-16 16:20
+
+import pgvector.django.halfvec
+import pgvector.django.indexes
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # The HNSW index is built without blocking writes to the table
+    atomic = False
+
+    dependencies = [
+        ("brain_dump_app", "0024_chunkembedding"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="braindump",
+            name="embedding_compact",
+            field=pgvector.django.halfvec.HalfVectorField(dimensions=512, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name="braindump",
+            index=pgvector.django.indexes.HnswIndex(
+                ef_construction=64,
+                fields=["embedding_compact"],
+                m=16,
+                name="embedding_compact_hnsw_idx",
+                opclasses=["halfvec_ip_ops"],
+            ),
+        ),
+    ]
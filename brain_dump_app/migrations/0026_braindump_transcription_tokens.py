@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-16 17:05
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The GIN index is built without blocking writes to the table
+    atomic = False
+
+    dependencies = [
+        ("brain_dump_app", "0025_braindump_embedding_compact"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="braindump",
+            name="transcription_tokens",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.BigIntegerField(),
+                blank=True,
+                default=list,
+                editable=False,
+                size=None,
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="braindump",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["transcription_tokens"], name="transcription_tokens_gin_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.18 on 2026-10-16 18:10
+
+from django.db import DataError, migrations
+from django.db.migrations.exceptions import IrreversibleError
+
+# EncryptedTextField columns now hold raw ciphertext bytes (bytea). Existing
+# Fernet tokens are ASCII and are kept as their bytes; rotate_encryption
+# rewrites them in the new format afterwards.
+ENCRYPTED_COLUMNS = [
+    ("braindump", "transcription"),
+    ("chunkembedding", "chunk_text"),
+    ("transcriptioncacheentry", "transcription"),
+    ("twitterconnection", "oauth2_access_token"),
+    ("twitterconnection", "oauth2_refresh_token"),
+    ("twitterconnection", "oauth1_access_token"),
+    ("twitterconnection", "oauth1_access_token_secret"),
+]
+# First byte of the AES-GCM values written from here on (fields.FORMAT_V1)
+AES_GCM_VERSION = b"\x01"
+
+
+def _columns(apps, schema_editor, data_type):
+    """(table, column) of the encrypted columns that currently have data_type."""
+    with schema_editor.connection.cursor() as cursor:
+        for model_name, field_name in ENCRYPTED_COLUMNS:
+            model = apps.get_model("brain_dump_app", model_name)
+            table = model._meta.db_table
+            column = model._meta.get_field(field_name).column
+            cursor.execute(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_schema = current_schema() "
+                "AND table_name = %s AND column_name = %s",
+                [table, column],
+            )
+            row = cursor.fetchone()
+            # Databases created from scratch already made these columns bytea
+            if row and row[0] == data_type:
+                yield table, column
+
+
+def _alter_columns(schema_editor, columns, to_type, using):
+    for table, column in columns:
+        schema_editor.execute(
+            f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE {to_type} '
+            f"USING {using.format(column=column)}"
+        )
+
+
+def to_bytea(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    columns = list(_columns(apps, schema_editor, "text"))
+    _alter_columns(schema_editor, columns, "bytea", "convert_to(\"{column}\", 'UTF8')")
+
+
+def to_text(apps, schema_editor):
+    # Only legacy Fernet (and never encrypted) values are text the previous
+    # code can read. AES-GCM values are binary: converting them would fail,
+    # or turn them into text nothing decrypts any more.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    columns = list(_columns(apps, schema_editor, "bytea"))
+    with schema_editor.connection.cursor() as cursor:
+        for table, column in columns:
+            cursor.execute(
+                f'SELECT 1 FROM "{table}" '
+                f'WHERE substring("{column}" FROM 1 FOR 1) = %s LIMIT 1',
+                [AES_GCM_VERSION],
+            )
+            if cursor.fetchone():
+                raise IrreversibleError(
+                    f"{table}.{column} holds AES-GCM values, which the code "
+                    f"before this migration cannot read"
+                )
+    try:
+        _alter_columns(
+            schema_editor, columns, "text", "convert_from(\"{column}\", 'UTF8')"
+        )
+    except DataError as e:
+        raise IrreversibleError(
+            f"Encrypted columns hold values that are not UTF-8 text: {e}"
+        ) from e
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("brain_dump_app", "0026_braindump_transcription_tokens"),
+    ]
+
+    operations = [
+        migrations.RunPython(to_bytea, to_text),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-16 19:05
+
+import brain_dump_app.fields
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The index is built without blocking writes to the table
+    atomic = False
+
+    dependencies = [
+        ("brain_dump_app", "0027_encrypted_fields_bytea"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="braindump",
+            name="duration_seconds",
+            field=models.FloatField(
+                blank=True,
+                editable=False,
+                help_text="Length of the recording, from the audio probe at upload.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="braindump",
+            name="has_transcription",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name="braindump",
+            name="transcription_length",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, help_text="Characters in the transcription."
+            ),
+        ),
+        migrations.AddField(
+            model_name="braindump",
+            name="transcription_preview",
+            field=brain_dump_app.fields.EncryptedTextField(blank=True, editable=False),
+        ),
+        AddIndexConcurrently(
+            model_name="braindump",
+            index=models.Index(
+                condition=models.Q(("has_transcription", True)),
+                fields=["user", "-created_at"],
+                name="braindump_transcribed_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:40
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The indexes are built without blocking writes to the tables
+    atomic = False
+
+    dependencies = [
+        ("brain_dump_app", "0028_braindump_transcription_metadata"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="braindump",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="braindump_user_created_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="post_user_created_idx"
+            ),
+        ),
+    ]
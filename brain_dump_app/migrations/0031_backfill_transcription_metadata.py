@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:50
+
+from django.db import migrations
+
+# BrainDump.PREVIEW_LENGTH when the columns were added
+PREVIEW_LENGTH = 300
+BATCH_SIZE = 500
+
+
+def backfill_metadata(apps, schema_editor):
+    # Dumps saved before 0028 look untranscribed to the list pages until their
+    # metadata is computed (what backfill_dump_metadata does). The blind index
+    # is keyed by settings and built by live code, which a migration must not
+    # import: build_blind_index fills it after migrating
+    BrainDump = apps.get_model("brain_dump_app", "BrainDump")
+    queryset = (
+        BrainDump.objects.filter(has_transcription=False)
+        .only("id", "transcription")
+        .order_by("pk")
+    )
+    last_id = None
+    while True:
+        page = queryset if last_id is None else queryset.filter(pk__gt=last_id)
+        batch = list(page[:BATCH_SIZE])
+        if not batch:
+            break
+        for brain_dump in batch:
+            transcription = brain_dump.transcription or ""
+            brain_dump.transcription_preview = transcription[:PREVIEW_LENGTH]
+            brain_dump.transcription_length = len(transcription)
+            brain_dump.has_transcription = bool(transcription.strip())
+        BrainDump.objects.bulk_update(
+            batch,
+            ["transcription_preview", "transcription_length", "has_transcription"],
+        )
+        last_id = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    # Every batch commits on its own: an interrupted run resumes where it stopped
+    atomic = False
+
+    dependencies = [
+        ("brain_dump_app", "0030_drop_redundant_user_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:20
+
+from django.db import migrations, models
+
+
+def clear_cache(apps, schema_editor):
+    # Entries under the unkeyed SHA-256 of their text can be matched against
+    # guessed texts, and never hit again under the keyed digest: drop them
+    apps.get_model("brain_dump_app", "EmbeddingCacheEntry").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("brain_dump_app", "0031_backfill_transcription_metadata"),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_cache, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name="embeddingcacheentry",
+            name="embedding_cache_unique_text",
+        ),
+        migrations.RenameField(
+            model_name="embeddingcacheentry",
+            old_name="text_sha256",
+            new_name="text_hmac",
+        ),
+        migrations.AddConstraint(
+            model_name="embeddingcacheentry",
+            constraint=models.UniqueConstraint(
+                fields=("text_hmac", "model"), name="embedding_cache_unique_text"
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:45
+
+import pgvector.django.indexes
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # The HNSW index is built before the IVFFlat one is dropped, both without
+    # blocking writes, so searches always have an index
+    atomic = False
+
+    dependencies = [
+        ("brain_dump_app", "0032_embeddingcacheentry_text_hmac"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="braindump",
+            index=pgvector.django.indexes.HnswIndex(
+                ef_construction=128,
+                fields=["embedding"],
+                m=32,
+                name="embedding_hnsw_idx",
+                opclasses=["vector_cosine_ops"],
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="braindump",
+            name="embedding_ivf_idx",
+        ),
+    ]
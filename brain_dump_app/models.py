@@ -1,10 +1,12 @@
 import logging, re, uuid, time, os
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from utils.abstract_models import BaseTimestampModel
 from django.contrib.auth import get_user_model
 
 # from taggit.managers import TaggableManager
-from pgvector.django import VectorField, IvfflatIndex
+from pgvector.django import HalfVectorField, VectorField, HnswIndex
 from django.utils import timezone
 
 # from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -20,7 +22,8 @@ except ImportError:
 
 # Assuming utils.abstract_models.BaseTimestampModel provides created_at/updated_at
 from utils.abstract_models import BaseTimestampModel
-from .fields import EncryptedTextField  # Import the custom field
+from .fields import Ciphertext, EncryptedTextField  # Import the custom field
+from .blind_index import token_hashes
 
 logger = logging.getLogger("project")
 User = get_user_model()
@@ -28,9 +31,53 @@ User = get_user_model()
 
 def recording_upload_path(instance, filename):
     """Generate file path for recordings"""
-    # Extract original filename without extension and add .mp3
-    base_name = os.path.splitext(filename)[0]
-    return f"recordings/{instance.user.id}/{base_name}_{uuid.uuid4().hex[:8]}.mp3"
+    # Keep the original extension so raw uploads waiting for background
+    # conversion are stored in their real format
+    base_name, extension = os.path.splitext(filename)
+    extension = extension.lower() or ".mp3"
+    return f"recordings/{instance.user.id}/{base_name}_{uuid.uuid4().hex[:8]}{extension}"
+
+
+# MIME types for the audio formats recordings can be stored in
+RECORDING_MIME_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/mp4",
+    ".mp4": "audio/mp4",
+    ".webm": "audio/webm",
+    ".ogg": "audio/ogg",
+    ".flac": "audio/flac",
+    ".wav": "audio/wav",
+}
+
+# Characters of the transcription kept in BrainDump.transcription_preview
+PREVIEW_LENGTH = 300
+
+# Dimensions of BrainDump.embedding_compact. Part of the schema, not a setting:
+# changing it needs a migration that alters the column and rebuilds
+# embedding_compact_hnsw_idx, then `compact_embeddings --all`
+COMPACT_EMBEDDING_DIMENSIONS = 512
+
+# Columns only similarity and keyword search need, several KB per row; they
+# are filtered and ordered on in SQL, not loaded, so BrainDump.objects
+# leaves them out of the SELECT
+SEARCH_FIELDS = ("embedding", "embedding_compact", "transcription_tokens")
+
+
+class BrainDumpQuerySet(models.QuerySet):
+    def with_vectors(self):
+        """Load the SEARCH_FIELDS too, keeping any other deferred fields."""
+        deferred, is_defer = self.query.deferred_loading
+        if not is_defer:
+            # only(): the listed fields are loaded, nothing to undo
+            return self
+        rest = set(deferred) - set(SEARCH_FIELDS)
+        queryset = self.defer(None)
+        return queryset.defer(*rest) if rest else queryset
+
+
+class BrainDumpManager(models.Manager.from_queryset(BrainDumpQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().defer(*SEARCH_FIELDS)
 
 
 # create a model to hold the recording and its transcription
@@ -39,34 +86,167 @@ class BrainDump(BaseTimestampModel):
     Model to hold the recording and its transcription.
     """
 
+    # processing status (ingest pipeline)
+    QUEUED = "queued"
+    CONVERTING = "converting"
+    TRANSCRIBING = "transcribing"
+    EMBEDDING = "embedding"
+    DONE = "done"
+    FAILED = "failed"
+    PROCESSING_STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (CONVERTING, "Converting"),
+        (TRANSCRIBING, "Transcribing"),
+        (EMBEDDING, "Embedding"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
     recording = models.FileField(upload_to=recording_upload_path)
     transcription = EncryptedTextField(blank=True)
+    # Blind keyword index of the transcription (see blind_index.py), kept in
+    # step by save()
+    transcription_tokens = ArrayField(
+        models.BigIntegerField(), default=list, blank=True, editable=False
+    )
+    # Computed from the transcription by save() as well, so list pages show
+    # a snippet and a length without decrypting the full text
+    transcription_preview = EncryptedTextField(blank=True, editable=False)
+    transcription_length = models.PositiveIntegerField(
+        default=0, editable=False, help_text="Characters in the transcription."
+    )
+    has_transcription = models.BooleanField(default=False, editable=False)
+    duration_seconds = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Length of the recording, from the audio probe at upload.",
+    )
     edited = models.BooleanField(
         default=False,
         help_text="Whether the transcription has been edited by the user manually.",
     )
     raw_hashtags = models.TextField(blank=True)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Indexed by braindump_user_created_idx, which starts with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     # TODO: Vector embedding field for RAG - typically 1536 dimensions for OpenAI embeddings
     embedding = VectorField(dimensions=1536, null=True)
+    # `embedding` shortened to COMPACT_EMBEDDING_DIMENSIONS, unit length, half
+    # precision: searched by inner product when EMBEDDING_SEARCH_COMPACT is on
+    embedding_compact = HalfVectorField(
+        dimensions=COMPACT_EMBEDDING_DIMENSIONS, null=True
+    )
+    embedding_model = models.CharField(
+        max_length=50,
+        blank=True,
+        help_text="Embedding model that produced `embedding` (empty if unknown).",
+    )
+    embedding_stale = models.BooleanField(
+        default=False,
+        help_text="The transcription was edited after `embedding` was computed.",
+    )
+    processing_status = models.CharField(
+        max_length=20,
+        choices=PROCESSING_STATUS_CHOICES,
+        default=DONE,
+        help_text="Where the recording is in the convert/transcribe/embed pipeline.",
+    )
+    processing_error = models.TextField(
+        blank=True,
+        help_text="Reason the background processing failed, if it did.",
+    )
     # tags = TaggableManager(blank=True)
 
+    # Defers SEARCH_FIELDS; an instance loads them on first access, or use
+    # BrainDump.objects.with_vectors() when they are needed for many rows
+    objects = BrainDumpManager()
+
     class Meta:
         verbose_name = "Brain Dump"
         verbose_name_plural = "Brain Dumps"
 
         # Add index for faster similarity searches
         indexes = [
-            IvfflatIndex(
-                name="embedding_ivf_idx",
+            # The configuration benchmarks/vector_index.py recommended; rebuilt
+            # in place by tune_vector_index
+            HnswIndex(
+                name="embedding_hnsw_idx",
                 fields=["embedding"],
-                lists=100,  # Number of partitions, adjust based on your data size
+                m=32,
+                ef_construction=128,
                 opclasses=["vector_cosine_ops"],  # Use cosine distance
-            )
+            ),
+            HnswIndex(
+                name="embedding_compact_hnsw_idx",
+                fields=["embedding_compact"],
+                m=16,
+                ef_construction=64,
+                opclasses=["halfvec_ip_ops"],  # Inner product on unit vectors
+            ),
+            GinIndex(
+                name="transcription_tokens_gin_idx", fields=["transcription_tokens"]
+            ),
+            # A user's transcribed dumps, newest first ("recent dump")
+            models.Index(
+                name="braindump_transcribed_idx",
+                fields=["user", "-created_at"],
+                condition=models.Q(has_transcription=True),
+            ),
+            # The dump list and API, paged by (created_at, id) (pagination.py)
+            models.Index(
+                name="braindump_user_created_idx",
+                fields=["user", "-created_at", "-id"],
+            ),
         ]
 
+    # Columns derived from the transcription, recomputed when it is saved
+    TRANSCRIPTION_DERIVED_FIELDS = (
+        "transcription_tokens",
+        "transcription_preview",
+        "transcription_length",
+        "has_transcription",
+    )
+
+    def save(self, *args, **kwargs):
+        # Keep the blind index and the metadata in step with the transcription
+        # when it is saved
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            changed = "transcription" not in self.get_deferred_fields()
+        else:
+            changed = "transcription" in update_fields
+        # Never read since loading (still encrypted), so unchanged
+        if changed and not isinstance(self.__dict__.get("transcription"), Ciphertext):
+            self.update_transcription_metadata()
+            if update_fields is not None:
+                kwargs["update_fields"] = {
+                    *update_fields,
+                    *self.TRANSCRIPTION_DERIVED_FIELDS,
+                }
+        super().save(*args, **kwargs)
+
+    def update_transcription_metadata(self):
+        """Recompute the TRANSCRIPTION_DERIVED_FIELDS from the transcription."""
+        transcription = self.transcription or ""
+        self.transcription_tokens = token_hashes(transcription)
+        self.transcription_preview = transcription[:PREVIEW_LENGTH]
+        self.transcription_length = len(transcription)
+        self.has_transcription = bool(transcription.strip())
+
     def __str__(self):
-        return f"Brain Dump {self.user.username} - {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
+        # The user's id, not username: no query per dump when listing them
+        return f"Brain Dump {self.user_id} - {self.created_at:%Y-%m-%d %H:%M:%S}"
+
+    @property
+    def is_processing(self):
+        """Whether the background ingest pipeline is still working on this dump."""
+        return self.processing_status not in (self.DONE, self.FAILED)
+
+    @property
+    def recording_mime_type(self):
+        """MIME type of the stored recording, for the <audio> source tag."""
+        extension = os.path.splitext(self.recording.name or "")[1].lower()
+        return RECORDING_MIME_TYPES.get(extension, "audio/mpeg")
 
     # def extract_hashtags(self):
     #     """Extract hashtags from the transcription"""
@@ -108,111 +288,46 @@ class BrainDump(BaseTimestampModel):
 
     #     return related
 
-    """the  commented out code is a proposed implementation for chunking the transcription (when dealing with larger recordings)"""
-    # def split_and_generate_embeddings(self, save=True):
-    #     """
-    #     Splits the transcription into chunks and generates embeddings for each chunk.
-    #     Creates and returns ChunkEmbedding objects linked to this BrainDump.
-    #     """
-    #     if not self.transcription:
-    #         return []
 
-    #     # Initialize the text splitter
-    #     text_splitter = RecursiveCharacterTextSplitter(
-    #         chunk_size=1000,  # Characters per chunk
-    #         chunk_overlap=100,  # Overlap between chunks to maintain context
-    #         length_function=len,
-    #         separators=["\n\n", "\n", ". ", " ", ""]
-    #     )
+class ChunkEmbedding(models.Model):
+    """
+    Embedding of one chunk of a BrainDump's transcription.
+
+    Long recordings cover several topics; searching chunks finds the relevant
+    passage instead of one averaged vector, and chat only sends those
+    passages to the LLM.
+    """
+
+    brain_dump = models.ForeignKey(
+        BrainDump, on_delete=models.CASCADE, related_name="chunk_embeddings"
+    )
+    # Denormalized from brain_dump so searches filter without a join
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    chunk_index = models.PositiveIntegerField()  # Position of the chunk in the text
+    chunk_text = EncryptedTextField()
+    embedding = VectorField(dimensions=1536)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Chunk Embedding"
+        verbose_name_plural = "Chunk Embeddings"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["brain_dump", "chunk_index"], name="chunk_embedding_unique_index"
+            )
+        ]
+        indexes = [
+            HnswIndex(
+                name="hnsw_chunk_embedding_idx",
+                fields=["embedding"],
+                m=16,
+                ef_construction=64,
+                opclasses=["vector_cosine_ops"],
+            )
+        ]
 
-    #     # Split the text
-    #     chunks = text_splitter.split_text(self.transcription.strip())
-
-    #     # Initialize OpenAI client
-    #     client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-    #     # Create embedding for each chunk
-    #     chunk_embeddings = []
-    #     for i, chunk_text in enumerate(chunks):
-    #         # Get embedding from OpenAI
-    #         response = client.embeddings.create(
-    #             input=chunk_text,
-    #             model="text-embedding-3-small",
-    #         )
-
-    #         # Extract embedding vector
-    #         embedding_vector = response.data[0].embedding
-
-    #         # Create ChunkEmbedding object
-    #         chunk_embedding = ChunkEmbedding(
-    #             brain_dump=self,
-    #             chunk_index=i,
-    #             chunk_text=chunk_text,
-    #             embedding=embedding_vector
-    #         )
-
-    #         if save:
-    #             chunk_embedding.save()
-
-    #         chunk_embeddings.append(chunk_embedding)
-
-    #     return chunk_embeddings
-
-    # def get_similar_chunks(self, limit=5, query_text=None, query_embedding=None):
-    #     """
-    #     Returns the most similar chunks across all BrainDumps for this user.
-
-    #     Args:
-    #         limit (int): Maximum number of similar chunks to return
-    #         query_text (str, optional): Text to search with
-    #         query_embedding (list, optional): Directly provide an embedding vector
-
-    #     Returns:
-    #         QuerySet: The most similar ChunkEmbeddings
-    #     """
-    #     # Get query embedding
-    #     if query_embedding is None and query_text:
-    #         client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    #         response = client.embeddings.create(
-    #             input=query_text,
-    #             model="text-embedding-3-small",
-    #         )
-    #         query_embedding = response.data[0].embedding
-    #     elif query_embedding is None and self.embedding is not None:
-    #         query_embedding = self.embedding
-    #     else:
-    #         return ChunkEmbedding.objects.none()
-
-    #     # Search for similar chunks
-    #     similar_chunks = ChunkEmbedding.objects.filter(
-    #         brain_dump__user=self.user
-    #     ).annotate(
-    #         similarity=CosineDistance('embedding', query_embedding)
-    #     ).order_by('similarity')[:limit]
-
-    #     return similar_chunks
-
-
-# class ChunkEmbedding(models.Model):
-#     """
-#     Stores embeddings for chunks of text from a BrainDump.
-#     """
-#     brain_dump = models.ForeignKey(BrainDump, on_delete=models.CASCADE, related_name='chunk_embeddings')
-#     chunk_index = models.IntegerField()  # The position of this chunk in the original text
-#     chunk_text = models.TextField()      # The actual text chunk
-#     embedding = VectorField(dimensions=1536, null=True)
-#     created_at = models.DateTimeField(auto_now_add=True)
-
-#     class Meta:
-#         indexes = [
-#             HnswIndex(
-#                 name='hnsw_chunk_embedding_idx',
-#                 fields=['embedding'],
-#                 m=16,
-#                 ef_construction=64,
-#                 opclasses=['vector_cosine_ops']
-#             )
-#         ]
+    def __str__(self):
+        return f"Chunk {self.chunk_index} of Brain Dump {self.brain_dump_id}"
 
 
 # this model will be a model to store all x/twitter posts
@@ -229,7 +344,8 @@ class Post(BaseTimestampModel):
         (POSTED, "Posted"),
     ]
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Indexed by post_user_created_idx, which starts with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     brain_dump = models.ManyToManyField(BrainDump, null=True, blank=True)
     post_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
     post_type = models.CharField(max_length=255, null=True, blank=True)
@@ -242,9 +358,16 @@ class Post(BaseTimestampModel):
     class Meta:
         verbose_name = "Post"
         verbose_name_plural = "Posts"
+        indexes = [
+            # The post list and API, paged by (created_at, id) (pagination.py)
+            models.Index(
+                name="post_user_created_idx",
+                fields=["user", "-created_at", "-id"],
+            ),
+        ]
 
     def __str__(self):
-        return f"Post {self.post_id} by {self.user.username}"
+        return f"Post {self.post_id} by {self.user_id}"
 
 
 def post_image_upload_path(instance, filename):
@@ -267,7 +390,71 @@ class PostImage(BaseTimestampModel):
         ordering = ["created_at"]  # Default ordering for images within a post
 
     def __str__(self):
-        return f"Image for Post {self.post.id} ({os.path.basename(self.image.name)})"
+        return f"Image for Post {self.post_id} ({os.path.basename(self.image.name)})"
+
+
+class TranscriptionCacheEntry(models.Model):
+    """
+    A transcription stored under the SHA-256 of the audio that was sent to the
+    API, so re-sent recordings (retries, webhook redeliveries) skip the call.
+
+    Entries are scoped to the user: the same audio uploaded by someone else is
+    a different entry, never a hit.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    audio_sha256 = models.CharField(max_length=64)
+    model = models.CharField(max_length=50)
+    transcription = EncryptedTextField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Transcription Cache Entry"
+        verbose_name_plural = "Transcription Cache Entries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "audio_sha256", "model"],
+                name="transcription_cache_unique_audio",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["last_used_at"], name="transcription_cache_used_idx")
+        ]
+
+    def __str__(self):
+        return f"Transcription {self.audio_sha256[:12]} ({self.model}) for {self.user_id}"
+
+
+class EmbeddingCacheEntry(models.Model):
+    """
+    An embedding stored under the keyed hash of the text it was computed from
+    (embeddings.text_digest).
+
+    Only the hash and the vector are kept, never the text itself.
+    """
+
+    text_hmac = models.CharField(max_length=64)
+    model = models.CharField(max_length=50)
+    embedding = VectorField(dimensions=1536)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Embedding Cache Entry"
+        verbose_name_plural = "Embedding Cache Entries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["text_hmac", "model"], name="embedding_cache_unique_text"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["last_used_at"], name="embedding_cache_used_idx")
+        ]
+
+    def __str__(self):
+        return f"Embedding {self.text_hmac[:12]} ({self.model})"
 
 
 class TwitterConnection(models.Model):
@@ -0,0 +1,170 @@
+# Keyset ("cursor") pagination on (created_at, id), newest first. A page
+# starts right after the last row of the previous one, so any page is one
+# range scan of the (user, -created_at, -id) index: no COUNT(*), and no OFFSET
+# rows read and thrown away, however deep the page.
+import base64
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+ORDERING = ("-created_at", "-id")
+
+
+def encode_cursor(obj):
+    """The cursor of the page that follows `obj`."""
+    value = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(value.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, model):
+    """
+    The (created_at, pk) position encoded in a cursor.
+
+    Raises:
+        ValueError: If the cursor was not made by encode_cursor() for `model`
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, pk = value.decode("utf-8").split("|", 1)
+        created_at = datetime.fromisoformat(created_at)
+        if timezone.is_naive(created_at):
+            raise ValueError("Cursor without a UTC offset")
+        return created_at, model._meta.pk.to_python(pk)
+    except (TypeError, ValueError, ValidationError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+class KeysetPage:
+    """
+    One page of rows, iterable like a Paginator page.
+
+    `next_cursor` is None on the last page; `after` is the created_at of the
+    row before the page (None on the first page).
+    """
+
+    def __init__(self, rows, after, next_cursor):
+        self.rows = rows
+        self.after = after
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def days(self):
+        """
+        The rows grouped by the local date they were created.
+
+        Returns:
+            list: (date, rows, continued) in page order; continued is True
+            when the day started on the previous page
+        """
+        groups = []
+        previous = timezone.localdate(self.after) if self.after else None
+        for row in self.rows:
+            day = timezone.localdate(row.created_at)
+            if groups and groups[-1][0] == day:
+                groups[-1][1].append(row)
+            else:
+                groups.append((day, [row], day == previous))
+            previous = day
+        return groups
+
+
+def keyset_page(queryset, cursor=None, size=20):
+    """
+    The page of `queryset` (newest first) that starts after `cursor`.
+
+    Args:
+        queryset: Rows with created_at, e.g. one user's dumps
+        cursor: next_cursor of the previous page; None for the first page
+        size: Rows per page
+
+    Returns:
+        KeysetPage
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    queryset = queryset.order_by(*ORDERING)
+    after = None
+    if cursor:
+        after, pk = decode_cursor(cursor, queryset.model)
+        # The redundant created_at <= bound is what the index range scan uses;
+        # the OR only sorts out rows created in the same microsecond
+        queryset = queryset.filter(created_at__lte=after).filter(
+            Q(created_at__lt=after) | Q(created_at=after, pk__lt=pk)
+        )
+    # One extra row tells whether there is a next page
+    rows = list(queryset[: size + 1])
+    next_cursor = encode_cursor(rows[size - 1]) if len(rows) > size else None
+    return KeysetPage(rows[:size], after, next_cursor)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination for the API list endpoints.
+
+    The response is {"next": url or null, "results": [...]}; follow `next`
+    (?cursor=...) for the following page. ?page_size= sets the page length,
+    up to max_page_size.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = keyset_page(
+                queryset,
+                request.query_params.get(self.cursor_query_param),
+                self.get_page_size(request),
+            )
+        except ValueError:
+            raise NotFound("Invalid cursor")
+        return self.page.rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.page.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.page.next_cursor,
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -1,9 +1,13 @@
-from .models import BrainDump
+from .models import BrainDump, Post
 import logging, json
 import tempfile, os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from django.conf import settings
+from django.utils import timezone
+from jobs_app.queue import enqueue, job
+from utils import providers
 from pgvector.django import CosineDistance
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from rest_framework import status
 from utils.prompts import (
@@ -11,6 +15,33 @@ from utils.prompts import (
     TWITTER_PROMPT_MEDIUM,
     TWITTER_PROMPT_LONG,
 )
+from utils.convert_audio import (
+    detect_silences,
+    extract_segment,
+    local_audio_path,
+    plan_segments,
+    prepare_recording,
+    probe_audio,
+)
+from subscriptions_app.ledger import flush_usage_events, record_usage
+from subscriptions_app.models import UsageEvent
+from subscriptions_app.usage import settle_reservation
+from subscriptions_app.utils import check_recording_length
+from .embeddings import (
+    apply_stale_penalty,
+    compact_embedding,
+    embed_text,
+    fuse_rankings,
+    generate_chunk_embeddings,
+    get_similar_chunks,
+    nearest,
+)
+from .blind_index import keyword_matches
+from .transcription_cache import (
+    audio_digest,
+    get_cached_transcription,
+    store_transcription,
+)
 
 # Import OpenAI libraries
 try:
@@ -24,12 +55,20 @@ except ImportError:
 logger = logging.getLogger("project")
 
 
-def transcribe_audio_file(audio_file):
+def transcribe_audio_file(audio_file, user=None):
     """
     Transcribe an audio file using OpenAI Whisper API.
 
+    Recordings longer than TRANSCRIPTION_SPLIT_MIN_SECONDS are split at
+    silences and the segments are transcribed concurrently; if that fails the
+    whole file is sent in one request.
+
+    When a user is given, the transcription cache is checked first: audio this
+    user has already had transcribed (same bytes, same model) is not sent again.
+
     Args:
         audio_file: InMemoryUploadedFile from the request
+        user: Owner of the recording, enables the transcription cache
 
     Returns:
         str: Transcription text or empty string if failed
@@ -39,9 +78,139 @@ def transcribe_audio_file(audio_file):
         logger.error("OpenAI library not available. Cannot transcribe.")
         return ""
 
+    if user is None or not settings.TRANSCRIPTION_CACHE_ENABLED:
+        return _transcribe(audio_file)
+
+    model = settings.TRANSCRIPTION_MODEL
+    try:
+        digest = audio_digest(audio_file)
+        cached = get_cached_transcription(user, digest, model)
+    except Exception as e:
+        logger.warning(f"Transcription cache lookup failed: {e}")
+        audio_file.seek(0)
+        return _transcribe(audio_file)
+    if cached is not None:
+        logger.info(f"Transcription cache hit for audio {digest[:12]}")
+        return cached
+
+    transcription = _transcribe(audio_file)
+    try:
+        store_transcription(user, digest, model, transcription)
+    except Exception as e:
+        logger.warning(f"Could not store transcription in cache: {e}")
+    return transcription
+
+
+def _transcribe(audio_file):
+    """Transcribe without the cache: segmented for long recordings, else one request."""
     try:
-        # Initialize the OpenAI client
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        duration = probe_audio(audio_file).duration
+    except Exception as e:
+        logger.warning(f"Could not probe audio before transcription: {e}")
+        duration = None
+    finally:
+        audio_file.seek(0)
+
+    if duration and duration > settings.TRANSCRIPTION_SPLIT_MIN_SECONDS:
+        transcription = _transcribe_in_segments(audio_file, duration)
+        if transcription:
+            return transcription
+        logger.warning("Segmented transcription failed, sending the whole file")
+        audio_file.seek(0)
+
+    return _transcribe_single(audio_file)
+
+
+def _transcribe_in_segments(audio_file, duration):
+    """
+    Split a long recording at silences and transcribe the parts concurrently.
+
+    Returns:
+        str: The stitched transcription, or None if any segment failed
+    """
+    base_name = os.path.splitext(os.path.basename(audio_file.name))[0]
+    proxy_format = settings.TRANSCRIPTION_PROXY_FORMAT or "mp3"
+    try:
+        with local_audio_path(audio_file) as audio_path:
+            segments = plan_segments(
+                duration,
+                detect_silences(audio_path),
+                settings.TRANSCRIPTION_SEGMENT_SECONDS,
+                settings.TRANSCRIPTION_SEGMENT_OVERLAP_SECONDS,
+            )
+            if len(segments) < 2:
+                return None
+
+            def transcribe_segment(index):
+                start, end = segments[index]
+                segment = extract_segment(
+                    audio_path,
+                    start,
+                    end,
+                    name=f"{base_name}_part{index}",
+                    proxy_format=proxy_format,
+                )
+                return _transcribe_single(segment)
+
+            workers = min(settings.TRANSCRIPTION_MAX_CONCURRENCY, len(segments))
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="transcribe-segment"
+            ) as executor:
+                texts = list(executor.map(transcribe_segment, range(len(segments))))
+    except Exception as e:
+        logger.error(f"Error during segmented transcription: {e}", exc_info=True)
+        return None
+
+    if not all(texts):
+        return None
+    logger.info(
+        f"Transcribed {duration:.0f}s recording in {len(segments)} segments "
+        f"({workers} concurrent)"
+    )
+    return stitch_transcripts(texts)
+
+
+def _normalize_word(word):
+    return "".join(ch for ch in word.lower() if ch.isalnum())
+
+
+def stitch_transcripts(texts, max_overlap_words=25, min_overlap_words=3):
+    """
+    Join segment transcripts, dropping words repeated across a boundary.
+
+    Segments overlap slightly, so the start of one transcript can repeat the
+    end of the previous one. The longest run of (normalized) words that ends
+    the previous text and starts the next one is removed from the next one.
+    Shorter runs than min_overlap_words are kept: one or two matching words
+    ("no." then "No, ...") are as likely to be speech as overlap.
+
+    Args:
+        texts: Transcripts in segment order
+        max_overlap_words: Longest overlap that is looked for
+        min_overlap_words: Shortest run that counts as overlap
+
+    Returns:
+        str: The combined transcript
+    """
+    words = []
+    for text in texts:
+        next_words = text.split()
+        tail = [_normalize_word(w) for w in words[-max_overlap_words:]]
+        head = [_normalize_word(w) for w in next_words[:max_overlap_words]]
+        overlap = 0
+        for size in range(min(len(tail), len(head)), min_overlap_words - 1, -1):
+            if tail[-size:] == head[:size]:
+                overlap = size
+                break
+        words.extend(next_words[overlap:])
+    return " ".join(words)
+
+
+def _transcribe_single(audio_file):
+    """Send one audio file to the Whisper API; returns "" on failure."""
+    try:
+        # Shared, pooled OpenAI client
+        client = providers.get_openai_client()
 
         # Get the real file extension from the content type if available
         content_type = (
@@ -85,9 +254,19 @@ def transcribe_audio_file(audio_file):
             # Remove breakpoint that was causing execution to pause
             # Open the temporary file for reading
             with open(temp_path, "rb") as audio_data:
+
+                def create_transcription():
+                    # Rewind so a retried request uploads the whole file again
+                    audio_data.seek(0)
+                    return client.audio.transcriptions.create(
+                        model=settings.TRANSCRIPTION_MODEL,
+                        file=audio_data,
+                        response_format="text",
+                    )
+
                 # Call OpenAI Whisper API
-                transcript_response = client.audio.transcriptions.create(
-                    model="whisper-1", file=audio_data, response_format="text"
+                transcript_response = providers.call(
+                    providers.OPENAI, "transcription", create_transcription
                 )
 
                 # Return the transcription
@@ -119,6 +298,9 @@ def generate_embedding(dump_id=None, transcription=None):
     """
     Generate vector embedding for the transcription text
     using OpenAI's embedding API.
+
+    Goes through the embedding service, so repeated texts come from the cache
+    and concurrent calls are batched into one API request.
     """
     # Handle case when only transcription is provided
     if transcription and not dump_id:
@@ -126,17 +308,7 @@ def generate_embedding(dump_id=None, transcription=None):
             return None
 
         try:
-            # Initialize OpenAI client
-            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-            # Get embedding from OpenAI
-            response = client.embeddings.create(
-                input=transcription.strip(),
-                model="text-embedding-3-small",  # Use text-embedding-3-large for more accuracy
-            )
-
-            # Extract embedding vector
-            embedding_vector = response.data[0].embedding
+            embedding_vector = embed_text(transcription)
             logger.info("Generated embedding for provided transcription")
             return embedding_vector
 
@@ -160,21 +332,21 @@ def generate_embedding(dump_id=None, transcription=None):
         return None
 
     try:
-        # Initialize OpenAI client
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-        # Get embedding from OpenAI
-        response = client.embeddings.create(
-            input=brain_dump.transcription.strip(),
-            model="text-embedding-3-small",  # Use text-embedding-3-large for more accuracy
-        )
-
-        # Extract embedding vector
-        embedding_vector = response.data[0].embedding
+        embedding_vector = embed_text(brain_dump.transcription)
 
         # Store in the model
         brain_dump.embedding = embedding_vector
-        brain_dump.save(update_fields=["embedding"])
+        brain_dump.embedding_compact = compact_embedding(embedding_vector)
+        brain_dump.embedding_model = settings.EMBEDDING_MODEL
+        brain_dump.embedding_stale = False
+        brain_dump.save(
+            update_fields=[
+                "embedding",
+                "embedding_compact",
+                "embedding_model",
+                "embedding_stale",
+            ]
+        )
 
         logger.info(f"Generated embedding for BrainDump {brain_dump.id}")
         return embedding_vector
@@ -198,33 +370,57 @@ def get_similar_dumps(dump_object, query_text=None, limit=5, exclude_self=True):
         query_text (str, optional): Text to search with instead of this dump's embedding
 
     Returns:
-        QuerySet: The most similar BrainDumps
+        list: The most similar BrainDumps, each with a `similarity` distance
     """
     # If query_text is provided, generate an embedding for it
     if query_text:
         query_embedding = generate_embedding(dump_id=None, transcription=query_text)
+        if query_embedding is None:
+            return []
     else:
         # Otherwise use this dump's embedding
         if dump_object.embedding is None:
-            return BrainDump.objects.none()
+            return []
         query_embedding = dump_object.embedding
 
-    # Get similar dumps by cosine similarity
-    # Lower value means more similar for cosine distance
-    similar_dumps = (
-        BrainDump.objects.filter(
-            user=dump_object.user,  # Only get dumps from the same user
-            embedding__isnull=False,  # Ensure we only compare with dumps that have embeddings
-        )
-        .annotate(similarity=CosineDistance("embedding", query_embedding))
-        .order_by("similarity")
-    )
+    similar_dumps = BrainDump.objects.filter(
+        user=dump_object.user,  # Only get dumps from the same user
+        embedding__isnull=False,  # Ensure we only compare with dumps that have embeddings
+    ).defer("embedding", "embedding_compact")
 
     # Exclude dump_object if requested (only if we're not using a text query)
     if exclude_self and not query_text:
         similar_dumps = similar_dumps.exclude(id=dump_object.id)
 
-    return similar_dumps[:limit]
+    # Dumps edited since they were embedded are ranked on their old text until
+    # the refresh job runs: push them down, or leave them out entirely
+    stale_penalty = settings.EMBEDDING_STALE_PENALTY
+    if stale_penalty is None:
+        similar_dumps = similar_dumps.filter(embedding_stale=False)
+
+    # Lower value means more similar for cosine distance
+    wanted = limit * 2 if stale_penalty else limit
+    if settings.EMBEDDING_SEARCH_COMPACT:
+        candidates = nearest(
+            similar_dumps,
+            compact_embedding(query_embedding),
+            wanted,
+            field="embedding_compact",
+            unit_vectors=True,
+        )
+    else:
+        candidates = nearest(similar_dumps, query_embedding, wanted)
+    ranked = apply_stale_penalty(candidates, lambda dump: dump.embedding_stale, wanted)
+
+    # Text queries also rank dumps containing the query's words (blind index)
+    if query_text and settings.BLIND_INDEX_HYBRID_SEARCH:
+        keyword_hits = keyword_matches(similar_dumps, query_text, wanted)
+        if keyword_hits is not None:
+            keyword_hits = keyword_hits.annotate(
+                similarity=CosineDistance("embedding", query_embedding)
+            )
+            ranked = fuse_rankings([ranked, list(keyword_hits)])
+    return ranked[:limit]
 
 
 def generate_post(brain_dumps, post_type="twitter", min_chars=0, max_chars=280):
@@ -255,13 +451,12 @@ def generate_post(brain_dumps, post_type="twitter", min_chars=0, max_chars=280):
         # Join transcriptions with separators for clarity
         all_thoughts = "\n---\n".join(transcriptions)
 
-        # Configure the model
-        llm = ChatGoogleGenerativeAI(
+        # Shared model instance; retries are handled by providers.call
+        llm = providers.get_gemini_chat(
             model="gemini-2.0-flash",
             temperature=0,
             max_tokens=2000,  # Set a limit to prevent unexpected long outputs
             timeout=30,  # Set a timeout to avoid hanging requests
-            max_retries=1,  # Allow retries for transient errors
         )
 
         # Select prompt template based on post type and max_chars
@@ -289,8 +484,11 @@ def generate_post(brain_dumps, post_type="twitter", min_chars=0, max_chars=280):
 
         # Generate the post(s)
         chain = prompt | llm
-        result = chain.invoke(
-            {"thoughts": all_thoughts, "min_chars": min_chars, "max_chars": max_chars}
+        result = providers.call(
+            providers.GEMINI,
+            "generate_post",
+            chain.invoke,
+            {"thoughts": all_thoughts, "min_chars": min_chars, "max_chars": max_chars},
         )
 
         # Extract the content from the response, ensuring it's a string
@@ -369,13 +567,19 @@ def generate_chat_response(user, message):
     if not user_dump:
         return {"error": "No brain dumps found"}, status.HTTP_404_NOT_FOUND
 
-    # Get similar brain dumps using vector similarity
-    similar_dumps = get_similar_dumps(
-        dump_object=user_dump, query_text=message, limit=3
-    )
-
-    # Extract transcriptions from similar dumps
-    context_texts = [dump.transcription for dump in similar_dumps if dump.transcription]
+    # Prefer the most relevant transcription chunks over whole transcriptions
+    query_embedding = generate_embedding(dump_id=None, transcription=message)
+    chunks = get_similar_chunks(user, query_embedding) if query_embedding else []
+    if chunks:
+        context_texts = [chunk.chunk_text for chunk in chunks]
+    else:
+        # Dumps from before chunking: fall back to whole transcriptions
+        similar_dumps = get_similar_dumps(
+            dump_object=user_dump, query_text=message, limit=3
+        )
+        context_texts = [
+            dump.transcription for dump in similar_dumps if dump.transcription
+        ]
     if not context_texts:
         return {
             "response": "I couldn't find any relevant information in your brain dumps about that topic."
@@ -405,19 +609,21 @@ def generate_chat_response(user, message):
         ]
     )
 
-    # Initialize the LLM
-    llm = ChatGoogleGenerativeAI(
+    # Shared LLM instance
+    llm = providers.get_gemini_chat(
         model="gemini-2.0-flash",
         temperature=0,
         max_tokens=2000,
         timeout=30,
-        max_retries=1,
     )
 
     # Create and invoke the chain
     chain = prompt | llm
-    result = chain.invoke(
-        {"context": "\n---\n".join(context_texts), "question": message}
+    result = providers.call(
+        providers.GEMINI,
+        "chat",
+        chain.invoke,
+        {"context": "\n---\n".join(context_texts), "question": message},
     )
 
     # Ensure result.content is a string before stripping
@@ -433,3 +639,278 @@ def generate_chat_response(user, message):
         response_text = str(response_text)  # Convert to string as a basic fallback
 
     return {"response": response_text}, status.HTTP_200_OK
+
+
+class IngestError(Exception):
+    """Raised when a stage of the brain dump ingest pipeline cannot complete."""
+
+
+def enqueue_brain_dump_processing(dump_id, reserved_on=None):
+    """
+    Queue the ingest pipeline for a BrainDump on the job queue.
+
+    The job row is written in the current transaction, so workers only see it
+    once the BrainDump itself has been committed.
+
+    Args:
+        dump_id: The id of a BrainDump saved with processing_status=QUEUED
+        reserved_on: Usage day of the recording reservation the request
+            deferred (Reservation.defer); the job settles it
+    """
+    return process_brain_dump.enqueue(
+        dump_id=str(dump_id),
+        reserved_on=reserved_on.isoformat() if reserved_on else None,
+    )
+
+
+def _settle_recording_usage(user, reserved_on, duration_minutes=None):
+    # The upload's recording unit and minutes count only once it is ingested
+    # (duration_minutes given); an unusable recording gives the unit back
+    if not reserved_on:
+        # Queued before uploads deferred their usage: already charged
+        return
+    day = date.fromisoformat(reserved_on)
+    succeeded = duration_minutes is not None
+    settle_reservation(user, "max_recording", day, kept=succeeded)
+    if succeeded:
+        record_usage(user, UsageEvent.RECORDING_MINUTES, duration_minutes)
+    flush_usage_events()
+
+
+def _set_processing_status(brain_dump, processing_status):
+    brain_dump.processing_status = processing_status
+    brain_dump.save(update_fields=["processing_status"])
+
+
+@job(queue="transcription", timeout=900)
+def process_brain_dump(dump_id, reserved_on=None):
+    """
+    Run the convert -> transcribe -> embed pipeline for an uploaded BrainDump.
+
+    The raw upload is expected to already be stored on `recording`. Each stage
+    updates `processing_status` so clients can poll for progress; any failure
+    marks the dump as FAILED and stores the reason in `processing_error`.
+    An IngestError (the recording itself is unusable) ends there and gives
+    the recording back to the user's daily limit; any other error (storage,
+    database, network) is raised again so the queue retries the job with
+    backoff, which restarts the pipeline. The recording and its minutes are
+    recorded as usage once the dump is DONE.
+
+    Args:
+        dump_id: The id of the BrainDump to process
+        reserved_on: ISO date of the deferred recording reservation, if any
+
+    Returns:
+        bool: True if the dump reached the DONE state, False otherwise
+    """
+    try:
+        brain_dump = BrainDump.objects.select_related("user").get(id=dump_id)
+    except BrainDump.DoesNotExist:
+        logger.error(f"Ingest: BrainDump with id {dump_id} does not exist.")
+        return False
+
+    if brain_dump.processing_status == BrainDump.DONE:
+        logger.info(f"Ingest: BrainDump {dump_id} already processed, skipping.")
+        return True
+
+    user = brain_dump.user
+    try:
+        # --- Convert ---
+        _set_processing_status(brain_dump, BrainDump.CONVERTING)
+        source_name = brain_dump.recording.name
+        brain_dump.recording.open("rb")
+        try:
+            recording_file, audio_info, transcription_proxy = prepare_recording(
+                brain_dump.recording
+            )
+            if not recording_file:
+                raise IngestError("Audio conversion failed.")
+            if not audio_info.duration:
+                raise IngestError("Could not determine the recording length.")
+
+            duration_minutes = audio_info.duration / 60.0
+            if not check_recording_length(user, duration_minutes):
+                raise IngestError(
+                    f"Recording length ({duration_minutes:.1f} min) exceeds your limit."
+                )
+
+            # Replace the raw upload unless it was already stored in an accepted format
+            if recording_file is not brain_dump.recording:
+                recording_file.seek(0)
+                brain_dump.recording.save(
+                    recording_file.name, recording_file, save=False
+                )
+                brain_dump.save(update_fields=["recording"])
+                if source_name and source_name != brain_dump.recording.name:
+                    try:
+                        brain_dump.recording.storage.delete(source_name)
+                    except Exception as e:
+                        logger.warning(
+                            f"Ingest: Could not delete raw upload {source_name}: {e}"
+                        )
+            # --- End Convert ---
+
+            # --- Transcribe ---
+            _set_processing_status(brain_dump, BrainDump.TRANSCRIBING)
+            transcription_source = transcription_proxy or recording_file
+            transcription_source.seek(0)
+            transcription = transcribe_audio_file(
+                transcription_source, user=brain_dump.user
+            )
+        finally:
+            brain_dump.recording.close()
+        if not transcription:
+            raise IngestError("Transcription failed.")
+        brain_dump.transcription = transcription
+        brain_dump.duration_seconds = audio_info.duration
+        brain_dump.save(update_fields=["transcription", "duration_seconds"])
+        # --- End Transcribe ---
+
+        # --- Embed ---
+        _set_processing_status(brain_dump, BrainDump.EMBEDDING)
+        embedding = generate_embedding(dump_id=None, transcription=transcription)
+        if embedding:
+            brain_dump.embedding = embedding
+            brain_dump.embedding_compact = compact_embedding(embedding)
+            brain_dump.embedding_model = settings.EMBEDDING_MODEL
+        else:
+            # Same policy as the synchronous upload: keep the dump without an embedding
+            logger.error(
+                f"Ingest: Failed to generate embedding for user {user.email}, dump {brain_dump.id}"
+            )
+        brain_dump.processing_status = BrainDump.DONE
+        brain_dump.processing_error = ""
+        brain_dump.save(
+            update_fields=[
+                "embedding",
+                "embedding_compact",
+                "embedding_model",
+                "processing_status",
+                "processing_error",
+            ]
+        )
+        try:
+            generate_chunk_embeddings(brain_dump)
+        except Exception as e:
+            # Chat falls back to whole-dump retrieval without chunks
+            logger.error(
+                f"Ingest: Failed to embed chunks of BrainDump {brain_dump.id}: {e}"
+            )
+        # --- End Embed ---
+
+        logger.info(f"Ingest: BrainDump {brain_dump.id} processed successfully")
+        _settle_recording_usage(user, reserved_on, audio_info.duration / 60.0)
+        return True
+
+    except Exception as e:
+        logger.error(
+            f"Ingest: Error processing BrainDump {dump_id}: {str(e)}", exc_info=True
+        )
+        brain_dump.processing_status = BrainDump.FAILED
+        brain_dump.processing_error = (
+            str(e) if isinstance(e, IngestError) else "Server error processing upload."
+        )
+        brain_dump.save(update_fields=["processing_status", "processing_error"])
+        if not isinstance(e, IngestError):
+            raise
+        _settle_recording_usage(user, reserved_on)
+        return False
+
+
+@job(queue="embedding", timeout=300)
+def embed_brain_dump_chunks(dump_id):
+    """Background job: (re)build the chunk embeddings of a BrainDump."""
+    brain_dump = (
+        BrainDump.objects.filter(id=dump_id)
+        .only("id", "user", "transcription")
+        .first()
+    )
+    if brain_dump is not None:
+        generate_chunk_embeddings(brain_dump)
+
+
+def schedule_chunk_embeddings(brain_dump):
+    """
+    Queue the chunk embeddings of a newly transcribed BrainDump.
+
+    Without a worker (JOB_QUEUE_WORKER off) they are built right away
+    instead; a failure is only logged, since chat falls back to whole-dump
+    retrieval for dumps without chunks.
+    """
+    if settings.JOB_QUEUE_WORKER:
+        return embed_brain_dump_chunks.enqueue(dump_id=str(brain_dump.id))
+    try:
+        generate_chunk_embeddings(brain_dump)
+    except Exception as e:
+        logger.error(f"Failed to embed chunks of BrainDump {brain_dump.id}: {e}")
+    return None
+
+
+def schedule_embedding_refresh(dump_id):
+    """
+    Queue a debounced re-embed of an edited BrainDump.
+
+    Call after saving the new transcription with `embedding_stale=True`. Only
+    one refresh per dump is pending at a time, so a burst of autosaves ends up
+    as a single embedding call once the text has been quiet for
+    EMBEDDING_REFRESH_DEBOUNCE_SECONDS. Without a worker (JOB_QUEUE_WORKER
+    off) the dump is re-embedded right away instead.
+    """
+    if not settings.JOB_QUEUE_WORKER:
+        refresh_stale_embedding(str(dump_id), debounce=False)
+        return None
+    return enqueue(
+        refresh_stale_embedding.task_name,
+        {"dump_id": str(dump_id)},
+        delay=settings.EMBEDDING_REFRESH_DEBOUNCE_SECONDS,
+        unique=True,
+    )
+
+
+@job(queue="embedding", timeout=120)
+def refresh_stale_embedding(dump_id, debounce=True):
+    """
+    Background job: re-embed a BrainDump whose transcription was edited.
+
+    Waits (by re-scheduling itself) until the transcription has not changed
+    for the debounce period, then stores the new embedding unless the dump was
+    edited again while the API call was in flight. With debounce=False it
+    re-embeds immediately.
+    """
+    brain_dump = (
+        BrainDump.objects.filter(id=dump_id)
+        .only("id", "user", "transcription", "embedding_stale", "modified_at")
+        .first()
+    )
+    if brain_dump is None or not brain_dump.embedding_stale:
+        return
+
+    wait = settings.EMBEDDING_REFRESH_DEBOUNCE_SECONDS
+    quiet = (timezone.now() - brain_dump.modified_at).total_seconds()
+    if debounce and quiet < wait and not settings.JOB_QUEUE_EAGER:
+        enqueue(
+            refresh_stale_embedding.task_name,
+            {"dump_id": str(dump_id)},
+            delay=wait - quiet,
+            unique=True,
+        )
+        return
+
+    embedding = None
+    if brain_dump.transcription and brain_dump.transcription.strip():
+        embedding = embed_text(brain_dump.transcription)
+
+    # .update() leaves modified_at alone, so a later edit still shows up here
+    updated = BrainDump.objects.filter(
+        id=dump_id, modified_at=brain_dump.modified_at
+    ).update(
+        embedding=embedding,
+        embedding_compact=compact_embedding(embedding),
+        embedding_model=settings.EMBEDDING_MODEL if embedding else "",
+        embedding_stale=False,
+    )
+    if updated:
+        generate_chunk_embeddings(brain_dump)
+        logger.info(f"Refreshed embedding for edited BrainDump {dump_id}")
+    else:
+        logger.info(f"BrainDump {dump_id} changed during re-embed, refresh pending")
@@ -1,3 +1,577 @@
-from django.test import TestCase
+# Query regression tests for the pages and API endpoints, against a seeded
+# dataset. Each request must stay within its query budget, and the list
+# endpoints must cost the same at two page sizes: a difference means a query
+# per row (N+1). The plan tests EXPLAIN the queries the views actually ran.
+import base64
+import hashlib
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from jobs_app.models import Job
+from rest_framework.test import APIClient
+from subscriptions_app.ledger import flush_usage_events
+from subscriptions_app.models import UsageEvent
+
+from . import blind_index, embeddings, fields
+from .fields import Ciphertext, DecryptionError, decrypt, encrypt, key_id_of
+from .models import (
+    BrainDump,
+    ChunkEmbedding,
+    EmbeddingCacheEntry,
+    Post,
+    PostImage,
+    TwitterConnection,
+)
+from .tasks import (
+    process_brain_dump,
+    schedule_chunk_embeddings,
+    stitch_transcripts,
+)
+
+User = get_user_model()
+
+TRANSCRIPTION = "Notes about the garden, the roses and the new fence. " * 8
+
+# Every logged-in page loads the session and the user before the view runs
+SESSION_QUERIES = 2
+
+
+class SeededTestCase(TestCase):
+    DUMPS = 60
+    POSTS = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email="queries@example.com",
+            username="queries",
+            subscription_tier="pro",
+            subscription_status="active",
+        )
+        # Rows of another user, which no query may return
+        cls.other = User.objects.create(email="other@example.com", username="other")
+
+        dumps = []
+        for owner in (cls.user, cls.other):
+            for index in range(cls.DUMPS):
+                dump = BrainDump(
+                    user=owner,
+                    transcription=f"{TRANSCRIPTION} {index}",
+                    recording=f"recordings/{index}.webm",
+                )
+                dump.update_transcription_metadata()
+                dumps.append(dump)
+        BrainDump.objects.bulk_create(dumps)
+        cls.dumps = [dump for dump in dumps if dump.user_id == cls.user.pk]
+
+        cls.posts = Post.objects.bulk_create(
+            [Post(user=cls.user, content=f"Post {index}") for index in range(cls.POSTS)]
+        )
+        PostImage.objects.bulk_create(
+            [
+                PostImage(post=post, image=f"post_images/{post.pk}/{index}.png")
+                for post in cls.posts
+                for index in range(2)
+            ]
+        )
+        Through = Post.brain_dump.through
+        Through.objects.bulk_create(
+            [
+                Through(post_id=post.pk, braindump_id=dump.pk)
+                for index, post in enumerate(cls.posts)
+                for dump in cls.dumps[2 * index : 2 * index + 2]
+            ]
+        )
+        TwitterConnection.objects.create(user=cls.user, twitter_username="queries")
+
+    def count_queries(self, client, url, params=None, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, params, **kwargs)
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return response, queries
+
+    def assertQueryBudget(self, budget, client, url, params=None, **kwargs):
+        response, queries = self.count_queries(client, url, params, **kwargs)
+        self.assertLessEqual(
+            len(queries),
+            budget,
+            "\n".join(query["sql"] for query in queries.captured_queries),
+        )
+        return response
+
+    def assertNoQueryPerRow(self, client, url, size_param, small, large):
+        _, few = self.count_queries(client, url, {size_param: small})
+        _, many = self.count_queries(client, url, {size_param: large})
+        self.assertEqual(
+            len(few),
+            len(many),
+            "\n".join(query["sql"] for query in many.captured_queries),
+        )
+
+
+class PageQueryTests(SeededTestCase):
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_brain_dump_list(self):
+        self.assertQueryBudget(
+            SESSION_QUERIES + 1, self.client, reverse("brain_dump_list")
+        )
+        self.assertNoQueryPerRow(
+            self.client, reverse("brain_dump_list"), "per_page", 10, 50
+        )
+
+    def test_brain_dump_list_next_page(self):
+        response = self.client.get(reverse("brain_dump_list"))
+        cursor = response.context["page_obj"].next_cursor
+        response = self.assertQueryBudget(
+            SESSION_QUERIES + 1,
+            self.client,
+            reverse("brain_dump_list"),
+            {"cursor": cursor},
+            headers={"HX-Request": "true"},
+        )
+        self.assertTemplateUsed(response, "brain_dump_app/_dump_rows_fragment.html")
+        self.assertTemplateNotUsed(response, "brain_dump_app/list.html")
+
+    def test_invalid_cursor(self):
+        url = reverse("brain_dump_list")
+        response = self.client.get(url, {"cursor": "nope"})
+        self.assertEqual(len(response.context["page_obj"]), 10)
+        # Appended by "load more": the first page again would duplicate rows
+        response = self.client.get(
+            url, {"cursor": "nope"}, headers={"HX-Request": "true"}
+        )
+        self.assertEqual(len(response.context["page_obj"]), 0)
+        self.assertNotContains(response, "<tr")
+
+    def test_post_list(self):
+        self.assertQueryBudget(SESSION_QUERIES + 1, self.client, reverse("posts"))
+        self.assertNoQueryPerRow(self.client, reverse("posts"), "per_page", 10, 30)
+
+    def test_brain_dump_detail(self):
+        url = reverse("brain_dump_detail", args=[self.dumps[0].pk])
+        self.assertQueryBudget(SESSION_QUERIES + 1, self.client, url)
+
+    def test_brain_dump_status(self):
+        url = reverse("brain_dump_status", args=[self.dumps[0].pk])
+        self.assertQueryBudget(SESSION_QUERIES + 1, self.client, url)
+
+    def test_record_page(self):
+        self.assertQueryBudget(SESSION_QUERIES + 1, self.client, reverse("brain_dump"))
+
+    def test_post_detail(self):
+        # The post, its images, its dumps and the Twitter character limit
+        post = self.posts[0]
+        response = self.assertQueryBudget(
+            SESSION_QUERIES + 4,
+            self.client,
+            reverse("post_detail", args=[post.pk]),
+        )
+        self.assertContains(
+            response, reverse("brain_dump_detail", args=[self.dumps[0].pk])
+        )
+
+    def test_settings(self):
+        # The Twitter connection and this month's usage from the rollup
+        self.assertQueryBudget(SESSION_QUERIES + 2, self.client, reverse("settings"))
+
+    def test_chat(self):
+        self.assertQueryBudget(SESSION_QUERIES, self.client, reverse("chat"))
+
+
+class ApiQueryTests(SeededTestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_brain_dump_list(self):
+        url = reverse("api-brain-dumps-list")
+        self.assertQueryBudget(1, self.api, url)
+        self.assertNoQueryPerRow(self.api, url, "page_size", 5, 50)
+
+    def test_brain_dump_search(self):
+        self.assertQueryBudget(
+            1, self.api, reverse("api-brain-dumps-list"), {"q": "roses fence"}
+        )
+
+    def test_brain_dump_retrieve(self):
+        url = reverse("api-brain-dumps-detail", args=[self.dumps[0].pk])
+        self.assertQueryBudget(1, self.api, url)
+
+    def test_post_list(self):
+        # The posts and, in one query, the images PostSerializer nests
+        url = reverse("api-posts-list")
+        self.assertQueryBudget(2, self.api, url)
+        self.assertNoQueryPerRow(self.api, url, "page_size", 5, 30)
+
+    def test_post_retrieve(self):
+        url = reverse("api-posts-detail", args=[self.posts[0].pk])
+        self.assertQueryBudget(2, self.api, url)
+
+    def test_twitter_twitterstatus(self):
+        self.assertQueryBudget(1, self.api, reverse("api-twitter-status"))
+
+    def test_pages_cover_every_row_once(self):
+        # `next` carries the page size along with the cursor
+        url = reverse("api-brain-dumps-list") + "?page_size=25"
+        seen = []
+        while url:
+            response, queries = self.count_queries(self.api, url)
+            self.assertEqual(len(queries), 1)
+            seen += [row["id"] for row in response.data["results"]]
+            url = response.data["next"]
+        expected = sorted(self.dumps, key=lambda dump: (dump.created_at, dump.pk))
+        self.assertEqual(seen, [str(dump.pk) for dump in reversed(expected)])
+
+    def test_invalid_cursor(self):
+        response = self.api.get(reverse("api-brain-dumps-list"), {"cursor": "nope"})
+        self.assertEqual(response.status_code, 404)
+
+
+class StrQueryTests(SeededTestCase):
+    def test_str_does_not_load_related_rows(self):
+        rows = [
+            *BrainDump.objects.filter(user=self.user),
+            *Post.objects.filter(user=self.user),
+            *PostImage.objects.filter(post__user=self.user),
+        ]
+        with self.assertNumQueries(0):
+            for row in rows:
+                str(row)
+
+
+class QueryPlanTests(SeededTestCase):
+    """
+    The seeded tables are a few pages each, small enough that the planner
+    would scan them whatever the indexes; with sequential and bitmap scans
+    (which lose the index order) disabled the plan shows whether an index
+    can serve the query in page order.
+    """
+
+    def explain(self, client, url, table, params=None, **kwargs):
+        _, queries = self.count_queries(client, url, params, **kwargs)
+        sql = next(
+            query["sql"]
+            for query in queries.captured_queries
+            if f'FROM "{table}"' in query["sql"]
+        )
+        with connection.cursor() as cursor:
+            # Row estimates for the seeded rows rather than the empty tables
+            cursor.execute(f'ANALYZE "{table}"')
+            # Until the end of the test's transaction
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_bitmapscan = off")
+            cursor.execute(f"EXPLAIN {sql}")
+            return "\n".join(row[0] for row in cursor.fetchall())
+
+    def assertIndexScan(self, plan, index):
+        self.assertIn(index, plan)
+        # The index order is the page order
+        self.assertNotIn("Sort", plan)
+
+    def test_brain_dump_pages(self):
+        self.client.force_login(self.user)
+        url = reverse("brain_dump_list")
+        plan = self.explain(self.client, url, BrainDump._meta.db_table)
+        self.assertIndexScan(plan, "braindump_user_created_idx")
+
+        cursor = self.client.get(url).context["page_obj"].next_cursor
+        plan = self.explain(
+            self.client, url, BrainDump._meta.db_table, {"cursor": cursor}
+        )
+        self.assertIndexScan(plan, "braindump_user_created_idx")
+
+    def test_post_pages(self):
+        self.client.force_login(self.user)
+        plan = self.explain(self.client, reverse("posts"), Post._meta.db_table)
+        self.assertIndexScan(plan, "post_user_created_idx")
+
+    def test_api_pages(self):
+        api = APIClient()
+        api.force_authenticate(self.user)
+        plan = self.explain(
+            api, reverse("api-brain-dumps-list"), BrainDump._meta.db_table
+        )
+        self.assertIndexScan(plan, "braindump_user_created_idx")
+        plan = self.explain(api, reverse("api-posts-list"), Post._meta.db_table)
+        self.assertIndexScan(plan, "post_user_created_idx")
+
+
+KEY_2 = base64.urlsafe_b64encode(b"2" * 32).decode()
+KEY_3 = base64.urlsafe_b64encode(b"3" * 32).decode()
+
+
+class EncryptionKeysMixin:
+    """Reloads the cached AES-GCM keys around each test and each keys() block."""
+
+    def setUp(self):
+        super().setUp()
+        fields._AEAD_KEYS = None
+        self.addCleanup(setattr, fields, "_AEAD_KEYS", None)
+
+    @contextmanager
+    def keys(self, keys, primary=None):
+        fields._AEAD_KEYS = None
+        try:
+            with override_settings(
+                ENCRYPTION_KEYS=keys, ENCRYPTION_PRIMARY_KEY_ID=primary
+            ):
+                yield
+        finally:
+            fields._AEAD_KEYS = None
+
+
+@override_settings(ENCRYPTION_KEYS={}, ENCRYPTION_PRIMARY_KEY_ID=None)
+class EncryptionTests(EncryptionKeysMixin, SimpleTestCase):
+    def test_round_trip(self):
+        token = encrypt("café, 🌹")
+        self.assertEqual(key_id_of(token), fields.DERIVED_KEY_ID)
+        self.assertEqual(len(token), len("café, 🌹".encode()) + fields.V1_OVERHEAD)
+        self.assertEqual(decrypt(token), "café, 🌹")
+        # psycopg2 returns bytea as memoryview
+        self.assertEqual(decrypt(memoryview(token)), "café, 🌹")
+        self.assertNotEqual(encrypt("café, 🌹"), token)
+
+    def test_legacy_values(self):
+        fernet = fields.get_cipher_suite().encrypt(b"old token")
+        self.assertIsNone(key_id_of(fernet))
+        self.assertEqual(decrypt(fernet), "old token")
+        self.assertEqual(decrypt(fernet.decode("ascii")), "old token")
+        # Written before the field was encrypted
+        self.assertEqual(decrypt("plain text"), "plain text")
+
+    def test_tampered_value_raises(self):
+        token = bytearray(encrypt("secret"))
+        token[-1] ^= 1
+        with self.assertRaises(DecryptionError):
+            decrypt(bytes(token))
+        with self.assertRaises(DecryptionError):
+            decrypt(encrypt("secret")[:-4])
+        with self.assertRaises(DecryptionError):
+            str(Ciphertext(bytes(token)))
+
+    def test_unknown_key_id(self):
+        token = bytearray(encrypt("secret"))
+        token[1] = 9
+        with self.assertRaises(ImproperlyConfigured):
+            decrypt(bytes(token))
+
+    def test_rotation(self):
+        derived = encrypt("from the default deployment")
+        with self.keys({"2": KEY_2}):
+            old = encrypt("secret")
+            self.assertEqual(key_id_of(old), 2)
+        with self.keys({"2": KEY_2, "3": KEY_3}):
+            new = encrypt("secret")
+            self.assertEqual(key_id_of(new), 3)
+            self.assertEqual(decrypt(old), "secret")
+            # The SECRET_KEY derived key stays readable once keys are configured
+            self.assertEqual(decrypt(derived), "from the default deployment")
+        with self.keys({"3": KEY_3}):
+            with self.assertRaises(ImproperlyConfigured):
+                decrypt(old)
+        with self.keys({"2": KEY_2, "3": KEY_3}, primary=2):
+            self.assertEqual(key_id_of(encrypt("secret")), 2)
+
+    def test_derived_key_id_is_reserved(self):
+        with self.keys({"1": KEY_2}):
+            with self.assertRaises(ImproperlyConfigured):
+                encrypt("secret")
+
+
+@override_settings(ENCRYPTION_KEYS={}, ENCRYPTION_PRIMARY_KEY_ID=None)
+class RotateEncryptionTests(EncryptionKeysMixin, TestCase):
+    def test_rotate_skips_values_that_do_not_decrypt(self):
+        user = User.objects.create(email="rotate@example.com", username="rotate")
+        with self.keys({"2": KEY_2}):
+            twitter = TwitterConnection.objects.create(
+                user=user, oauth2_access_token="access", oauth2_refresh_token="refresh"
+            )
+            tampered = bytearray(encrypt("refresh"))
+        tampered[-1] ^= 1
+        TwitterConnection.objects.filter(pk=twitter.pk).update(
+            oauth2_refresh_token=Ciphertext(bytes(tampered))
+        )
+
+        stdout, stderr = StringIO(), StringIO()
+        with self.keys({"2": KEY_2, "3": KEY_3}):
+            call_command(
+                "rotate_encryption",
+                model=["brain_dump_app.TwitterConnection"],
+                stdout=stdout,
+                stderr=stderr,
+            )
+            row = TwitterConnection.objects.values_list(
+                "oauth2_access_token", "oauth2_refresh_token"
+            ).get(pk=twitter.pk)
+            self.assertEqual(key_id_of(row[0].token), 3)
+            self.assertEqual(str(row[0]), "access")
+        self.assertEqual(row[1].token, bytes(tampered))
+        self.assertIn("oauth2_refresh_token", stderr.getvalue())
+        self.assertIn("1 values did not decrypt", stdout.getvalue())
+
+
+class StitchTranscriptsTests(SimpleTestCase):
+    def test_overlap_removed(self):
+        self.assertEqual(
+            stitch_transcripts(
+                ["We planted the roses by the fence.", "by the fence. Then it rained."]
+            ),
+            "We planted the roses by the fence. Then it rained.",
+        )
+
+    def test_overlap_compares_words_not_punctuation(self):
+        self.assertEqual(
+            stitch_transcripts(["Then we went to the store", "To the store, and back"]),
+            "Then we went to the store and back",
+        )
+
+    def test_short_match_is_not_overlap(self):
+        self.assertEqual(
+            stitch_transcripts(["I said no.", "No, I will not go."]),
+            "I said no. No, I will not go.",
+        )
+        self.assertEqual(
+            stitch_transcripts(["It was over there", "over there, by the door"]),
+            "It was over there over there, by the door",
+        )
+
+
+@override_settings(JOB_QUEUE_EAGER=False)
+class EmbeddingRefreshTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="edit@example.com", username="edit")
+        self.dump = BrainDump.objects.create(user=self.user, transcription="Draft")
+        self.client.force_login(self.user)
+
+    def edit(self, text):
+        response = self.client.post(
+            reverse("brain_dump_update", args=[self.dump.id]),
+            data={"transcription": text},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.dump.refresh_from_db()
+
+    def test_edits_share_one_queued_refresh(self):
+        self.edit("")
+        self.edit(" ")
+        self.assertTrue(self.dump.embedding_stale)
+        self.assertEqual(Job.objects.count(), 1)
+
+    @override_settings(JOB_QUEUE_WORKER=False)
+    def test_refresh_inline_without_worker(self):
+        self.edit("")
+        self.assertFalse(self.dump.embedding_stale)
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(JOB_QUEUE_EAGER=False)
+class ChunkEmbeddingScheduleTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(email="chunks@example.com", username="chunks")
+        self.dump = BrainDump.objects.create(user=user, transcription="A short note.")
+        # Cached, so building the chunk needs no API call
+        EmbeddingCacheEntry.objects.create(
+            text_hmac=embeddings.text_digest("A short note."),
+            model=settings.EMBEDDING_MODEL,
+            embedding=[0.5] * 1536,
+        )
+
+    def test_queued_for_the_worker(self):
+        schedule_chunk_embeddings(self.dump)
+        self.assertEqual(Job.objects.count(), 1)
+        self.assertFalse(ChunkEmbedding.objects.exists())
+
+    @override_settings(JOB_QUEUE_WORKER=False)
+    def test_built_inline_without_worker(self):
+        schedule_chunk_embeddings(self.dump)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(ChunkEmbedding.objects.filter(brain_dump=self.dump).count(), 1)
+
+
+class IngestUsageTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        # The upload already took its recording unit (Reservation.defer)
+        self.user = User.objects.create(
+            email="ingest@example.com",
+            username="ingest",
+            subscription_tier="pro",
+            subscription_status="active",
+            rate_limit_last_reset=self.today,
+            current_recordings=1,
+        )
+        self.dump = BrainDump.objects.create(
+            user=self.user,
+            recording=ContentFile(b"not audio", name="upload.webm"),
+            processing_status=BrainDump.QUEUED,
+        )
+
+    def process(self, reserved_on):
+        result = process_brain_dump(str(self.dump.id), reserved_on=reserved_on)
+        flush_usage_events()
+        self.dump.refresh_from_db()
+        self.user.refresh_from_db()
+        return result
+
+    def test_unusable_recording_is_given_back(self):
+        self.assertFalse(self.process(self.today.isoformat()))
+        self.assertEqual(self.dump.processing_status, BrainDump.FAILED)
+        self.assertEqual(self.user.current_recordings, 0)
+        self.assertFalse(UsageEvent.objects.filter(user=self.user).exists())
+
+    def test_not_given_back_into_another_day(self):
+        # Processed after midnight: the unit was reset with yesterday's counters
+        yesterday = self.today - timedelta(days=1)
+        self.assertFalse(self.process(yesterday.isoformat()))
+        self.assertEqual(self.user.current_recordings, 1)
+
+
+class EmbeddingCacheTests(TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, embeddings, "_DIGEST_KEY", None)
+        self.addCleanup(setattr, blind_index, "_KEY", None)
+
+    def test_digest_is_keyed(self):
+        text = "Notes about the garden"
+        self.assertNotEqual(
+            embeddings.text_digest(text),
+            hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        )
+        before = embeddings.text_digest(text)
+        key = base64.urlsafe_b64encode(b"k" * 32).decode()
+        with override_settings(BLIND_INDEX_KEY=key):
+            embeddings._DIGEST_KEY = blind_index._KEY = None
+            self.assertNotEqual(embeddings.text_digest(text), before)
+
+    def test_cache_hit(self):
+        vector = [0.5] * 1536
+        EmbeddingCacheEntry.objects.create(
+            text_hmac=embeddings.text_digest("cached text"),
+            model=settings.EMBEDDING_MODEL,
+            embedding=vector,
+        )
+        # Found in the table, so no API call
+        self.assertEqual(
+            [list(v) for v in embeddings.embed_texts([" cached text "])], [vector]
+        )
+
+
+class MigrationTests(TestCase):
+    def test_models_match_migrations(self):
+        # Cloud Build runs makemigrations on deploy: a model change without its
+        # migration would be generated there, outside the repository
+        call_command("makemigrations", "brain_dump_app", check=True, dry_run=True)
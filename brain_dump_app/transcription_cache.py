@@ -0,0 +1,132 @@
+# Content-addressed transcription cache: audio SHA-256 -> transcription, per user
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from utils.lru import LRUCache
+
+from .models import TranscriptionCacheEntry
+
+logger = logging.getLogger("project")
+
+# Recently used entries, keyed by (user id, audio sha256, model). The user is
+# part of every key so one user's audio can never resolve to another's text.
+_memory = LRUCache(
+    maxsize=settings.TRANSCRIPTION_CACHE_LRU_SIZE,
+    ttl=settings.TRANSCRIPTION_CACHE_TTL_DAYS * 86400,
+)
+
+_counter_lock = threading.Lock()
+_counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stored": 0}
+
+
+def _count(name):
+    with _counter_lock:
+        _counters[name] += 1
+
+
+def cache_stats():
+    """
+    Hit/miss counters for this process.
+
+    Returns:
+        dict: memory_hits, db_hits, misses, stored and the LRU size
+    """
+    with _counter_lock:
+        stats = dict(_counters)
+    stats["memory_size"] = len(_memory)
+    return stats
+
+
+def audio_digest(audio_file):
+    """
+    SHA-256 of the audio bytes, read in chunks. Leaves the file at position 0.
+
+    Args:
+        audio_file: Django File (upload, stored recording or transcription proxy)
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    audio_file.seek(0)
+    for chunk in audio_file.chunks():
+        digest.update(chunk)
+    audio_file.seek(0)
+    return digest.hexdigest()
+
+
+def _expiry_cutoff():
+    return timezone.now() - timedelta(days=settings.TRANSCRIPTION_CACHE_TTL_DAYS)
+
+
+def get_cached_transcription(user, audio_sha256, model):
+    """
+    Look up a transcription of this audio made for this user.
+
+    Returns:
+        str: The cached transcription, or None
+    """
+    key = (str(user.pk), audio_sha256, model)
+    text = _memory.get(key)
+    if text is not None:
+        _count("memory_hits")
+        return text
+
+    entry = (
+        TranscriptionCacheEntry.objects.filter(
+            user=user,
+            audio_sha256=audio_sha256,
+            model=model,
+            last_used_at__gte=_expiry_cutoff(),
+        )
+        .only("id", "transcription")
+        .first()
+    )
+    if entry is None:
+        _count("misses")
+        return None
+
+    TranscriptionCacheEntry.objects.filter(pk=entry.pk).update(
+        hit_count=F("hit_count") + 1, last_used_at=timezone.now()
+    )
+    _memory.set(key, entry.transcription)
+    _count("db_hits")
+    return entry.transcription
+
+
+def store_transcription(user, audio_sha256, model, transcription):
+    """Save a transcription under the audio digest for this user."""
+    if not transcription:
+        return
+    try:
+        TranscriptionCacheEntry.objects.update_or_create(
+            user=user,
+            audio_sha256=audio_sha256,
+            model=model,
+            defaults={"transcription": transcription, "last_used_at": timezone.now()},
+        )
+    except IntegrityError:
+        # A concurrent request stored the same audio first
+        pass
+    _memory.set((str(user.pk), audio_sha256, model), transcription)
+    _count("stored")
+
+
+def prune_transcription_cache():
+    """
+    Delete entries not used within TRANSCRIPTION_CACHE_TTL_DAYS.
+
+    Returns:
+        int: Number of rows deleted
+    """
+    deleted, _ = TranscriptionCacheEntry.objects.filter(
+        last_used_at__lt=_expiry_cutoff()
+    ).delete()
+    return deleted
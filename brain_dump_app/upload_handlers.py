@@ -0,0 +1,89 @@
+# Upload handlers that enforce recording limits while the request body streams in
+import logging
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from utils.convert_audio import SNIFF_BYTES, header_duration
+
+logger = logging.getLogger("project")
+
+
+class RecordingLimitUploadHandler(FileUploadHandler):
+    """
+    Cuts off audio uploads that are over the user's recording length limit.
+
+    Installed first in request.upload_handlers, it sees every chunk before
+    the default handlers buffer it. The upload is stopped as soon as either
+    the byte budget (limit x RECORDING_UPLOAD_MAX_BYTES_PER_MINUTE) is spent or
+    the container header declares a duration above the limit. The reason is
+    kept in `rejection` for the view to report.
+    """
+
+    def __init__(self, request=None, max_minutes=None, field_name="audio_file"):
+        super().__init__(request)
+        self.max_minutes = max_minutes
+        self.max_bytes = int(
+            max_minutes * settings.RECORDING_UPLOAD_MAX_BYTES_PER_MINUTE
+        )
+        self.audio_field_name = field_name
+        self.rejection = None
+        self._checking = False
+
+    def _reject(self, message):
+        self.rejection = message
+        logger.info(f"Upload rejected while streaming: {message}")
+        raise StopUpload(connection_reset=True)
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self._checking = field_name == self.audio_field_name
+        self._received = 0
+        self._header = bytearray()
+        self._header_checked = False
+        if self._checking and self.content_length and self.content_length > self.max_bytes:
+            self._reject("Recording file is too large for your plan's length limit.")
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self._checking:
+            return raw_data
+
+        self._received += len(raw_data)
+        if self._received > self.max_bytes:
+            self._reject("Recording file is too large for your plan's length limit.")
+
+        if not self._header_checked:
+            self._header.extend(raw_data[: SNIFF_BYTES - len(self._header)])
+            duration = header_duration(bytes(self._header))
+            if duration is not None:
+                self._header_checked = True
+                if duration / 60.0 > self.max_minutes:
+                    self._reject(
+                        f"Recording length ({duration / 60.0:.1f} min) exceeds your limit."
+                    )
+            elif len(self._header) >= SNIFF_BYTES:
+                # No declared duration; the byte budget and the probe in the view apply
+                self._header_checked = True
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Let the next handler build the file object
+        return None
+
+
+def install_recording_limit_handler(request, max_minutes, field_name="audio_file"):
+    """
+    Put a RecordingLimitUploadHandler in front of the request's upload handlers.
+
+    Must run before request.POST / request.FILES is first accessed (for web
+    views that means before CsrfViewMiddleware, see csrf_exempt/csrf_protect
+    in brain_dump_view).
+
+    Returns:
+        RecordingLimitUploadHandler: The handler, or None if there is no limit
+    """
+    if not max_minutes:
+        return None
+    handler = RecordingLimitUploadHandler(request, max_minutes, field_name)
+    request.upload_handlers.insert(0, handler)
+    return handler
@@ -6,6 +6,7 @@ from .views import (
     brain_dump_list,
     brain_dump_detail,
     brain_dump_update,
+    brain_dump_status,
     create_post,
     save_post,
     twitter_connect,
@@ -26,6 +27,9 @@ urlpatterns = [
     path(
         "brain-dump/<uuid:dump_id>/update/", brain_dump_update, name="brain_dump_update"
     ),
+    path(
+        "brain-dump/<uuid:dump_id>/status/", brain_dump_status, name="brain_dump_status"
+    ),
     path("create-post/", create_post, name="create_post"),
     path("save-post/", save_post, name="save_post"),
     path("posts/", post_list, name="posts"),
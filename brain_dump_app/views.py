@@ -5,28 +5,43 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponse  # Added HttpResponse
 from django.template.loader import render_to_string  # Added render_to_string
 from django.views.decorators.http import require_http_methods
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 import json, nh3, logging, os, tweepy, uuid, shutil
 from .models import BrainDump, Post, OAuthState, TwitterConnection
-from .tasks import transcribe_audio_file, generate_embedding, generate_post
-from django.db.models.functions import TruncDate
+from .embeddings import compact_embedding
+from .pagination import KeysetPage, keyset_page
+from .tasks import (
+    schedule_chunk_embeddings,
+    schedule_embedding_refresh,
+    transcribe_audio_file,
+    generate_embedding,
+    generate_post,
+    enqueue_brain_dump_processing,
+)
 from django.core.files.storage import default_storage  # For saving temporary files
-from django.core.paginator import Paginator
+from django.db.models import Prefetch
 from django.contrib import messages
 from django.shortcuts import redirect
 from django.conf import settings
 from django.utils import timezone
 from django.urls import reverse
 from .models import PostImage  # Import PostImage model
-from utils.convert_audio import convert_audio_to_mp3
-from subscriptions_app.decorators import limit_check  # Import the decorator
+from utils import providers
+from utils.convert_audio import prepare_recording, probe_audio
+from subscriptions_app.decorators import (
+    limit_check,
+    release_usage,
+)  # Import the decorator
+from subscriptions_app.ledger import record_usage, usage_totals
+from subscriptions_app.models import UsageEvent
+from subscriptions_app.usage import reserve
 from subscriptions_app.utils import (
     check_recording_length,
-    check_usage,
+    get_recording_length_limit,
     get_user_limits,
 )  # Import utils & get_user_limits
-from mutagen.mp3 import MP3  # To get audio duration
+from .upload_handlers import install_recording_limit_handler
 import math  # For ceiling duration
-from django.core.files.base import ContentFile  # For handling file objects
 
 
 from .x_api import (
@@ -50,12 +65,14 @@ stripe.api_key = settings.STRIPE_SECRET_KEY  # Initialize Stripe
 def brain_dump_list(request):
     """
     View to display list of brain dumps for the current user, grouped by day.
+
+    Pages are loaded by cursor (?cursor=); HTMX requests for the next page get
+    only the rows, appended to the table as the user scrolls.
     """
-    # Get all brain dumps for the current user, annotate with date
-    all_brain_dumps = (
-        BrainDump.objects.filter(user=request.user)
-        .annotate(date=TruncDate("created_at"))
-        .order_by("-date", "-created_at")
+    # The page shows transcription_preview/transcription_length, so the full
+    # transcriptions are never loaded
+    all_brain_dumps = BrainDump.objects.filter(user=request.user).defer(
+        "transcription"
     )
 
     # Get the per_page parameter from the request, default to 10
@@ -71,27 +88,24 @@ def brain_dump_list(request):
     except (TypeError, ValueError):
         per_page = 10
 
-    # Set up pagination with the user-selected per_page value
-    paginator = Paginator(all_brain_dumps, per_page)
-    page_number = request.GET.get("page", 1)
-    page_obj = paginator.get_page(page_number)
+    # The rows are grouped by day in the template (KeysetPage.days), not in SQL
+    page_obj = _keyset_page_or_first(all_brain_dumps, request, per_page)
+    context = {"page_obj": page_obj, "per_page": per_page}
 
-    # Group the paginated results by date
-    grouped_dumps = {}
-    for dump in page_obj:
-        date_str = dump.created_at.date()
-        if date_str not in grouped_dumps:
-            grouped_dumps[date_str] = []
-        grouped_dumps[date_str].append(dump)
+    if request.headers.get("HX-Request") == "true":
+        return render(request, "brain_dump_app/_dump_rows_fragment.html", context)
+    return render(request, "brain_dump_app/list.html", context)
 
-    return render(
-        request,
-        "brain_dump_app/list.html",
-        {
-            "page_obj": page_obj,
-            "grouped_dumps": grouped_dumps,
-        },
-    )
+
+def _keyset_page_or_first(queryset, request, per_page):
+    try:
+        return keyset_page(queryset, request.GET.get("cursor"), per_page)
+    except ValueError:
+        if request.headers.get("HX-Request") == "true":
+            # "Load more" appends what it gets: the first page would show twice
+            return KeysetPage([], None, None)
+        # A stale or edited link: start from the newest rows
+        return keyset_page(queryset, None, per_page)
 
 
 @login_required
@@ -104,6 +118,29 @@ def brain_dump_detail(request, dump_id):
     return render(request, "brain_dump_app/detail.html", {"brain_dump": brain_dump})
 
 
+@login_required
+@require_http_methods(["GET"])
+def brain_dump_status(request, dump_id):
+    """
+    Lightweight polling endpoint for the background ingest pipeline.
+    Only reads the status columns, so the transcription is never decrypted.
+    """
+    dump_status = (
+        BrainDump.objects.filter(id=dump_id, user=request.user)
+        .values("id", "processing_status", "processing_error")
+        .first()
+    )
+    if not dump_status:
+        return JsonResponse({"error": "Brain dump not found"}, status=404)
+    return JsonResponse(
+        {
+            "id": str(dump_status["id"]),
+            "processing_status": dump_status["processing_status"],
+            "processing_error": dump_status["processing_error"],
+        }
+    )
+
+
 @login_required
 @require_http_methods(["POST"])
 def brain_dump_update(request, dump_id):
@@ -117,21 +154,21 @@ def brain_dump_update(request, dump_id):
         # Update the transcription
         brain_dump.transcription = nh3.clean(data.get("transcription", ""))
         brain_dump.edited = True
+        brain_dump.embedding_stale = True
 
         # Save the brain dump to update the transcription
-        brain_dump.save(update_fields=["transcription", "edited"])
+        brain_dump.save(
+            update_fields=["transcription", "edited", "embedding_stale", "modified_at"]
+        )
 
         # Update tags from transcription
         # tags = brain_dump.update_tags_from_transcription()
 
-        # If using vector embeddings, regenerate the embedding for the updated text
+        # Re-embed the updated text in the background once the edits settle
         try:
-            # Generate new embedding for the updated transcription
-            from .tasks import generate_embedding
-
-            generate_embedding(dump_id=brain_dump.id)
+            schedule_embedding_refresh(brain_dump.id)
         except Exception as e:
-            logger.error(f"Error regenerating embedding: {e}")
+            logger.error(f"Error scheduling embedding refresh: {e}")
 
         # Return success response with tags
         # return JsonResponse({"success": True, "tags": list(brain_dump.tags.names())})
@@ -141,10 +178,27 @@ def brain_dump_update(request, dump_id):
         return JsonResponse({"success": False, "error": str(e)}, status=400)
 
 
+@csrf_exempt
 @login_required
 @require_http_methods(["GET", "POST"])
-@limit_check("max_recording")  # Apply decorator for recording count limit
 def brain_dump_view(request):
+    """
+    Entry point for the recording view.
+
+    The recording length limit is enforced while the upload streams in, which
+    requires installing the upload handler before CsrfViewMiddleware reads
+    request.POST; CSRF is then checked by the inner view.
+    """
+    if request.method == "POST":
+        request.recording_limit_handler = install_recording_limit_handler(
+            request, get_recording_length_limit(request.user)
+        )
+    return _brain_dump_view(request)
+
+
+@csrf_protect
+@limit_check("max_recording")  # Apply decorator for recording count limit
+def _brain_dump_view(request):
     """
     View to handle brain dump recording interface and file uploads.
     GET: Returns the recording interface
@@ -153,11 +207,8 @@ def brain_dump_view(request):
     if request.method == "GET":
         # Get the most recent brain dump for this user
         recent_dump = (
-            BrainDump.objects.filter(
-                user=request.user,
-                transcription__isnull=False,
-                transcription__gt="",  # Ensure it has actual content
-            )
+            BrainDump.objects.filter(user=request.user, has_transcription=True)
+            .defer("transcription")
             .order_by("-created_at")
             .first()
         )
@@ -171,10 +222,21 @@ def brain_dump_view(request):
 
     # Handle POST request (file upload)
     duration_minutes = 0  # Initialize duration
-    mp3_file_object = None  # Initialize converted file object
+    recording_file = None  # Initialize converted file object
 
     try:
+        upload_limit = getattr(request, "recording_limit_handler", None)
+        if upload_limit and upload_limit.rejection:
+            release_usage(request)
+            messages.error(request, upload_limit.rejection)
+            return render(
+                request,
+                "brain_dump_app/record.html",
+                {"recent_dump": None, "error": "Recording too long"},
+            )
+
         if "audio_file" not in request.FILES:
+            release_usage(request)
             messages.error(request, "No audio file provided")
             return render(
                 request,
@@ -185,75 +247,108 @@ def brain_dump_view(request):
         original_audio = request.FILES["audio_file"]
         original_audio.seek(0)  # Ensure pointer is at the start
 
-        # --- Convert Audio and Check Length ---
+        # --- Check Length (before any conversion) ---
         try:
-            # Convert the audio to MP3 format first
-            # convert_audio_to_mp3 should return a file-like object (e.g., ContentFile)
-            mp3_file_object = convert_audio_to_mp3(original_audio)
-            if not mp3_file_object:
-                raise Exception("Audio conversion failed.")
+            # Duration comes from the container headers; formats without one
+            # are demuxed (not decoded), stopping just past the user's limit
+            max_minutes = get_recording_length_limit(request.user)
+            audio_info = probe_audio(
+                original_audio,
+                max_duration=max_minutes * 60 if max_minutes else None,
+            )
+            if not audio_info.duration:
+                raise Exception("Could not determine duration.")
+            duration_minutes = audio_info.duration / 60.0
+        except Exception as e:
+            logger.error(f"Error checking audio duration: {str(e)}", exc_info=True)
+            release_usage(request)
+            messages.error(request, f"Error processing audio: {str(e)}")
+            return render(
+                request,
+                "brain_dump_app/record.html",
+                {"recent_dump": None, "error": "Error processing audio"},
+            )
 
-            # Check duration using mutagen - it needs a file path or file-like object
-            try:
-                # If it's a ContentFile or similar in-memory object
-                mp3_file_object.seek(0)  # Reset pointer
-                audio_info = MP3(mp3_file_object)
-                duration_seconds = audio_info.info.length
-                duration_minutes = duration_seconds / 60.0
-            except Exception as mutagen_err:
-                # Fallback if mutagen can't read the file-like object directly
-                # This might happen depending on how convert_audio_to_mp3 is implemented
-                # If convert_audio_to_mp3 returned a path, this part wouldn't be needed
-                # If convert_audio_to_mp3 returns a path string:
-                # audio_info = MP3(mp3_file_object) # Assuming mp3_file_object is the path
-                # duration_seconds = audio_info.info.length
-                # duration_minutes = duration_seconds / 60.0
-                # else:
-                raise Exception(f"Could not determine duration: {mutagen_err}")
-            # Check length against user limits
-            if not check_recording_length(request.user, duration_minutes):
-                messages.error(
-                    request,
-                    f"Recording length ({duration_minutes:.1f} min) exceeds your limit.",
-                )
-                return render(
-                    request,
-                    "brain_dump_app/record.html",
-                    {"recent_dump": None, "error": "Recording too long"},
-                )
+        if not check_recording_length(request.user, duration_minutes):
+            release_usage(request)
+            messages.error(
+                request,
+                f"Recording length ({duration_minutes:.1f} min) exceeds your limit.",
+            )
+            return render(
+                request,
+                "brain_dump_app/record.html",
+                {"recent_dump": None, "error": "Recording too long"},
+            )
+        # --- End Check Length ---
+
+        # --- Asynchronous Ingest ---
+        # Persist the raw upload right away and let the background pipeline
+        # convert, transcribe and embed it, then settle the recording usage.
+        # Without a worker nothing would pick the job up: ingest inline.
+        if settings.BRAIN_DUMP_ASYNC_INGEST and settings.JOB_QUEUE_WORKER:
+            brain_dump = BrainDump.objects.create(
+                recording=original_audio,
+                user=request.user,
+                transcription="",
+                duration_seconds=audio_info.duration,
+                processing_status=BrainDump.QUEUED,
+            )
+            enqueue_brain_dump_processing(
+                brain_dump.id, request.usage_reservation.defer()
+            )
+            messages.success(
+                request,
+                "Your brain dump was uploaded and is being processed.",
+            )
+            return redirect("brain_dump_detail", dump_id=brain_dump.id)
+        # --- End Asynchronous Ingest ---
+
+        # --- Convert Audio ---
+        try:
+            # Store the upload as-is when its format is already accepted,
+            # otherwise remux/convert it (see AUDIO_PASSTHROUGH_FORMATS)
+            recording_file, audio_info, transcription_proxy = prepare_recording(
+                original_audio, info=audio_info
+            )
+            if not recording_file:
+                raise Exception("Audio conversion failed.")
 
             # Reset pointer again for saving/transcription
-            mp3_file_object.seek(0)
+            recording_file.seek(0)
 
         except Exception as e:
-            logger.error(
-                f"Error converting audio or checking duration: {str(e)}", exc_info=True
-            )
+            logger.error(f"Error converting audio: {str(e)}", exc_info=True)
+            release_usage(request)
             messages.error(request, f"Error processing audio: {str(e)}")
             return render(
                 request,
                 "brain_dump_app/record.html",
                 {"recent_dump": None, "error": "Error processing audio"},
             )
-        # --- End Convert & Check ---
+        # --- End Convert ---
 
         # Create new BrainDump instance without saving yet
         brain_dump = BrainDump(
-            recording=mp3_file_object,  # Use the converted file object
+            recording=recording_file,  # Use the converted file object
             user=request.user,
             transcription="",  # Will be populated by transcription
+            duration_seconds=audio_info.duration,
         )
 
-        # Transcribe the audio file during upload
+        # Transcribe the audio file during upload, sending the small speech
+        # proxy when there is one
         transcription = transcribe_audio_file(
-            mp3_file_object
-        )  # Use the converted file object
+            transcription_proxy or recording_file, user=request.user
+        )
         if transcription:
             brain_dump.transcription = transcription
             # now generate the embedding
             embedding = generate_embedding(dump_id=None, transcription=transcription)
             if embedding:
                 brain_dump.embedding = embedding
+                brain_dump.embedding_compact = compact_embedding(embedding)
+                brain_dump.embedding_model = settings.EMBEDDING_MODEL
             else:
                 logger.error(
                     f"Failed to generate embedding for the transcription of user {request.user.email}"
@@ -265,6 +360,9 @@ def brain_dump_view(request):
 
         # Now save the BrainDump with transcription (or without if failed)
         brain_dump.save()
+        if transcription:
+            schedule_chunk_embeddings(brain_dump)
+        record_usage(request.user, UsageEvent.RECORDING_MINUTES, duration_minutes)
 
         # Extract and save hashtags after transcription
         # if transcription:
@@ -277,6 +375,7 @@ def brain_dump_view(request):
     except Exception as e:
         # Catch any other unexpected errors during the POST processing
         logger.error(f"Error processing audio upload: {str(e)}", exc_info=True)
+        release_usage(request)
         messages.error(request, "There was an error processing your recording.")
         return render(
             request,
@@ -297,6 +396,7 @@ def create_post(request):
     max_chars = request.POST.get("max_chars", 280)
 
     if not selected_ids:
+        release_usage(request)
         messages.error(request, "No brain dumps were selected.")
         return redirect("brain_dump_list")
 
@@ -309,6 +409,7 @@ def create_post(request):
             messages.warning(request, "Some selected brain dumps could not be found.")
             # Proceed with the ones found? Or return error? Let's proceed.
             if not brain_dumps.exists():
+                release_usage(request)
                 messages.error(
                     request, "No valid brain dumps found for post generation."
                 )
@@ -319,21 +420,7 @@ def create_post(request):
             brain_dumps, post_type="twitter", min_chars=min_chars, max_chars=max_chars
         )
         posts = json.loads(posts_json)
-
-        # --- Increment Usage Counter ---
-        try:
-            user = request.user
-            user.current_post_generations += 1
-            user.save(update_fields=["current_post_generations"])
-            logger.info(
-                f"Usage updated for user {user.email}: post_generations={user.current_post_generations}"
-            )
-        except Exception as e:
-            logger.error(
-                f"Failed to update post generation counter for user {request.user.email}: {e}",
-                exc_info=True,
-            )
-        # --- End Increment ---
+        # The generation was counted by limit_check
 
         # --- Get User's Twitter Char Limit ---
         char_limit = 280  # Default limit
@@ -361,10 +448,12 @@ def create_post(request):
         )
 
     except (ValueError, TypeError):
+        release_usage(request)
         messages.error(request, "Invalid selection data.")
         return redirect("brain_dump_list")
     except Exception as e:
         logger.error(f"Error generating post: {str(e)}", exc_info=True)
+        release_usage(request)
         messages.error(request, "An error occurred while generating the post.")
         return redirect("brain_dump_list")
 
@@ -430,12 +519,15 @@ def save_post(request):
         ):  # Check if post_instance exists
             should_check_publish_limit = True
 
+    # The submission is counted now and given back if publishing fails
+    reservation = None
     if should_check_publish_limit:
-        if not check_usage(request.user, "max_post_submissions"):
+        reservation = reserve(request.user, "max_post_submissions")
+        if not reservation:
             error_message = (
                 "Post submission limit reached. Save as draft or upgrade your plan."
             )
-            messages.error(error_message)
+            messages.error(request, error_message)
             return redirect("brain_dump_list")
     # --- End Check Usage Limit ---
 
@@ -688,6 +780,8 @@ def save_post(request):
                         )
                         post_instance.status = Post.DRAFT  # Revert status
                         post_instance.save(update_fields=["status"])
+                        if reservation:
+                            reservation.release()
                         return redirect("brain_dump_list")  # Or post detail?
                 else:
                     messages.warning(
@@ -696,6 +790,8 @@ def save_post(request):
                     )
                     post_instance.status = Post.DRAFT  # Revert status
                     post_instance.save(update_fields=["status"])
+                    if reservation:
+                        reservation.release()
                     return redirect("brain_dump_list")  # Or post detail?
 
             # At this point we should have a valid access token
@@ -749,26 +845,13 @@ def save_post(request):
                     logger.error(f"Error removing temporary file {temp_file}: {str(e)}")
             # --- End Cleanup ---
 
-        # --- Increment Usage Counter if Published Successfully ---
-        if published_to_twitter or (
-            target_status == Post.POSTED
-            and should_check_publish_limit
-            and not published_to_twitter
-        ):
-            if should_check_publish_limit:  # Double check it passed the initial check
-                try:
-                    user = request.user
-                    user.current_post_submissions += 1
-                    user.save(update_fields=["current_post_submissions"])
-                    logger.info(
-                        f"Usage updated for user {user.email}: post_submissions={user.current_post_submissions}"
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Failed to update post submission counter for user {request.user.email}: {e}",
-                        exc_info=True,
-                    )
-        # --- End Increment ---
+        # --- Settle the Usage Reservation ---
+        if reservation:
+            if published_to_twitter:
+                reservation.commit()
+            else:
+                reservation.release()
+        # --- End Settle ---
 
     else:
         messages.success(
@@ -884,9 +967,12 @@ def twitter_callback(request):
 
         # Create a client using the bearer token - FIXED THIS LINE
         # For OAuth 2.0, we should use bearer_token parameter instead of the default constructor
-        client = tweepy.Client(bearer_token=token_data["access_token"])
+        client = providers.get_x_client(token_data["access_token"])
 
-        user_info = client.get_me(
+        user_info = providers.call(
+            providers.X,
+            "get_me",
+            client.get_me,
             user_auth=False,
             user_fields=["name", "username", "verified", "verified_type"],
         )
@@ -1057,16 +1143,17 @@ def twitter_callback_oauth1(request):
         )
 
         # Use the access tokens to create an API client
-        auth = tweepy.OAuth1UserHandler(
-            consumer_key=settings.TWITTER_API_KEY,
-            consumer_secret=settings.TWITTER_API_SECRET,
-            access_token=access_token,
-            access_token_secret=access_token_secret,
+        api_v1 = providers.get_x_api(
+            settings.TWITTER_API_KEY,
+            settings.TWITTER_API_SECRET,
+            access_token,
+            access_token_secret,
         )
-        api_v1 = tweepy.API(auth)
 
         # Verify credentials and get user info
-        user_info = api_v1.verify_credentials()
+        user_info = providers.call(
+            providers.X, "verify_credentials", api_v1.verify_credentials
+        )
 
         twitter_user_id = user_info.id_str
         twitter_username = user_info.screen_name
@@ -1157,9 +1244,12 @@ def twitter_disconnect(request):
 def post_list(request):
     """
     View to display a list of posts for the current user.
+
+    Pages are loaded by cursor (?cursor=); HTMX requests for the next page get
+    only the rows.
     """
     # Get all posts for the current user
-    all_posts = Post.objects.filter(user=request.user).order_by("-created_at")
+    all_posts = Post.objects.filter(user=request.user)
 
     # Get the per_page parameter from the request, default to 10
     per_page = request.GET.get("per_page", 10)
@@ -1174,18 +1264,12 @@ def post_list(request):
     except (TypeError, ValueError):
         per_page = 10
 
-    # Set up pagination with the user-selected per_page value
-    paginator = Paginator(all_posts, per_page)
-    page_number = request.GET.get("page", 1)
-    page_obj = paginator.get_page(page_number)
+    page_obj = _keyset_page_or_first(all_posts, request, per_page)
+    context = {"page_obj": page_obj, "per_page": per_page}
 
-    return render(
-        request,
-        "brain_dump_app/post_list.html",
-        {
-            "page_obj": page_obj,
-        },
-    )
+    if request.headers.get("HX-Request") == "true":
+        return render(request, "brain_dump_app/_post_rows_fragment.html", context)
+    return render(request, "brain_dump_app/post_list.html", context)
 
 
 @login_required
@@ -1193,7 +1277,20 @@ def post_detail(request, post_id):
     """
     View to display details of a specific post.
     """
-    post = get_object_or_404(Post, id=post_id, user=request.user)
+    # The template lists the images and the dumps the post was made from
+    post = get_object_or_404(
+        Post.objects.prefetch_related(
+            "images",
+            Prefetch(
+                "brain_dump",
+                queryset=BrainDump.objects.defer("transcription").order_by(
+                    "-created_at"
+                ),
+            ),
+        ),
+        id=post_id,
+        user=request.user,
+    )
 
     # --- Get User's Twitter Char Limit ---
     char_limit = 280  # Default limit
@@ -1227,7 +1324,11 @@ def settings_view(request):
     user = request.user
     subscription_cancel_at = None
     subscription_canceling = False  # Initialize
-    twitter_connected = TwitterConnection.objects.filter(user=user).exists()
+    # Loaded once and cached on the user, which the template reads it from
+    try:
+        twitter_connected = user.twitter_connection is not None
+    except TwitterConnection.DoesNotExist:
+        twitter_connected = False
 
     if user.stripe_subscription_id:
         try:
@@ -1259,6 +1360,8 @@ def settings_view(request):
         "pro_price_id": settings.STRIPE_PRO_PRICE_ID,
         "subscription_canceling": subscription_canceling,
         "user_limits": get_user_limits(user),  # Also pass user_limits
+        # From the daily rollup, so today's usage lags by up to one interval
+        "monthly_usage": usage_totals(user, timezone.localdate().replace(day=1)),
     }
     return render(request, "brain_dump_app/settings.html", context)
 
@@ -1287,24 +1390,10 @@ def chat_view(request):
                 )
 
                 if status_code == 200:
+                    # The message was counted by limit_check
                     ai_response = response_data.get(
                         "response", "Sorry, I couldn't process that."
                     )
-                    # --- Increment Usage Counter ---
-                    try:
-                        user = request.user
-                        user.current_chat_messages += 1
-                        user.save(update_fields=["current_chat_messages"])
-                        logger.info(
-                            f"Usage updated for user {user.email}: chat_messages={user.current_chat_messages}"
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"Failed to update chat message counter for user {request.user.email}: {e}",
-                            exc_info=True,
-                        )
-                    # --- End Increment ---
-
                 elif status_code == 404:
                     ai_response = response_data.get(
                         "error", "No brain dumps found to search."
@@ -1313,12 +1402,15 @@ def chat_view(request):
                     ai_response = response_data.get(
                         "error", "An error occurred during processing."
                     )
+                if status_code != 200:
+                    release_usage(request)
 
             except Exception as e:
                 logger.error(
                     f"Error in chat view calling generate_chat_response: {e}",
                     exc_info=True,
                 )
+                release_usage(request)
                 ai_response = "Sorry, an internal server error occurred."
 
             # Add AI response to history
@@ -1343,6 +1435,8 @@ def chat_view(request):
             else:
                 # Standard Django: Redirect after POST to prevent re-submission
                 return redirect("chat")
+        # Empty message: nothing was sent
+        release_usage(request)
 
     # For GET requests or initial load
     user_limits = get_user_limits(request.user)
@@ -8,6 +8,7 @@ import requests
 import tempfile
 
 from brain_dump_app.models import TwitterConnection
+from utils import providers
 
 logger = logging.getLogger("project")
 
@@ -47,7 +48,7 @@ def create_tweet_v2(
         logger.error(f"No OAuth 2.0 access token found for user {user.id}")
         return {"error": "OAuth 2.0 access token not found."}
 
-    client = tweepy.Client(bearer_token=access_token)
+    client = providers.get_x_client(access_token)
 
     media_ids = []
     temp_files = []  # Track temp files to clean up later
@@ -66,13 +67,12 @@ def create_tweet_v2(
             }
 
         # Initialize API with user's OAuth 1.0a credentials for media upload
-        auth = tweepy.OAuth1UserHandler(
+        api = providers.get_x_api(
             settings.TWITTER_API_KEY,  # App's consumer key
             settings.TWITTER_API_SECRET,  # App's consumer secret
             twitter_conn.oauth1_access_token,  # User's access token
             twitter_conn.oauth1_access_token_secret,  # User's access token secret
         )
-        api = tweepy.API(auth)
 
     try:
         # Handle URLs by downloading to temp files first (Twitter API doesn't accept direct URLs)
@@ -112,7 +112,9 @@ def create_tweet_v2(
                     logger.info(
                         f"Uploading downloaded media as {temp_file_path} for user {user.id}"
                     )
-                    media = api.media_upload(temp_file_path)  # api is now user-specific
+                    media = providers.call(
+                        providers.X, "media_upload", api.media_upload, temp_file_path
+                    )  # api is now user-specific
                     media_ids.append(media.media_id)
                     logger.info(
                         f"Media uploaded successfully with ID: {media.media_id} for user {user.id}"
@@ -138,7 +140,9 @@ def create_tweet_v2(
                     logger.info(
                         f"Uploading media from path: {media_path} for user {user.id}"
                     )
-                    media = api.media_upload(media_path)  # api is now user-specific
+                    media = providers.call(
+                        providers.X, "media_upload", api.media_upload, media_path
+                    )  # api is now user-specific
                     media_ids.append(media.media_id)
                     logger.info(
                         f"Media uploaded successfully with ID: {media.media_id} for user {user.id}"
@@ -168,16 +172,26 @@ def create_tweet_v2(
             logger.info(
                 f"Creating tweet for user {user.id} with text and media IDs: {media_ids}"
             )
-            response = client.create_tweet(
+            # Not idempotent: only throttled (429) requests are retried
+            response = providers.call(
+                providers.X,
+                "create_tweet",
+                client.create_tweet,
                 text=text,
                 media_ids=media_ids,
                 user_auth=False,  # user_auth=False because client is initialized with bearer token
+                idempotent=False,
             )
         else:
             print(f"Creating tweet for user {user.id} with text")
             logger.info(f"Creating tweet for user {user.id} with text")
-            response = client.create_tweet(
-                text=text, user_auth=False
+            response = providers.call(
+                providers.X,
+                "create_tweet",
+                client.create_tweet,
+                text=text,
+                user_auth=False,
+                idempotent=False,
             )  # user_auth=False
 
         return response.data  # Return the data part of the response
@@ -277,8 +291,11 @@ def refresh_oauth2_token(user, refresh_token, twitter_connection=None):
 
             # Fetch user info after refreshing token
             try:
-                client = tweepy.Client(bearer_token=token_data["access_token"])
-                user_info = client.get_me(
+                client = providers.get_x_client(token_data["access_token"])
+                user_info = providers.call(
+                    providers.X,
+                    "get_me",
+                    client.get_me,
                     user_auth=False,
                     user_fields=["name", "username", "verified", "verified_type"],
                 )
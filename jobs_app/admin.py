@@ -0,0 +1,46 @@
+from django.contrib import admin
+from django.utils import timezone
+from unfold.admin import ModelAdmin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(ModelAdmin):
+    list_display = (
+        "id",
+        "task_name",
+        "queue",
+        "status",
+        "attempts",
+        "max_attempts",
+        "run_at",
+        "locked_by",
+        "finished_at",
+    )
+    list_filter = ("status", "queue", "task_name")
+    search_fields = ("task_name", "locked_by", "last_error")
+    ordering = ("-created_at",)
+    readonly_fields = (
+        "attempts",
+        "locked_by",
+        "locked_until",
+        "last_error",
+        "created_at",
+        "started_at",
+        "finished_at",
+    )
+    actions = ["run_again"]
+
+    @admin.action(description="Run again now")
+    def run_again(self, request, queryset):
+        # Running jobs keep their lease; a worker still holds them
+        count = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.PENDING,
+            run_at=timezone.now(),
+            attempts=0,
+            locked_by="",
+            locked_until=None,
+            finished_at=None,
+        )
+        self.message_user(request, f"{count} job(s) queued to run again.")
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsAppConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "jobs_app"
+    verbose_name = "Background Jobs"
+
+    def ready(self):
+        # Import every app's tasks.py so @job handlers are registered
+        # before a worker tries to run them
+        autodiscover_modules("tasks")
@@ -0,0 +1,117 @@
+import logging
+import multiprocessing
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs_app.worker import WorkerPool
+
+logger = logging.getLogger("project")
+
+DEFAULT_QUEUES = "default,transcription,embedding,generation"
+
+
+def _run_pool(queues, threads, poll_interval):
+    """Entry point for a worker process: one WorkerPool that stops on SIGTERM/SIGINT."""
+    pool = WorkerPool(queues=queues, concurrency=threads, poll_interval=poll_interval)
+    signal.signal(signal.SIGTERM, pool.stop)
+    signal.signal(signal.SIGINT, pool.stop)
+    pool.run()
+
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve_health(port):
+    """Answer HTTP on `port` in a daemon thread, for platforms that probe it (Cloud Run)."""
+    server = ThreadingHTTPServer(("0.0.0.0", port), _HealthHandler)
+    threading.Thread(target=server.serve_forever, name="health", daemon=True).start()
+    logger.info(f"Worker health endpoint listening on port {port}")
+
+
+class Command(BaseCommand):
+    help = "Run background job workers that poll the Postgres job queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queues",
+            default=DEFAULT_QUEUES,
+            help=f"Comma separated queues to serve (default: {DEFAULT_QUEUES})",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=4,
+            help="Worker threads per process (I/O bound tasks)",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Worker processes (CPU bound tasks such as ffmpeg)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds an idle thread waits before polling again",
+        )
+        parser.add_argument(
+            "--health-port",
+            type=int,
+            help="Answer HTTP health checks on this port (e.g. $PORT on Cloud Run)",
+        )
+
+    def handle(self, *args, **options):
+        queues = [q.strip() for q in options["queues"].split(",") if q.strip()]
+        threads = max(1, options["threads"])
+        processes = max(1, options["processes"])
+        poll_interval = options["poll_interval"]
+
+        self.stdout.write(
+            f"Starting {processes} process(es) x {threads} thread(s) on queues: {', '.join(queues)}"
+        )
+
+        if processes == 1:
+            if options["health_port"]:
+                _serve_health(options["health_port"])
+            _run_pool(queues, threads, poll_interval)
+            return
+
+        # Connections must not be shared with forked children
+        connections.close_all()
+        children = [
+            multiprocessing.Process(
+                target=_run_pool,
+                args=(queues, threads, poll_interval),
+                name=f"job-worker-process-{i}",
+            )
+            for i in range(processes)
+        ]
+        for child in children:
+            child.start()
+        if options["health_port"]:
+            _serve_health(options["health_port"])
+
+        def _forward(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    child.terminate()  # SIGTERM, handled gracefully by the child
+
+        signal.signal(signal.SIGTERM, _forward)
+        signal.signal(signal.SIGINT, _forward)
+
+        for child in children:
+            child.join()
+        self.stdout.write(self.style.SUCCESS("All worker processes stopped"))
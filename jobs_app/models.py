@@ -0,0 +1,69 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    A unit of background work stored in Postgres.
+
+    Workers claim pending rows with SELECT ... FOR UPDATE SKIP LOCKED (see
+    jobs_app.queue), so any number of worker threads/processes can poll the
+    same table without handing the same job out twice.
+    """
+
+    # job status
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    queue = models.CharField(max_length=50, default="default")
+    task_name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(
+        default=0, help_text="Higher priority jobs are claimed first."
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(
+        default=timezone.now, help_text="The job is not claimed before this time."
+    )
+    timeout = models.PositiveIntegerField(
+        default=300,
+        help_text="Visibility timeout in seconds. A running job whose lease expires is handed out again.",
+    )
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        indexes = [
+            # Claim path: only pending rows are indexed, ordered the way they are claimed
+            models.Index(
+                fields=["queue", "-priority", "run_at"],
+                name="job_pending_claim_idx",
+                condition=Q(status="pending"),
+            ),
+            # Lease expiry / concurrency cap lookups
+            models.Index(
+                fields=["queue", "locked_until"],
+                name="job_running_lease_idx",
+                condition=Q(status="running"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} {self.task_name} ({self.status})"
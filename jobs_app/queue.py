@@ -0,0 +1,340 @@
+# Postgres backed job queue: registration, enqueueing and the claim/complete protocol
+import json
+import logging
+import random
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger("project")
+
+# Registered task handlers, keyed by task name
+_TASKS = {}
+
+
+class TaskDefinition:
+    """Handler plus the defaults used when enqueueing it."""
+
+    def __init__(self, func, name, queue, priority, max_attempts, timeout):
+        self.func = func
+        self.name = name
+        self.queue = queue
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+
+def job(name=None, queue="default", priority=0, max_attempts=5, timeout=None):
+    """
+    Decorator that registers a function as a background task.
+
+    The function keeps working when called directly; it also gains an
+    `enqueue(**payload)` attribute that stores a Job row for the workers.
+    Payload values must be JSON serializable (pass UUIDs as strings).
+
+    Args:
+        name: Task name stored on the Job (defaults to module.function)
+        queue: Queue the job is placed on (used for per-queue concurrency caps)
+        priority: Higher priorities are claimed first
+        max_attempts: How many times the job runs before it is marked failed
+        timeout: Visibility timeout in seconds (defaults to JOB_QUEUE_DEFAULT_TIMEOUT)
+    """
+
+    def decorator(func):
+        task_name = name or f"{func.__module__}.{func.__name__}"
+        definition = TaskDefinition(
+            func=func,
+            name=task_name,
+            queue=queue,
+            priority=priority,
+            max_attempts=max_attempts,
+            timeout=timeout or settings.JOB_QUEUE_DEFAULT_TIMEOUT,
+        )
+        _TASKS[task_name] = definition
+
+        def enqueue_task(**payload):
+            return enqueue(task_name, payload)
+
+        func.enqueue = enqueue_task
+        func.task_name = task_name
+        return func
+
+    return decorator
+
+
+def get_task(task_name):
+    return _TASKS.get(task_name)
+
+
+def enqueue(
+    task_name,
+    payload=None,
+    queue=None,
+    priority=None,
+    run_at=None,
+    delay=None,
+    max_attempts=None,
+    unique=False,
+):
+    """
+    Store a job for a registered task.
+
+    The row is written in the caller's transaction, so the job only becomes
+    visible to workers if the surrounding work commits.
+
+    Args:
+        task_name: Name of a task registered with @job
+        payload: Keyword arguments for the handler (JSON serializable)
+        queue, priority, max_attempts: Override the task defaults
+        run_at: Earliest time the job may run
+        delay: Seconds to wait before the job may run (ignored if run_at is given)
+        unique: Return the pending job with the same task and payload, if
+            there is one, instead of adding another (serialized with an
+            advisory lock held until the caller's transaction ends)
+
+    Returns:
+        Job: The stored job (None when JOB_QUEUE_EAGER runs it inline)
+    """
+    definition = get_task(task_name)
+    if definition is None:
+        raise ValueError(f"Unknown task '{task_name}'. Is it decorated with @job?")
+
+    payload = payload or {}
+
+    # Development/test mode: run the handler after commit in this process
+    if settings.JOB_QUEUE_EAGER:
+        transaction.on_commit(lambda: definition.func(**payload))
+        return None
+
+    if run_at is None:
+        run_at = timezone.now()
+        if delay:
+            run_at += timedelta(seconds=delay)
+
+    with transaction.atomic():
+        if unique:
+            # Two requests checking at once would otherwise both find nothing
+            # and both insert; the second waits here until the first commits
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock(%s)",
+                    [_unique_lock_key(task_name, payload)],
+                )
+            existing = Job.objects.filter(
+                status=Job.PENDING, task_name=task_name, payload=payload
+            ).first()
+            if existing is not None:
+                return existing
+
+        return Job.objects.create(
+            queue=queue or definition.queue,
+            task_name=task_name,
+            payload=payload,
+            priority=definition.priority if priority is None else priority,
+            max_attempts=max_attempts or definition.max_attempts,
+            timeout=definition.timeout,
+            run_at=run_at,
+        )
+
+
+# --- Claiming ---
+
+_CLAIM_SQL = f"""
+    WITH candidate AS (
+        SELECT id FROM {Job._meta.db_table}
+        WHERE status = %s AND queue = ANY(%s) AND run_at <= now()
+        ORDER BY priority DESC, run_at, id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE {Job._meta.db_table} AS job
+    SET status = %s,
+        attempts = job.attempts + 1,
+        locked_by = %s,
+        locked_until = now() + make_interval(secs => job.timeout),
+        started_at = now()
+    FROM candidate
+    WHERE job.id = candidate.id
+    RETURNING job.id
+"""
+
+
+def _queue_lock_key(queue):
+    # Stable 32 bit key for pg_advisory_xact_lock
+    return zlib.crc32(f"jobs_app:{queue}".encode("utf-8")) - 2**31
+
+
+def _unique_lock_key(task_name, payload):
+    key = f"jobs_app:{task_name}:{json.dumps(payload, sort_keys=True)}"
+    return zlib.crc32(key.encode("utf-8")) - 2**31
+
+
+def _queues_with_capacity(cursor, queues):
+    """
+    Filter out queues that already run their JOB_QUEUE_CONCURRENCY cap.
+
+    Capped queues are serialized with a transaction level advisory lock so two
+    workers cannot both see "one slot left" and claim past the cap.
+    """
+    caps = settings.JOB_QUEUE_CONCURRENCY
+    available = []
+    for queue in queues:
+        cap = caps.get(queue)
+        if not cap:
+            available.append(queue)
+            continue
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [_queue_lock_key(queue)])
+        cursor.execute(
+            f"SELECT count(*) FROM {Job._meta.db_table} "
+            "WHERE queue = %s AND status = %s AND locked_until > now()",
+            [queue, Job.RUNNING],
+        )
+        if cursor.fetchone()[0] < cap:
+            available.append(queue)
+    return available
+
+
+def claim_job(queues, worker_id):
+    """
+    Atomically claim the next runnable job from the given queues.
+
+    Args:
+        queues: List of queue names this worker serves
+        worker_id: Identifier stored in locked_by
+
+    Returns:
+        Job: The claimed job, or None if nothing is runnable
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            available = _queues_with_capacity(cursor, queues)
+            if not available:
+                return None
+            cursor.execute(
+                _CLAIM_SQL, [Job.PENDING, available, Job.RUNNING, worker_id]
+            )
+            row = cursor.fetchone()
+    if row is None:
+        return None
+    return Job.objects.get(id=row[0])
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter for the given number of attempts made."""
+    base = settings.JOB_QUEUE_RETRY_BASE_DELAY
+    delay = min(base * (2 ** max(attempts - 1, 0)), settings.JOB_QUEUE_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def complete_job(job_obj, worker_id):
+    """Mark a claimed job as succeeded (only if this worker still holds the lease)."""
+    return Job.objects.filter(
+        id=job_obj.id, status=Job.RUNNING, locked_by=worker_id
+    ).update(
+        status=Job.SUCCEEDED,
+        locked_until=None,
+        finished_at=timezone.now(),
+        last_error="",
+    )
+
+
+def fail_job(job_obj, worker_id, error):
+    """
+    Record a failed attempt: reschedule with backoff, or mark failed when
+    the job has used all of its attempts.
+    """
+    now = timezone.now()
+    if job_obj.attempts >= job_obj.max_attempts:
+        updates = {"status": Job.FAILED, "finished_at": now}
+    else:
+        updates = {
+            "status": Job.PENDING,
+            "run_at": now + timedelta(seconds=retry_delay(job_obj.attempts)),
+        }
+    return Job.objects.filter(
+        id=job_obj.id, status=Job.RUNNING, locked_by=worker_id
+    ).update(locked_by="", locked_until=None, last_error=str(error)[:5000], **updates)
+
+
+def extend_leases(job_ids, worker_id):
+    """Heartbeat: push the visibility timeout forward for jobs still running here."""
+    if not job_ids:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {Job._meta.db_table} "
+            "SET locked_until = now() + make_interval(secs => timeout) "
+            "WHERE id = ANY(%s) AND status = %s AND locked_by = %s",
+            [list(job_ids), Job.RUNNING, worker_id],
+        )
+        return cursor.rowcount
+
+
+def requeue_expired_jobs():
+    """
+    Hand out jobs whose lease expired (worker crashed or was killed) again,
+    or fail them if they have no attempts left.
+    """
+    now = timezone.now()
+    expired = Job.objects.filter(status=Job.RUNNING, locked_until__lt=now)
+    failed = expired.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED,
+        locked_by="",
+        locked_until=None,
+        finished_at=now,
+        last_error="Visibility timeout expired.",
+    )
+    requeued = expired.update(
+        status=Job.PENDING,
+        locked_by="",
+        locked_until=None,
+        run_at=now,
+        last_error="Visibility timeout expired.",
+    )
+    if failed or requeued:
+        logger.warning(
+            f"Job queue: {requeued} expired job(s) requeued, {failed} marked failed"
+        )
+    return requeued, failed
+
+
+def prune_finished_jobs():
+    """Delete finished jobs older than JOB_QUEUE_RETENTION_DAYS."""
+    cutoff = timezone.now() - timedelta(days=settings.JOB_QUEUE_RETENTION_DAYS)
+    deleted, _ = Job.objects.filter(
+        status__in=[Job.SUCCEEDED, Job.FAILED], finished_at__lt=cutoff
+    ).delete()
+    return deleted
+
+
+def run_job(job_obj, worker_id):
+    """
+    Execute a claimed job and record the outcome.
+
+    Returns:
+        bool: True if the handler succeeded
+    """
+    definition = get_task(job_obj.task_name)
+    if definition is None:
+        logger.error(f"Job {job_obj.id}: no handler registered for {job_obj.task_name}")
+        fail_job(job_obj, worker_id, f"Unknown task '{job_obj.task_name}'")
+        return False
+
+    try:
+        definition.func(**job_obj.payload)
+    except Exception as e:
+        logger.error(
+            f"Job {job_obj.id} ({job_obj.task_name}) attempt {job_obj.attempts} failed: {e}",
+            exc_info=True,
+        )
+        fail_job(job_obj, worker_id, e)
+        return False
+
+    complete_job(job_obj, worker_id)
+    return True
@@ -0,0 +1,201 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import (
+    claim_job,
+    complete_job,
+    enqueue,
+    fail_job,
+    job,
+    requeue_expired_jobs,
+    run_job,
+)
+
+calls = []
+
+
+@job(name="jobs_app.tests.record", queue="tests")
+def record(**payload):
+    calls.append(payload)
+
+
+@job(name="jobs_app.tests.explode", queue="tests", max_attempts=2)
+def explode():
+    raise RuntimeError("boom")
+
+
+def due(task_name, payload=None, **kwargs):
+    # Claims compare run_at with the database's now(), the start of the test's
+    # transaction: enqueue as of a moment before it
+    return enqueue(
+        task_name, payload, run_at=timezone.now() - timedelta(minutes=1), **kwargs
+    )
+
+
+@override_settings(
+    JOB_QUEUE_EAGER=False,
+    JOB_QUEUE_CONCURRENCY={"capped": 1},
+    JOB_QUEUE_RETRY_BASE_DELAY=10,
+    JOB_QUEUE_RETRY_MAX_DELAY=60,
+)
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_claim_order(self):
+        later = enqueue(record.task_name, {"n": 1}, delay=60)
+        low = due(record.task_name, {"n": 2})
+        high = due(record.task_name, {"n": 3}, priority=5)
+        due(record.task_name, {"n": 4}, queue="other")
+
+        self.assertEqual(claim_job(["tests"], "w1"), high)
+        claimed = claim_job(["tests"], "w1")
+        self.assertEqual(claimed, low)
+        self.assertEqual(claimed.status, Job.RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertEqual(claimed.locked_by, "w1")
+        self.assertGreater(claimed.locked_until, timezone.now())
+        # Not due yet
+        self.assertIsNone(claim_job(["tests"], "w1"))
+        Job.objects.filter(pk=later.pk).update(
+            run_at=timezone.now() - timedelta(minutes=1)
+        )
+        self.assertEqual(claim_job(["tests"], "w1"), later)
+
+    def test_unique_enqueue(self):
+        first = due(record.task_name, {"n": 1}, unique=True)
+        self.assertEqual(due(record.task_name, {"n": 1}, unique=True), first)
+        self.assertNotEqual(due(record.task_name, {"n": 2}, unique=True), first)
+        claim_job(["tests"], "w1")
+        # A running job does not count: the new one picks up later changes
+        self.assertNotEqual(due(record.task_name, {"n": 1}, unique=True), first)
+
+    def test_concurrency_cap(self):
+        due(record.task_name, {"n": 1}, queue="capped")
+        due(record.task_name, {"n": 2}, queue="capped")
+        self.assertIsNotNone(claim_job(["capped"], "w1"))
+        self.assertIsNone(claim_job(["capped"], "w2"))
+
+    def test_fail_job_backs_off(self):
+        due(explode.task_name)
+        claimed = claim_job(["tests"], "w1")
+        before = timezone.now()
+        self.assertEqual(fail_job(claimed, "w1", RuntimeError("boom")), 1)
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, Job.PENDING)
+        self.assertEqual(claimed.last_error, "boom")
+        self.assertEqual(claimed.locked_by, "")
+        # Base delay of 10 seconds, with jitter
+        self.assertGreaterEqual(claimed.run_at, before + timedelta(seconds=8))
+        self.assertLessEqual(claimed.run_at, timezone.now() + timedelta(seconds=12))
+
+    def test_fail_job_after_last_attempt(self):
+        due(explode.task_name)
+        for attempt in range(2):
+            Job.objects.update(run_at=timezone.now() - timedelta(minutes=1))
+            claimed = claim_job(["tests"], "w1")
+            self.assertFalse(run_job(claimed, "w1"))
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, Job.FAILED)
+        self.assertEqual(claimed.attempts, 2)
+        self.assertIsNotNone(claimed.finished_at)
+
+    def test_lease_held_by_another_worker(self):
+        due(record.task_name)
+        claimed = claim_job(["tests"], "w1")
+        self.assertEqual(fail_job(claimed, "w2", "late"), 0)
+        self.assertEqual(complete_job(claimed, "w2"), 0)
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.status, claimed.locked_by), (Job.RUNNING, "w1"))
+
+    def test_expired_lease_is_handed_out_again(self):
+        due(record.task_name)
+        claimed = claim_job(["tests"], "w1")
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(requeue_expired_jobs(), (1, 0))
+        Job.objects.update(run_at=timezone.now() - timedelta(minutes=1))
+        again = claim_job(["tests"], "w2")
+        self.assertEqual(again, claimed)
+        self.assertEqual(again.attempts, 2)
+        # The first worker's late result is ignored
+        self.assertEqual(complete_job(claimed, "w1"), 0)
+
+    def test_run_job(self):
+        due(record.task_name, {"n": 1})
+        claimed = claim_job(["tests"], "w1")
+        self.assertTrue(run_job(claimed, "w1"))
+        self.assertEqual(calls, [{"n": 1}])
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, Job.SUCCEEDED)
+
+    def test_eager_mode_runs_after_commit(self):
+        with override_settings(JOB_QUEUE_EAGER=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertIsNone(enqueue(record.task_name, {"n": 1}))
+                self.assertEqual(calls, [])
+        self.assertEqual(calls, [{"n": 1}])
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(JOB_QUEUE_EAGER=False, JOB_QUEUE_CONCURRENCY={})
+class SkipLockedTests(TransactionTestCase):
+    def test_locked_row_is_skipped(self):
+        first = enqueue(record.task_name, {"n": 1})
+        second = enqueue(record.task_name, {"n": 2})
+        locked = threading.Event()
+        done = threading.Event()
+
+        def hold_lock():
+            # Another worker's claim transaction, still open
+            try:
+                with transaction.atomic():
+                    list(Job.objects.select_for_update().filter(pk=first.pk))
+                    locked.set()
+                    done.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            # Not blocked by the lock, and not the locked row
+            self.assertEqual(claim_job(["tests"], "w1"), second)
+            self.assertIsNone(claim_job(["tests"], "w1"))
+        finally:
+            done.set()
+            thread.join()
+        self.assertEqual(claim_job(["tests"], "w1"), first)
+
+
+@override_settings(JOB_QUEUE_EAGER=False)
+class UniqueEnqueueTests(TransactionTestCase):
+    def test_concurrent_unique_enqueue(self):
+        enqueued = threading.Event()
+        jobs = []
+
+        def enqueue_and_hold():
+            # A request that queued the job and has not committed yet
+            try:
+                with transaction.atomic():
+                    jobs.append(enqueue(record.task_name, {"n": 1}, unique=True))
+                    enqueued.set()
+                    time.sleep(0.5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=enqueue_and_hold)
+        thread.start()
+        try:
+            self.assertTrue(enqueued.wait(10))
+            # Waits for the other transaction, then finds its job
+            self.assertEqual(enqueue(record.task_name, {"n": 1}, unique=True), jobs[0])
+        finally:
+            thread.join()
+        self.assertEqual(Job.objects.count(), 1)
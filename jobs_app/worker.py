@@ -0,0 +1,139 @@
+# Worker pool that polls the Postgres job queue
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+from django.db import close_old_connections, connection
+
+from .queue import (
+    claim_job,
+    extend_leases,
+    prune_finished_jobs,
+    requeue_expired_jobs,
+    run_job,
+)
+
+logger = logging.getLogger("project")
+
+
+class WorkerPool:
+    """
+    A pool of worker threads sharing one process.
+
+    Each thread claims one job at a time with SKIP LOCKED, so several pools
+    (threads, processes or containers) can serve the same queues. The main
+    thread sends lease heartbeats for running jobs and periodically requeues
+    jobs whose visibility timeout expired.
+    """
+
+    def __init__(
+        self,
+        queues,
+        concurrency=4,
+        poll_interval=1.0,
+        heartbeat_interval=30.0,
+        maintenance_interval=60.0,
+        max_jobs=None,
+    ):
+        self.queues = list(queues)
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.maintenance_interval = maintenance_interval
+        self.max_jobs = max_jobs  # Stop after this many jobs (used by benchmarks)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.stop_event = threading.Event()
+        self._running = {}  # thread name -> job id
+        self._lock = threading.Lock()
+        self._processed = 0
+
+    @property
+    def processed(self):
+        with self._lock:
+            return self._processed
+
+    def _record_processed(self):
+        with self._lock:
+            self._processed += 1
+            if self.max_jobs is not None and self._processed >= self.max_jobs:
+                self.stop_event.set()
+
+    def _worker_loop(self):
+        name = threading.current_thread().name
+        while not self.stop_event.is_set():
+            job_obj = None
+            try:
+                close_old_connections()
+                job_obj = claim_job(self.queues, self.worker_id)
+            except Exception as e:
+                logger.error(f"Worker {name}: error claiming job: {e}", exc_info=True)
+
+            if job_obj is None:
+                # Jitter so idle threads don't poll in lockstep
+                self.stop_event.wait(self.poll_interval * random.uniform(0.5, 1.5))
+                continue
+
+            with self._lock:
+                self._running[name] = job_obj.id
+            try:
+                run_job(job_obj, self.worker_id)
+            finally:
+                with self._lock:
+                    self._running.pop(name, None)
+                self._record_processed()
+        connection.close()
+
+    def _heartbeat(self):
+        with self._lock:
+            job_ids = list(self._running.values())
+        try:
+            close_old_connections()
+            extend_leases(job_ids, self.worker_id)
+        except Exception as e:
+            logger.error(f"Worker pool: heartbeat failed: {e}", exc_info=True)
+
+    def _maintenance(self):
+        try:
+            close_old_connections()
+            requeue_expired_jobs()
+            prune_finished_jobs()
+        except Exception as e:
+            logger.error(f"Worker pool: maintenance failed: {e}", exc_info=True)
+
+    def run(self):
+        """Start the worker threads and block until stop() is called."""
+        logger.info(
+            f"Worker pool {self.worker_id} starting {self.concurrency} thread(s) on queues {self.queues}"
+        )
+        threads = [
+            threading.Thread(
+                target=self._worker_loop, name=f"job-worker-{i}", daemon=True
+            )
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+
+        last_heartbeat = last_maintenance = time.monotonic()
+        self._maintenance()
+        while not self.stop_event.wait(1.0):
+            now = time.monotonic()
+            if now - last_heartbeat >= self.heartbeat_interval:
+                self._heartbeat()
+                last_heartbeat = now
+            if now - last_maintenance >= self.maintenance_interval:
+                self._maintenance()
+                last_maintenance = now
+
+        for thread in threads:
+            thread.join()
+        connection.close()
+        logger.info(f"Worker pool {self.worker_id} stopped after {self.processed} job(s)")
+
+    def stop(self, *args):
+        """Finish the jobs in flight and stop claiming new ones."""
+        self.stop_event.set()
@@ -69,6 +69,7 @@ LOCAL_APPS = [
     "brain_dump_app",
     "subscriptions_app",
     "whatsapp_app",
+    "jobs_app",
 ]
 
 
@@ -376,5 +377,134 @@ PRO_USER = {
 }
 
 
+# BRAIN DUMP INGEST
+# When enabled, uploads are saved right away (202 for the API) and the
+# convert -> transcribe -> embed pipeline runs in background workers.
+BRAIN_DUMP_ASYNC_INGEST = env.bool("BRAIN_DUMP_ASYNC_INGEST", default=False)
+
+
+# AUDIO STORAGE
+# Uploads already in one of these containers (with a codec the container is
+# meant for) are stored as-is; streams in such a codec but another container
+# are remuxed without re-encoding. Everything else is re-encoded to
+# AUDIO_OUTPUT_FORMAT (one of mp3, ogg, webm, flac).
+AUDIO_PASSTHROUGH_FORMATS = env.list(
+    "AUDIO_PASSTHROUGH_FORMATS", default=["mp3", "m4a", "webm", "ogg"]
+)
+AUDIO_OUTPUT_FORMAT = env.str("AUDIO_OUTPUT_FORMAT", default="mp3")
+# Low-bitrate rendition uploaded to the transcription API instead of the
+# stored recording ("opus" = 16 kHz mono Opus, "mp3" = 16 kHz mono MP3, "" = off)
+TRANSCRIPTION_PROXY_FORMAT = env.str("TRANSCRIPTION_PROXY_FORMAT", default="opus")
+# Long recordings are split at silences into segments of about this length
+# and transcribed concurrently
+TRANSCRIPTION_SPLIT_MIN_SECONDS = 180
+TRANSCRIPTION_SEGMENT_SECONDS = 90
+TRANSCRIPTION_SEGMENT_OVERLAP_SECONDS = 1.5
+TRANSCRIPTION_MAX_CONCURRENCY = env.int("TRANSCRIPTION_MAX_CONCURRENCY", default=4)
+# Alternative OpenAI compatible endpoint (e.g. a proxy or a local test server)
+OPENAI_BASE_URL = env.str("OPENAI_BASE_URL", default=None)
+TRANSCRIPTION_MODEL = "whisper-1"
+# Transcriptions are cached per user under the SHA-256 of the audio sent to the
+# API: a database table, with an in-process LRU of recent entries in front
+TRANSCRIPTION_CACHE_ENABLED = env.bool("TRANSCRIPTION_CACHE_ENABLED", default=True)
+TRANSCRIPTION_CACHE_TTL_DAYS = 30
+TRANSCRIPTION_CACHE_LRU_SIZE = 256
+# Upload byte budget per minute of the user's recording length limit, checked
+# while the request body streams in (12 MB covers 48 kHz 16-bit stereo WAV)
+RECORDING_UPLOAD_MAX_BYTES_PER_MINUTE = 12 * 1024 * 1024
+
+
+# EMBEDDINGS
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Embeddings are cached under the SHA-256 of their text (LRU + database table)
+EMBEDDING_CACHE_LRU_SIZE = 1024
+EMBEDDING_CACHE_TTL_DAYS = 90
+# Concurrent embedding requests arriving within this window are sent as one
+# multi-input API call of at most EMBEDDING_BATCH_MAX_SIZE texts
+EMBEDDING_BATCH_WINDOW_MS = env.int("EMBEDDING_BATCH_WINDOW_MS", default=5)
+EMBEDDING_BATCH_MAX_SIZE = 64
+EMBEDDING_TIMEOUT = 30
+# BrainDump embeddings are also stored truncated (models.COMPACT_EMBEDDING_DIMENSIONS),
+# renormalized, in half precision (about 1/6 the size). Searches use that
+# copy once EMBEDDING_SEARCH_COMPACT is on; run compact_embeddings first.
+EMBEDDING_SEARCH_COMPACT = env.bool("EMBEDDING_SEARCH_COMPACT", default=False)
+# Edited transcriptions are re-embedded once they have been unchanged this long
+EMBEDDING_REFRESH_DEBOUNCE_SECONDS = 30
+# Added to the cosine distance of dumps whose embedding predates their latest
+# edit, until the refresh lands (None = leave them out of similarity results)
+EMBEDDING_STALE_PENALTY = 0.1
+# Transcriptions are also embedded in chunks of about this many characters
+# (with overlap); chat sends the CHAT_CONTEXT_CHUNKS most relevant chunks
+EMBEDDING_CHUNK_SIZE = 1000
+EMBEDDING_CHUNK_OVERLAP = 150
+CHAT_CONTEXT_CHUNKS = 8
+# Similarity search over a user's vectors is exact (no ANN index) up to this
+# many rows; above it the index is used with iterative scans so filtering by
+# user still yields enough results
+VECTOR_SEARCH_EXACT_MAX_ROWS = env.int("VECTOR_SEARCH_EXACT_MAX_ROWS", default=2000)
+VECTOR_SEARCH_HNSW_EF_SEARCH = 100
+
+
+# ENCRYPTION
+# AES-GCM keys for EncryptedTextField by id (2-255), as "2=<key>,3=<key>"
+# with urlsafe base64 32-byte keys. New values use ENCRYPTION_PRIMARY_KEY_ID
+# (default: the highest id); older ids stay readable until rotate_encryption
+# has rewritten them. Key 1, derived from SECRET_KEY, is always readable: it
+# is the primary key only while none are configured.
+ENCRYPTION_KEYS = env.dict("ENCRYPTION_KEYS", default={})
+ENCRYPTION_PRIMARY_KEY_ID = env.int("ENCRYPTION_PRIMARY_KEY_ID", default=None)
+
+# BLIND INDEX
+# Keyword search over encrypted transcriptions compares HMAC hashes of their
+# words (brain_dump_app.blind_index). Base64 key; derived from SECRET_KEY if
+# unset. Changing it requires rebuilding with build_blind_index --all.
+BLIND_INDEX_KEY = env.str("BLIND_INDEX_KEY", default="")
+BLIND_INDEX_MIN_TOKEN_LENGTH = 2
+# Text queries in get_similar_dumps also rank keyword matches (rank fusion)
+BLIND_INDEX_HYBRID_SEARCH = env.bool("BLIND_INDEX_HYBRID_SEARCH", default=True)
+
+
+# USAGE LEDGER
+# UsageEvent rows are buffered per process and written in one INSERT at the
+# end of each request (UsageEventsMiddleware), or once this many are waiting
+USAGE_EVENTS_BATCH_SIZE = env.int("USAGE_EVENTS_BATCH_SIZE", default=100)
+# rollup_usage_job recomputes this many recent days of UsageDaily every interval
+USAGE_ROLLUP_DAYS = 2
+USAGE_ROLLUP_INTERVAL_SECONDS = env.int("USAGE_ROLLUP_INTERVAL_SECONDS", default=900)
+
+
+# EXTERNAL API PROVIDERS
+# Max calls in flight per provider and process (utils.providers)
+PROVIDER_CONCURRENCY = {
+    "openai": env.int("OPENAI_MAX_CONCURRENCY", default=16),
+    "gemini": env.int("GEMINI_MAX_CONCURRENCY", default=8),
+    "x": 4,
+}
+PROVIDER_HTTP_POOL_SIZE = 20  # keep-alive connections per provider
+PROVIDER_TIMEOUT = 60  # seconds per request
+PROVIDER_MAX_RETRIES = 3
+PROVIDER_RETRY_BASE_DELAY = 0.5  # seconds, doubled per retry (with jitter)
+PROVIDER_RETRY_MAX_DELAY = 8
+
+
+# JOB QUEUE
+# Postgres backed queue served by `python manage.py run_workers`.
+# Eager mode runs jobs in-process after commit (no worker needed, useful locally).
+JOB_QUEUE_EAGER = env.bool("JOB_QUEUE_EAGER", default=False)
+# Off when no run_workers service is deployed: edited transcriptions are then
+# re-embedded, and uploads ingested, inside the request instead of by a queued job
+JOB_QUEUE_WORKER = env.bool("JOB_QUEUE_WORKER", default=True)
+# Max jobs running at once per queue across all workers (queues not listed are uncapped)
+JOB_QUEUE_CONCURRENCY = {
+    "transcription": 4,
+    "embedding": 8,
+    "generation": 4,
+}
+JOB_QUEUE_DEFAULT_TIMEOUT = 300  # seconds before a running job is handed out again
+JOB_QUEUE_RETRY_BASE_DELAY = 5  # seconds, doubled on every attempt
+JOB_QUEUE_RETRY_MAX_DELAY = 3600
+JOB_QUEUE_RETENTION_DAYS = 7
+
+
 X_POST_LIMIT_FREE = 280
 X_POST_LIMIT_PRO = 25_000
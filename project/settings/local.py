@@ -93,6 +93,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "subscriptions_app.middleware.UsageEventsMiddleware",
 ]
 
 # LOCAL DATABASE CONNECTED TO SQLITE (NOT CURRENTLY USED)
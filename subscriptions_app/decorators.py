@@ -7,17 +7,19 @@ from django.urls import reverse
 from rest_framework.response import Response
 from rest_framework import status as drf_status
 
-# Import both utils
-from .utils import check_usage, check_and_reset_daily_limits
+from .usage import reserve
 
 logger = logging.getLogger("project")
 
 
 def limit_check(limit_type: str, value_to_add: int = 1, skip_get: bool = True):
     """
-    Decorator factory to check usage limits before executing a view.
+    Decorator factory to reserve usage before executing a view.
 
-    Handles both standard Django views and DRF API views.
+    Handles both standard Django views and DRF API views. The reservation is
+    available to the view as `request.usage_reservation`; it is released when
+    the view raises or returns an error status, and the view can release it
+    itself for failures it reports otherwise (see release_usage).
 
     Args:
         limit_type: The key corresponding to the limit in settings (e.g., 'max_recording').
@@ -48,12 +50,9 @@ def limit_check(limit_type: str, value_to_add: int = 1, skip_get: bool = True):
                     # Redirect to login for standard views
                     return redirect(f"{reverse('login')}?next={actual_request.path}")
 
-            # --- Check and Reset Daily Limits ---
-            check_and_reset_daily_limits(actual_request.user)
-            # --- End Check and Reset ---
-
-            # Perform the usage check
-            if not check_usage(actual_request.user, limit_type, value_to_add):
+            # Check and count the usage in one step
+            reservation = reserve(actual_request.user, limit_type, value_to_add)
+            if not reservation:
                 # Determine if it's a DRF request
                 is_drf_request = hasattr(actual_request, "accepted_renderer")
 
@@ -88,8 +87,20 @@ def limit_check(limit_type: str, value_to_add: int = 1, skip_get: bool = True):
                         return redirect("/")  # Or maybe settings page?
 
             # If check passes, execute the original view
-            return view_func(request, *args, **kwargs)
+            actual_request.usage_reservation = reservation
+            with reservation:
+                response = view_func(request, *args, **kwargs)
+                if getattr(response, "status_code", 200) >= 400:
+                    reservation.release()
+            return response
 
         return _wrapped_view
 
     return decorator
+
+
+def release_usage(request):
+    """Give back the usage limit_check reserved for this request, if any."""
+    reservation = getattr(request, "usage_reservation", None)
+    if reservation is not None:
+        reservation.release()
@@ -0,0 +1,120 @@
+# Usage ledger: batched UsageEvent writes and their per-day rollup
+import atexit
+import logging
+import threading
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import UsageDaily, UsageEvent
+
+logger = logging.getLogger("project")
+
+# Events waiting to be written, shared by the threads of this process
+_pending = []
+_lock = threading.Lock()
+
+
+def record_usage(user, kind, quantity=1):
+    """
+    Add a UsageEvent to the ledger.
+
+    Events are buffered and written with one INSERT when the request ends
+    (UsageEventsMiddleware), or once USAGE_EVENTS_BATCH_SIZE are waiting.
+    Code running outside a request calls flush_usage_events() when done;
+    anything left is written when the process exits.
+
+    Args:
+        user: The user the usage is billed to
+        kind: One of the UsageEvent kinds
+        quantity: Minutes for RECORDING_MINUTES, otherwise units used
+    """
+    event = UsageEvent(
+        user_id=user.pk, kind=kind, quantity=quantity, occurred_at=timezone.now()
+    )
+    with _lock:
+        _pending.append(event)
+        full = len(_pending) >= settings.USAGE_EVENTS_BATCH_SIZE
+    if full:
+        flush_usage_events()
+
+
+def flush_usage_events():
+    """
+    Write the buffered events now.
+
+    Returns:
+        int: The number of events written
+    """
+    with _lock:
+        events = _pending[:]
+        _pending.clear()
+    if not events:
+        return 0
+    try:
+        UsageEvent.objects.bulk_create(events, batch_size=1000)
+    except Exception as e:
+        logger.error(f"Failed to write {len(events)} usage events: {e}", exc_info=True)
+        return 0
+    return len(events)
+
+
+atexit.register(flush_usage_events)
+
+
+def rollup_usage(days=None):
+    """
+    Recompute the UsageDaily rows of the last `days` local days.
+
+    Whole days are aggregated again and upserted, so events that were written
+    late (buffered, or committed out of order) are picked up by the next run
+    and running it twice changes nothing.
+
+    Args:
+        days: Days to recompute, today included (defaults to USAGE_ROLLUP_DAYS)
+
+    Returns:
+        int: The number of UsageDaily rows written
+    """
+    days = days or settings.USAGE_ROLLUP_DAYS
+    first_day = timezone.localdate() - timedelta(days=days - 1)
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+    now = timezone.now()
+    totals = (
+        UsageEvent.objects.filter(occurred_at__gte=start)
+        .annotate(date=TruncDate("occurred_at"))
+        .values("user_id", "date", "kind")
+        .annotate(events=Count("id"), quantity=Sum("quantity"))
+        .order_by()
+    )
+    rows = [UsageDaily(rolled_up_at=now, **total) for total in totals]
+    UsageDaily.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["user", "date", "kind"],
+        update_fields=["events", "quantity", "rolled_up_at"],
+    )
+    return len(rows)
+
+
+def usage_totals(user, start_date, end_date=None):
+    """
+    A user's usage per kind between two local dates (inclusive), from the
+    rollup; today's figures are as of the last rollup.
+
+    Returns:
+        dict: {kind: {"events": int, "quantity": float}}
+    """
+    daily = UsageDaily.objects.filter(user=user, date__gte=start_date)
+    if end_date is not None:
+        daily = daily.filter(date__lte=end_date)
+    return {
+        row["kind"]: {"events": row["events"], "quantity": row["quantity"]}
+        for row in daily.values("kind").annotate(
+            events=Sum("events"), quantity=Sum("quantity")
+        )
+    }
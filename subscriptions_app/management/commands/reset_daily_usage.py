@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from subscriptions_app.tasks import schedule_daily_usage_reset
+from subscriptions_app.usage import reset_daily_usage
+
+
+class Command(BaseCommand):
+    help = (
+        "Zero the daily usage counters of every user with one UPDATE (safe to "
+        "rerun the same day). With --schedule, queue the nightly reset job on "
+        "the job queue instead; it re-queues itself every night."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--schedule",
+            action="store_true",
+            help="Queue the recurring job for the next midnight",
+        )
+
+    def handle(self, *args, **options):
+        if options["schedule"]:
+            scheduled = schedule_daily_usage_reset()
+            when = scheduled.run_at if scheduled else "now (JOB_QUEUE_EAGER)"
+            self.stdout.write(self.style.SUCCESS(f"Daily usage reset queued: {when}"))
+            return
+        count = reset_daily_usage()
+        self.stdout.write(self.style.SUCCESS(f"Reset daily usage of {count} users"))
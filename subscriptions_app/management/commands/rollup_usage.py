@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from subscriptions_app.ledger import rollup_usage
+from subscriptions_app.tasks import schedule_usage_rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-user daily usage totals (UsageDaily) from the usage "
+        "ledger for the last --days days. With --schedule, queue the periodic "
+        "rollup job instead; it re-queues itself every "
+        "USAGE_ROLLUP_INTERVAL_SECONDS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.USAGE_ROLLUP_DAYS,
+            help="Days to recompute, today included (e.g. 400 to rebuild all)",
+        )
+        parser.add_argument(
+            "--schedule", action="store_true", help="Queue the recurring job"
+        )
+
+    def handle(self, *args, **options):
+        if options["schedule"]:
+            schedule_usage_rollup(delay=0)
+            self.stdout.write(self.style.SUCCESS("Usage rollup queued"))
+            return
+        start = time.monotonic()
+        count = rollup_usage(days=max(1, options["days"]))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {count} daily usage rows in {time.monotonic() - start:.1f}s"
+            )
+        )
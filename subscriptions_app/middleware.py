@@ -0,0 +1,18 @@
+from .ledger import flush_usage_events
+
+
+class UsageEventsMiddleware:
+    """
+    Write the usage events recorded while handling a request before the
+    response goes out. Cloud Run throttles the CPU between requests and may
+    stop the instance, so nothing can be left in the buffer for later.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            flush_usage_events()
@@ -0,0 +1,120 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:10
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UsageDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "date",
+                    models.DateField(help_text="Local date (TIME_ZONE) of the events."),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("recording", "Recording"),
+                            ("recording_minutes", "Recording minutes"),
+                            ("post_generation", "Post generation"),
+                            ("post_submission", "Post submission"),
+                            ("chat_message", "Chat message"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("events", models.PositiveIntegerField(default=0)),
+                ("quantity", models.FloatField(default=0)),
+                (
+                    "rolled_up_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usage_daily",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Daily Usage",
+                "verbose_name_plural": "Daily Usage",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "date", "kind"), name="usage_daily_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="UsageEvent",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("recording", "Recording"),
+                            ("recording_minutes", "Recording minutes"),
+                            ("post_generation", "Post generation"),
+                            ("post_submission", "Post submission"),
+                            ("chat_message", "Chat message"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.FloatField(
+                        default=1,
+                        help_text="Minutes for recording_minutes, otherwise units used.",
+                    ),
+                ),
+                (
+                    "occurred_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Usage Event",
+                "verbose_name_plural": "Usage Events",
+                "indexes": [
+                    django.contrib.postgres.indexes.BrinIndex(
+                        fields=["occurred_at"], name="usage_event_occurred_brin_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,3 +1,73 @@
+from django.conf import settings
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class UsageEvent(models.Model):
+    """
+    One metered action, for billing and analytics.
+
+    Append-only: rows are written in batches (see subscriptions_app.ledger)
+    and rolled up into UsageDaily, which is what dashboards and reports read.
+    """
+
+    RECORDING = "recording"
+    RECORDING_MINUTES = "recording_minutes"
+    POST_GENERATION = "post_generation"
+    POST_SUBMISSION = "post_submission"
+    CHAT_MESSAGE = "chat_message"
+    KIND_CHOICES = [
+        (RECORDING, "Recording"),
+        (RECORDING_MINUTES, "Recording minutes"),
+        (POST_GENERATION, "Post generation"),
+        (POST_SUBMISSION, "Post submission"),
+        (CHAT_MESSAGE, "Chat message"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.FloatField(
+        default=1, help_text="Minutes for recording_minutes, otherwise units used."
+    )
+    occurred_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Usage Event"
+        verbose_name_plural = "Usage Events"
+        indexes = [
+            # Rows arrive in time order: a BRIN index is tiny and lets the
+            # rollup read just the recent days
+            BrinIndex(name="usage_event_occurred_brin_idx", fields=["occurred_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} x{self.quantity} ({self.occurred_at:%Y-%m-%d %H:%M})"
+
+
+class UsageDaily(models.Model):
+    """Per-user, per-day, per-kind totals of UsageEvent (see ledger.rollup_usage)."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="usage_daily"
+    )
+    date = models.DateField(help_text="Local date (TIME_ZONE) of the events.")
+    kind = models.CharField(max_length=20, choices=UsageEvent.KIND_CHOICES)
+    events = models.PositiveIntegerField(default=0)
+    quantity = models.FloatField(default=0)
+    rolled_up_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Daily Usage"
+        verbose_name_plural = "Daily Usage"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "date", "kind"], name="usage_daily_unique"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date} {self.kind}: {self.quantity}"
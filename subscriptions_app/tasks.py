@@ -0,0 +1,52 @@
+import logging
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from jobs_app.queue import enqueue, job
+
+from .ledger import flush_usage_events, rollup_usage
+from .usage import reset_daily_usage
+
+logger = logging.getLogger("project")
+
+
+def schedule_daily_usage_reset():
+    """
+    Queue the nightly usage reset for the next local midnight.
+
+    Only one is pending at a time, so calling this again (e.g. on every
+    deploy) is harmless.
+    """
+    tomorrow = timezone.localdate() + timedelta(days=1)
+    midnight = timezone.make_aware(datetime.combine(tomorrow, time.min))
+    return enqueue(reset_daily_usage_job.task_name, {}, run_at=midnight, unique=True)
+
+
+@job(timeout=600)
+def reset_daily_usage_job():
+    """Background job: zero the daily usage counters, then queue tomorrow's run."""
+    count = reset_daily_usage()
+    logger.info(f"Reset daily usage limits for {count} users")
+    if not settings.JOB_QUEUE_EAGER:
+        schedule_daily_usage_reset()
+
+
+def schedule_usage_rollup(delay=None):
+    """Queue the periodic UsageDaily rollup (only one is pending at a time)."""
+    return enqueue(
+        rollup_usage_job.task_name,
+        {},
+        delay=settings.USAGE_ROLLUP_INTERVAL_SECONDS if delay is None else delay,
+        unique=True,
+    )
+
+
+@job(timeout=900)
+def rollup_usage_job():
+    """Background job: roll the recent usage events up, then queue the next run."""
+    flush_usage_events()
+    count = rollup_usage()
+    logger.info(f"Rolled up usage into {count} daily rows")
+    if not settings.JOB_QUEUE_EAGER:
+        schedule_usage_rollup()
@@ -1,3 +1,176 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from .ledger import flush_usage_events, record_usage, rollup_usage, usage_totals
+from .middleware import UsageEventsMiddleware
+from .models import UsageEvent
+from .usage import reserve, reset_daily_usage, settle_reservation
+
+User = get_user_model()
+
+
+@override_settings(PRO_USER={"max_chat_messages": 3, "max_recording": 10})
+class ReserveTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.user = User.objects.create(
+            email="usage@example.com",
+            username="usage",
+            subscription_tier="pro",
+            subscription_status="active",
+            rate_limit_last_reset=self.today,
+        )
+
+    def counter(self):
+        self.user.refresh_from_db()
+        return self.user.current_chat_messages
+
+    def test_reserve_up_to_the_limit(self):
+        self.assertTrue(reserve(self.user, "max_chat_messages", 2))
+        self.assertTrue(reserve(self.user, "max_chat_messages"))
+        self.assertFalse(reserve(self.user, "max_chat_messages"))
+        self.assertEqual(self.counter(), 3)
+
+    def test_amount_over_the_limit_takes_nothing(self):
+        self.assertFalse(reserve(self.user, "max_chat_messages", 4))
+        self.assertEqual(self.counter(), 0)
+
+    def test_no_subscription(self):
+        self.user.subscription_status = "canceled"
+        self.assertFalse(reserve(self.user, "max_chat_messages"))
+        self.assertFalse(reserve(self.user, "not_a_limit"))
+        self.assertEqual(self.counter(), 0)
+
+    def test_release(self):
+        reservation = reserve(self.user, "max_chat_messages", 2)
+        reservation.release()
+        reservation.release()
+        self.assertEqual(self.counter(), 0)
+        # Settled: committing afterwards records nothing
+        reservation.commit()
+        self.assertEqual(flush_usage_events(), 0)
+
+    def test_exit_releases_on_exception(self):
+        with self.assertRaises(RuntimeError):
+            with reserve(self.user, "max_chat_messages"):
+                raise RuntimeError
+        self.assertEqual(self.counter(), 0)
+
+    def test_exit_commits_on_success(self):
+        with reserve(self.user, "max_chat_messages", 2):
+            pass
+        self.assertEqual(self.counter(), 2)
+        self.assertEqual(flush_usage_events(), 1)
+        event = UsageEvent.objects.get(user=self.user)
+        self.assertEqual((event.kind, event.quantity), (UsageEvent.CHAT_MESSAGE, 2))
+
+    def test_release_after_reset(self):
+        reservation = reserve(self.user, "max_chat_messages", 2)
+        # Midnight: the counters are reset, then used again on the new day
+        tomorrow = self.today + timedelta(days=1)
+        self.assertEqual(reset_daily_usage(tomorrow), 1)
+        User.objects.filter(pk=self.user.pk).update(current_chat_messages=2)
+        reservation.release()
+        self.assertEqual(self.counter(), 2)
+
+    def test_deferred_reservation_settled_later(self):
+        reservation = reserve(self.user, "max_recording")
+        day = reservation.defer()
+        # Left to the background job: the request neither commits nor releases
+        reservation.release()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.current_recordings, 1)
+        settle_reservation(self.user, "max_recording", day, kept=True)
+        self.assertEqual(flush_usage_events(), 1)
+        self.assertEqual(
+            UsageEvent.objects.get(user=self.user).kind, UsageEvent.RECORDING
+        )
+
+    def test_reserve_resets_stale_counters(self):
+        # The nightly reset did not run
+        User.objects.filter(pk=self.user.pk).update(
+            current_chat_messages=3,
+            current_recordings=5,
+            rate_limit_last_reset=self.today - timedelta(days=1),
+        )
+        self.user.refresh_from_db()
+        self.assertTrue(reserve(self.user, "max_chat_messages"))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.current_chat_messages, 1)
+        self.assertEqual(self.user.current_recordings, 0)
+        self.assertEqual(self.user.rate_limit_last_reset, self.today)
+
+    def test_stale_user_object_does_not_reset_twice(self):
+        stale = User.objects.get(pk=self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(
+            rate_limit_last_reset=self.today - timedelta(days=1)
+        )
+        self.user.refresh_from_db()
+        stale.rate_limit_last_reset = self.user.rate_limit_last_reset
+        self.assertTrue(reserve(self.user, "max_chat_messages", 2))
+        # A concurrent request that also saw yesterday's date
+        self.assertTrue(reserve(stale, "max_chat_messages"))
+        self.assertFalse(reserve(stale, "max_chat_messages"))
+        self.assertEqual(self.counter(), 3)
+
+
+class ResetDailyUsageTests(TestCase):
+    def test_reset_once_a_day(self):
+        today = timezone.localdate()
+        used = User.objects.create(
+            email="used@example.com",
+            username="used",
+            current_post_generations=4,
+            rate_limit_last_reset=today - timedelta(days=1),
+        )
+        User.objects.create(email="idle@example.com", username="idle")
+        self.assertEqual(reset_daily_usage(today), 1)
+        self.assertEqual(reset_daily_usage(today), 0)
+        used.refresh_from_db()
+        self.assertEqual(used.current_post_generations, 0)
+        self.assertEqual(used.rate_limit_last_reset, today)
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="ledger@example.com", username="ledger")
+
+    def test_events_written_when_the_request_ends(self):
+        def view(request):
+            record_usage(self.user, UsageEvent.CHAT_MESSAGE)
+            record_usage(self.user, UsageEvent.RECORDING_MINUTES, 2.5)
+            # Still buffered while the view runs
+            self.assertFalse(UsageEvent.objects.exists())
+            return HttpResponse()
+
+        UsageEventsMiddleware(view)(RequestFactory().get("/"))
+        self.assertEqual(UsageEvent.objects.filter(user=self.user).count(), 2)
+
+    def test_events_written_when_the_view_fails(self):
+        def view(request):
+            record_usage(self.user, UsageEvent.CHAT_MESSAGE)
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            UsageEventsMiddleware(view)(RequestFactory().get("/"))
+        self.assertEqual(UsageEvent.objects.filter(user=self.user).count(), 1)
+
+    def test_usage_totals_from_rollup(self):
+        record_usage(self.user, UsageEvent.CHAT_MESSAGE)
+        record_usage(self.user, UsageEvent.CHAT_MESSAGE)
+        record_usage(self.user, UsageEvent.RECORDING_MINUTES, 2.5)
+        flush_usage_events()
+        self.assertEqual(rollup_usage(), 2)
+        # Running it again rewrites the same rows
+        self.assertEqual(rollup_usage(), 2)
+        self.assertEqual(
+            usage_totals(self.user, timezone.localdate()),
+            {
+                UsageEvent.CHAT_MESSAGE: {"events": 2, "quantity": 2},
+                UsageEvent.RECORDING_MINUTES: {"events": 1, "quantity": 2.5},
+            },
+        )
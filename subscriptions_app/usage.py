@@ -0,0 +1,206 @@
+# Race-free usage accounting: reserve a unit of a daily limit before the work,
+# give it back if the work fails
+import logging
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from users_app.models import CustomUser
+from .ledger import record_usage
+from .models import UsageEvent
+from .utils import USAGE_FIELDS, get_user_limits
+
+logger = logging.getLogger("project")
+
+# Daily limit -> the UsageEvent kind a kept reservation is recorded as
+USAGE_KINDS = {
+    "max_recording": UsageEvent.RECORDING,
+    "max_post_generations": UsageEvent.POST_GENERATION,
+    "max_post_submissions": UsageEvent.POST_SUBMISSION,
+    "max_chat_messages": UsageEvent.CHAT_MESSAGE,
+}
+
+
+class Reservation:
+    """
+    Usage taken from a user's daily limit by reserve().
+
+    False when the limit was reached (nothing was taken). The units count as
+    used unless release() is called; commit() settles them and records them
+    in the usage ledger. As a context manager, the block commits on success
+    and releases on an exception.
+    """
+
+    def __init__(self, user, limit_type, amount, granted, day=None):
+        self.user = user
+        self.limit_type = limit_type
+        self.amount = amount
+        self.granted = granted
+        self.settled = not granted
+        # The usage day the units were counted in
+        self.day = day
+
+    def __bool__(self):
+        return self.granted
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.release()
+        else:
+            self.commit()
+
+    def commit(self):
+        """Keep the reserved units as used."""
+        if self.settled:
+            return
+        self.settled = True
+        record_usage(self.user, USAGE_KINDS[self.limit_type], self.amount)
+
+    def release(self):
+        """Give the reserved units back, e.g. because the action failed."""
+        if self.settled:
+            return
+        self.settled = True
+        field = USAGE_FIELDS[self.limit_type]
+        # Only into the day the units were taken from: once the counters were
+        # reset, they are not in them any more
+        released = CustomUser.objects.filter(
+            pk=self.user.pk,
+            rate_limit_last_reset=self.day,
+            **{f"{field}__gte": self.amount},
+        ).update(**{field: F(field) - self.amount})
+        if not released:
+            return
+        setattr(self.user, field, max(0, getattr(self.user, field) - self.amount))
+        logger.info(
+            f"Usage released for user {self.user.email}: {self.limit_type} -{self.amount}"
+        )
+
+    def defer(self):
+        """
+        Leave the units counted for a background job to settle.
+
+        Returns:
+            date: The usage day to pass to settle_reservation()
+        """
+        self.settled = True
+        return self.day
+
+
+def settle_reservation(user, limit_type, day, kept, amount=1):
+    """
+    Commit or release units a request deferred (see Reservation.defer).
+
+    Args:
+        user: The CustomUser the units were reserved for.
+        limit_type: The key of the limit in settings (e.g., 'max_recording').
+        day: The usage day returned by defer().
+        kept: True if the work succeeded, False to give the units back.
+        amount: Units reserved.
+    """
+    reservation = Reservation(user, limit_type, amount, granted=True, day=day)
+    if kept:
+        reservation.commit()
+    else:
+        reservation.release()
+
+
+def reserve(user: CustomUser, limit_type: str, amount: int = 1) -> Reservation:
+    """
+    Take `amount` units of a daily limit, if the user has them left.
+
+    A single conditional UPDATE (n = n + amount WHERE n + amount <= limit)
+    checks and counts at once, so concurrent requests can neither exceed the
+    limit nor lose increments. Counters last reset before today are reset
+    first, in case the nightly reset has not run.
+
+    Args:
+        user: The CustomUser instance.
+        limit_type: The key of the limit in settings (e.g., 'max_chat_messages').
+        amount: Units the action uses.
+
+    Returns:
+        Reservation: True if granted; release() it if the action fails.
+    """
+    field = USAGE_FIELDS.get(limit_type)
+    if not field:
+        logger.error(f"Invalid limit_type '{limit_type}' passed to reserve.")
+        return Reservation(user, limit_type, amount, granted=False)
+
+    limits = get_user_limits(user)
+    if not limits:
+        logger.info(
+            f"Usage reservation failed for user {user.email}: No active subscription or limits found."
+        )
+        return Reservation(user, limit_type, amount, granted=False)
+
+    today = timezone.localdate()
+    if user.rate_limit_last_reset is None or user.rate_limit_last_reset < today:
+        _reset_user_usage(user, today)
+
+    users = CustomUser.objects.filter(pk=user.pk)
+    limit = limits.get(limit_type)
+    if limit is not None:
+        users = users.filter(**{f"{field}__lte": limit - amount})
+    else:
+        # No limit defined for the tier: allowed, but still counted
+        logger.warning(
+            f"Limit type '{limit_type}' not found in settings for tier {user.subscription_tier}."
+        )
+    granted = users.update(**{field: F(field) + amount}) == 1
+    if granted:
+        # Approximate (other requests may have counted too); for display only
+        setattr(user, field, getattr(user, field) + amount)
+    else:
+        logger.info(
+            f"Usage limit exceeded for user {user.email}: {limit_type} (Limit: {limit}, Adding: {amount})"
+        )
+    return Reservation(user, limit_type, amount, granted, day=today)
+
+
+def _not_reset_since(today):
+    return Q(rate_limit_last_reset__lt=today) | Q(rate_limit_last_reset=None)
+
+
+def _reset_user_usage(user, today):
+    # The condition makes it once a day, however many requests race here
+    reset = (
+        CustomUser.objects.filter(pk=user.pk)
+        .filter(_not_reset_since(today))
+        .update(
+            **{field: 0 for field in USAGE_FIELDS.values()},
+            rate_limit_last_reset=today,
+        )
+    )
+    if reset:
+        logger.info(f"Daily usage of user {user.email} reset on first use today")
+        for field in USAGE_FIELDS.values():
+            setattr(user, field, 0)
+    user.rate_limit_last_reset = today
+
+
+def reset_daily_usage(today=None) -> int:
+    """
+    Zero every user's daily counters in one UPDATE.
+
+    Only rows with usage that were not reset today yet are written, so running
+    it again the same day changes nothing.
+
+    Returns:
+        int: The number of users reset.
+    """
+    today = today or timezone.localdate()
+    used = Q()
+    for field in USAGE_FIELDS.values():
+        used |= Q(**{f"{field}__gt": 0})
+    return (
+        CustomUser.objects.filter(used)
+        .filter(_not_reset_since(today))
+        .update(
+            **{field: 0 for field in USAGE_FIELDS.values()},
+            rate_limit_last_reset=today,
+        )
+    )
@@ -1,49 +1,19 @@
 # Utility functions for subscription and usage checks
 import logging
-from datetime import date  # Import date
 from django.conf import settings
 from users_app.models import CustomUser  # Assuming CustomUser is in users_app
 
 logger = logging.getLogger("project")
 
-
-def check_and_reset_daily_limits(user: CustomUser):
-    """Checks if usage limits need resetting for the day and resets them."""
-    if not user or not hasattr(user, "rate_limit_last_reset"):
-        # Avoid errors if user object is weird or migration hasn't run
-        logger.warning(
-            f"Skipping daily limit reset check for invalid user object: {user}"
-        )
-        return
-
-    today = date.today()
-    # Check if the last reset date is not today (or if it's None)
-    if user.rate_limit_last_reset != today:
-        logger.info(
-            f"Resetting daily usage limits for user {user.email} (ID: {user.id}) for date {today}. Previous reset date: {user.rate_limit_last_reset}"
-        )
-        # Define fields to reset
-        fields_to_reset = {
-            "current_recordings": 0,
-            "current_post_generations": 0,
-            "current_post_submissions": 0,
-            "current_chat_messages": 0,
-        }
-        fields_to_update = list(fields_to_reset.keys()) + ["rate_limit_last_reset"]
-
-        # Apply resets
-        for field, value in fields_to_reset.items():
-            setattr(user, field, value)
-        user.rate_limit_last_reset = today
-
-        try:
-            user.save(update_fields=fields_to_update)
-        except Exception as e:
-            logger.error(
-                f"Failed to save user {user.email} after resetting daily limits: {e}",
-                exc_info=True,
-            )
-            # Log error, but continue. The state in memory is reset, but DB might be stale.
+# Daily limit (key in settings) -> usage counter on CustomUser. The counters
+# are reset nightly (see usage.reset_daily_usage).
+# Note: max_recording_length is handled separately by check_recording_length
+USAGE_FIELDS = {
+    "max_recording": "current_recordings",
+    "max_post_generations": "current_post_generations",
+    "max_post_submissions": "current_post_submissions",
+    "max_chat_messages": "current_chat_messages",
+}
 
 
 def get_user_limits(user: CustomUser) -> dict | None:
@@ -80,6 +50,9 @@ def check_usage(user: CustomUser, limit_type: str, value_to_add: int = 1) -> boo
     """
     Checks if a user can perform an action based on their usage limits.
 
+    Read-only: to count the action as well, use usage.reserve(), which does
+    both atomically.
+
     Args:
         user: The CustomUser instance.
         limit_type: The key corresponding to the limit in settings (e.g., 'max_recording').
@@ -95,16 +68,7 @@ def check_usage(user: CustomUser, limit_type: str, value_to_add: int = 1) -> boo
         )
         return False  # No active subscription or limits defined
 
-    # Map limit_type (from settings) to the corresponding field name on CustomUser
-    usage_field_map = {
-        "max_recording": "current_recordings",
-        "max_post_generations": "current_post_generations",
-        "max_post_submissions": "current_post_submissions",
-        "max_chat_messages": "current_chat_messages",
-        # Note: max_recording_length is handled separately by check_recording_length
-    }
-
-    usage_field = usage_field_map.get(limit_type)
+    usage_field = USAGE_FIELDS.get(limit_type)
     if not usage_field:
         logger.error(f"Invalid limit_type '{limit_type}' passed to check_usage.")
         return False  # Should not happen if called correctly
@@ -127,6 +91,23 @@ def check_usage(user: CustomUser, limit_type: str, value_to_add: int = 1) -> boo
         return True
 
 
+def get_recording_length_limit(user: CustomUser) -> float | None:
+    """
+    Returns the user's maximum recording length in minutes.
+
+    Args:
+        user: The CustomUser instance.
+
+    Returns:
+        The limit in minutes, 0 if the user has no active subscription,
+        or None if the tier defines no limit.
+    """
+    limits = get_user_limits(user)
+    if not limits:
+        return 0
+    return limits.get("max_recording_length")
+
+
 def check_recording_length(user: CustomUser, duration_minutes: float) -> bool:
     """
     Checks if the duration of a recording is within the user's limit.
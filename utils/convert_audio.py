@@ -1,96 +1,1008 @@
 import os
-import tempfile
+import shutil
+import struct
 import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from django.conf import settings
 from django.core.files import File
-from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
 import logging
 
 logger = logging.getLogger("project")
 
+# Size of the chunks fed to / read from ffmpeg
+CHUNK_SIZE = 64 * 1024
+# Converted output stays in memory up to this size, then spills to a temp file
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+# Only the tail of ffmpeg's stderr is kept for error messages
+STDERR_TAIL_BYTES = 16 * 1024
 
-def convert_audio_to_mp3(audio_file):
+# Containers that carry their index ("moov" atom) in a box that may come
+# after the media data; ffmpeg needs to seek to read those.
+ISO_BMFF_EXTENSIONS = {".mp4", ".m4a", ".mov", ".3gp"}
+
+MP3_CODEC_ARGS = ["-acodec", "libmp3lame", "-q:a", "2"]
+
+# Muxers that seek back to the start when they finish: the MP3 muxer then
+# fills in the Xing/LAME frame (frame count, seek table) that VBR files need
+# for their duration. Written to a pipe it stays blank and players and probes
+# guess the length from the first frames, so these are encoded to a
+# temporary file instead.
+SEEKABLE_OUTPUT_MUXERS = {"mp3"}
+
+# Recordings at or below this bitrate are already small enough to upload
+PROXY_SKIP_BITRATE = 48_000
+
+# Speech-optimized renditions sent to the transcription API instead of the
+# stored file: (extension, ffmpeg muxer, encoder arguments). 16 kHz mono is
+# what Whisper resamples to anyway. Bit-exact output without metadata makes
+# the same input encode to the same bytes, so proxies can be cache keys.
+PROXY_BITEXACT_ARGS = [
+    "-map_metadata", "-1", "-fflags", "+bitexact", "-flags:a", "+bitexact"
+]
+TRANSCRIPTION_PROXY_FORMATS = {
+    "opus": (
+        ".ogg",
+        "ogg",
+        ["-ac", "1", "-ar", "16000", "-acodec", "libopus", "-b:a", "24k"]
+        + ["-application", "voip"]
+        + PROXY_BITEXACT_ARGS,
+    ),
+    "mp3": (
+        ".mp3",
+        "mp3",
+        ["-ac", "1", "-ar", "16000", "-acodec", "libmp3lame", "-b:a", "32k"]
+        + PROXY_BITEXACT_ARGS,
+    ),
+}
+
+
+class TranscodeError(Exception):
+    """Raised when ffmpeg fails to transcode an input."""
+
+
+def _local_path(audio_file):
+    """
+    Return a filesystem path for the input if it already has one.
+
+    TemporaryUploadedFile exposes temporary_file_path(); FieldFiles on local
+    storage expose .path. Remote storages (GCS) raise NotImplementedError.
+    """
+    if hasattr(audio_file, "temporary_file_path"):
+        return audio_file.temporary_file_path()
+    try:
+        path = audio_file.path
+    except (AttributeError, NotImplementedError, ValueError):
+        return None
+    return path if path and os.path.exists(path) else None
+
+
+def _iso_bmff_is_streamable(audio_file):
+    """
+    Check whether an MP4-family file can be decoded from a pipe.
+
+    Walks the top level boxes: if "moov" appears before "mdat" (faststart)
+    ffmpeg can read it sequentially, otherwise it has to seek to the end.
+    """
+    if not hasattr(audio_file, "seek"):
+        return False
+    try:
+        audio_file.seek(0)
+        offset = 0
+        for _ in range(32):
+            header = audio_file.read(8)
+            if len(header) < 8:
+                return False
+            size, box_type = struct.unpack(">I4s", header)
+            if size == 1:  # 64 bit size follows the header
+                size = struct.unpack(">Q", audio_file.read(8))[0]
+            elif size < 8:  # size 0 means the box runs to the end of the file
+                return False
+            if box_type == b"moov":
+                return True
+            if box_type == b"mdat":
+                return False
+            offset += size
+            audio_file.seek(offset)
+        return False
+    except (OSError, struct.error):
+        return False
+    finally:
+        audio_file.seek(0)
+
+
+def _feed_stdin(process, audio_file, errors):
+    """Writer thread: stream the input chunks into ffmpeg's stdin."""
+    try:
+        for chunk in audio_file.chunks(CHUNK_SIZE):
+            process.stdin.write(chunk)
+    except BrokenPipeError:
+        # ffmpeg exited early; its return code and stderr explain why
+        pass
+    except Exception as e:
+        errors.append(e)
+    finally:
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+
+
+def _drain_stderr(process, tail):
+    """Reader thread: keep the last STDERR_TAIL_BYTES of ffmpeg's log."""
+    for line in iter(process.stderr.readline, b""):
+        tail.extend(line)
+        if len(tail) > STDERR_TAIL_BYTES:
+            del tail[: len(tail) - STDERR_TAIL_BYTES]
+
+
+def _drain_pipe(source, spool):
+    """Reader thread: copy a side output pipe into its spool."""
+    with source:
+        shutil.copyfileobj(source, spool, CHUNK_SIZE)
+
+
+def _run_ffmpeg(
+    audio_file,
+    output_args,
+    side_output_args=None,
+    input_args=None,
+    allow_empty=False,
+    output_file=None,
+):
     """
-    Convert an uploaded audio file to MP3 format using FFmpeg directly
+    Run ffmpeg on a file-like input and collect whatever it writes to stdout.
+
+    The input is written to ffmpeg's stdin chunk by chunk (or passed by path
+    when it already lives on local disk) and the output is read incrementally
+    into a SpooledTemporaryFile, so memory stays bounded by SPOOL_MAX_MEMORY
+    and nothing is written to disk for typical recordings.
+
+    A second output from the same decode can be requested with
+    side_output_args; it is written to an extra pipe passed to ffmpeg. An
+    empty side output is returned as None rather than failing the run.
 
     Args:
-        audio_file: The uploaded file from request.FILES
+        audio_file: Uploaded file, FieldFile, Django File-like object or a path
+        output_args: ffmpeg arguments placed after the input
+        side_output_args: Arguments for a second output (without the target)
+        input_args: ffmpeg arguments placed before the input (e.g. -ss)
+        allow_empty: Don't treat an empty stdout as a failure
+        output_file: NamedTemporaryFile that output_args name as the output
+            instead of pipe:1; it is returned in place of the stdout spool
 
     Returns:
-        A Django File object representing the converted MP3 file
+        tuple: (stdout spool, side output spool or None), positioned at the start
+
+    Raises:
+        TranscodeError: If ffmpeg fails or produces no output
     """
-    tmp_orig_path = None
-    mp3_temp_path = None
+    if isinstance(audio_file, str):
+        # Already a path on local disk
+        extension, input_path = os.path.splitext(audio_file)[1].lower(), audio_file
+    else:
+        extension = os.path.splitext(audio_file.name or "")[1].lower()
+        input_path = _local_path(audio_file)
+    fallback_path = None
+    if input_path is None and extension in ISO_BMFF_EXTENSIONS:
+        if not _iso_bmff_is_streamable(audio_file):
+            # Non-faststart MP4: ffmpeg must seek, so give it a real file
+            with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as tmp:
+                for chunk in audio_file.chunks(CHUNK_SIZE):
+                    tmp.write(chunk)
+                fallback_path = input_path = tmp.name
+
+    command = ["ffmpeg", "-hide_banner", "-nostats", *(input_args or [])]
+    if output_file is not None:
+        # The temporary file already exists
+        command.insert(1, "-y")
+    if input_path:
+        command += ["-nostdin", "-i", input_path]
+    else:
+        command += ["-i", "pipe:0"]
+    command += output_args
 
+    side_read_fd = side_write_fd = None
+    if side_output_args:
+        side_read_fd, side_write_fd = os.pipe()
+        command += [*side_output_args, f"pipe:{side_write_fd}"]
+
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    side_output = None
+    stderr_tail = bytearray()
+    writer_errors = []
     try:
-        # Create a temporary file to store the uploaded audio
-        with tempfile.NamedTemporaryFile(
-            suffix=os.path.splitext(audio_file.name)[1], delete=False
-        ) as tmp_orig:
-            # Write the uploaded file content to the temp file
-            for chunk in audio_file.chunks():
-                tmp_orig.write(chunk)
-            tmp_orig_path = tmp_orig.name
-
-        # Create another temporary file for the converted MP3
-        mp3_temp = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
-        mp3_temp_path = mp3_temp.name
-        mp3_temp.close()
-
-        # Use FFmpeg directly to convert the file
         try:
-            # Run FFmpeg command to convert to MP3
-            command = [
-                "ffmpeg",
-                "-i",
-                tmp_orig_path,  # Input file
-                "-acodec",
-                "libmp3lame",  # MP3 codec
-                "-q:a",
-                "2",  # Audio quality (2 is good quality, lower is better)
-                "-y",  # Overwrite output file if it exists
-                mp3_temp_path,  # Output file
-            ]
-
-            # Execute the command
-            result = subprocess.run(
-                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL if input_path else subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                pass_fds=(side_write_fd,) if side_write_fd is not None else (),
+            )
+        finally:
+            # Only ffmpeg keeps the write end, so the reader sees EOF when it exits
+            if side_write_fd is not None:
+                os.close(side_write_fd)
+        threads = [
+            threading.Thread(
+                target=_drain_stderr, args=(process, stderr_tail), daemon=True
+            )
+        ]
+        if side_read_fd is not None:
+            side_output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+            threads.append(
+                threading.Thread(
+                    target=_drain_pipe,
+                    args=(os.fdopen(side_read_fd, "rb"), side_output),
+                    daemon=True,
+                )
+            )
+            side_read_fd = None
+        if not input_path:
+            if hasattr(audio_file, "seek"):
+                audio_file.seek(0)
+            threads.append(
+                threading.Thread(
+                    target=_feed_stdin,
+                    args=(process, audio_file, writer_errors),
+                    daemon=True,
+                )
             )
+        for thread in threads:
+            thread.start()
 
-            # Check if conversion was successful
-            if not os.path.exists(mp3_temp_path) or os.path.getsize(mp3_temp_path) == 0:
-                logger.error("FFmpeg conversion failed to produce output file")
-                return None
+        # Read the output as it is produced
+        shutil.copyfileobj(process.stdout, output, CHUNK_SIZE)
+        process.stdout.close()
+        returncode = process.wait()
+        for thread in threads:
+            thread.join()
+    finally:
+        if side_read_fd is not None:
+            os.close(side_read_fd)
+        if fallback_path and os.path.exists(fallback_path):
+            os.unlink(fallback_path)
 
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpeg conversion error: {e.stderr.decode()}")
-            return None
-        finally:
-            # Clean up the original temp file
-            if os.path.exists(tmp_orig_path):
-                os.unlink(tmp_orig_path)
-                tmp_orig_path = None
+    if output_file is not None:
+        output.close()
+        output = output_file
+        output.seek(0, os.SEEK_END)
+
+    error = None
+    if writer_errors:
+        error = f"Error reading input: {writer_errors[0]}"
+    elif returncode != 0:
+        error = stderr_tail.decode("utf-8", errors="replace").strip()
+    elif output.tell() == 0 and not allow_empty:
+        error = "ffmpeg produced no output"
+    if side_output is not None and (error or side_output.tell() == 0):
+        if not error:
+            logger.warning("ffmpeg produced no side output")
+        side_output.close()
+        side_output = None
+    if error:
+        output.close()
+        raise TranscodeError(error)
+
+    output.seek(0)
+    if side_output is not None:
+        side_output.seek(0)
+    return output, side_output
+
+
+def _encode(audio_file, output_format, codec_args, side_output_args=None):
+    """
+    Encode to `output_format` on stdout, or to a temporary file for the
+    SEEKABLE_OUTPUT_MUXERS; see _run_ffmpeg.
+    """
+    output_file = None
+    target = "pipe:1"
+    if output_format in SEEKABLE_OUTPUT_MUXERS:
+        output_file = tempfile.NamedTemporaryFile(suffix=f".{output_format}")
+        target = output_file.name
+    try:
+        return _run_ffmpeg(
+            audio_file,
+            ["-vn", *codec_args, "-f", output_format, target],
+            side_output_args=side_output_args,
+            output_file=output_file,
+        )
+    except BaseException:
+        if output_file is not None:
+            output_file.close()
+        raise
+
+
+def transcode_audio(audio_file, output_format="mp3", codec_args=None):
+    """
+    Transcode (or remux, with codec_args=["-c:a", "copy"]) audio through pipes.
+
+    Args:
+        audio_file: Uploaded file, FieldFile or any Django File-like object
+        output_format: ffmpeg muxer name for the output
+        codec_args: Encoder arguments (defaults to MP3 VBR quality 2)
+
+    Returns:
+        file: The encoded output (a SpooledTemporaryFile, or a temporary file
+        for SEEKABLE_OUTPUT_MUXERS), positioned at the start
+
+    Raises:
+        TranscodeError: If ffmpeg fails or produces no output
+    """
+    codec_args = MP3_CODEC_ARGS if codec_args is None else codec_args
+    output, _ = _encode(audio_file, output_format, codec_args)
+    return output
 
-        # Create a ContentFile from the MP3 file - this loads the file into memory
-        # but ensures we don't have issues with closed file handles
-        filename = os.path.splitext(os.path.basename(audio_file.name))[0] + ".mp3"
-        with open(mp3_temp_path, "rb") as f:
-            content = f.read()
 
-        # Create a ContentFile which keeps the data in memory
-        mp3_file = ContentFile(content, name=filename)
+def transcode_with_proxy(audio_file, output_format, codec_args, proxy_format):
+    """
+    Produce the stored rendition and a transcription proxy in one ffmpeg pass.
 
-        # Clean up the MP3 temp file since we've read it into memory
-        if os.path.exists(mp3_temp_path):
-            os.unlink(mp3_temp_path)
-            mp3_temp_path = None
+    The input is read and decoded once; ffmpeg encodes both outputs from it,
+    writing the stored file to stdout (or a temporary file, see
+    SEEKABLE_OUTPUT_MUXERS) and the proxy to a second pipe.
 
-        return mp3_file
+    Args:
+        audio_file: Uploaded file, FieldFile or any Django File-like object
+        output_format: ffmpeg muxer name for the stored output
+        codec_args: Encoder arguments for the stored output
+        proxy_format: Key of TRANSCRIPTION_PROXY_FORMATS
 
+    Returns:
+        tuple: (stored output spool, proxy spool or None if it came out empty)
+    """
+    _, proxy_muxer, proxy_args = TRANSCRIPTION_PROXY_FORMATS[proxy_format]
+    return _encode(
+        audio_file,
+        output_format,
+        codec_args,
+        side_output_args=["-vn", *proxy_args, "-f", proxy_muxer],
+    )
+
+
+def convert_audio_to_mp3(audio_file):
+    """
+    Convert an uploaded audio file to MP3 format using FFmpeg
+
+    Args:
+        audio_file: The uploaded file from request.FILES
+
+    Returns:
+        A Django File object representing the converted MP3 file
+    """
+    try:
+        mp3_data = transcode_audio(audio_file, output_format="mp3")
+    except TranscodeError as e:
+        logger.error(f"FFmpeg conversion error: {e}")
+        return None
     except Exception as e:
         logger.error(f"Error converting audio to MP3: {str(e)}", exc_info=True)
-        # Clean up temp files in case of error
-        if mp3_temp_path and os.path.exists(mp3_temp_path):
-            os.unlink(mp3_temp_path)
-        if tmp_orig_path and os.path.exists(tmp_orig_path):
-            os.unlink(tmp_orig_path)
         return None
+
+    filename = os.path.splitext(os.path.basename(audio_file.name))[0] + ".mp3"
+    return File(mp3_data, name=filename)
+
+
+# --- Probe ---
+
+# Storable formats: (extension, ffmpeg muxer, codecs the container can hold
+# without re-encoding, encoder arguments when used as AUDIO_OUTPUT_FORMAT).
+# MP4 and WAV can't be written to a pipe, so they are passthrough only.
+AUDIO_FORMATS = {
+    "mp3": (".mp3", "mp3", {"mp3"}, MP3_CODEC_ARGS),
+    "m4a": (".m4a", "ipod", {"aac", "alac"}, None),
+    "webm": (
+        ".webm",
+        "webm",
+        {"opus", "vorbis"},
+        ["-acodec", "libopus", "-b:a", "48k"],
+    ),
+    "ogg": (
+        ".ogg",
+        "ogg",
+        {"opus", "vorbis", "flac"},
+        ["-acodec", "libopus", "-b:a", "48k"],
+    ),
+    "flac": (".flac", "flac", {"flac"}, ["-acodec", "flac"]),
+    "wav": (".wav", "wav", {"pcm"}, None),
+}
+
+# Bytes read from the start of the file to sniff the container and codec
+SNIFF_BYTES = 4096
+
+PASSTHROUGH = "passthrough"
+REMUX = "remux"
+TRANSCODE = "transcode"
+
+
+class AudioInfo:
+    """What the probe learned about a recording, without decoding it."""
+
+    def __init__(self, container=None, codec=None, duration=None, bitrate=None):
+        self.container = container  # key of AUDIO_FORMATS, or None if unknown
+        self.codec = codec
+        self.duration = duration  # seconds
+        self.bitrate = bitrate  # bits per second
+
+    @property
+    def extension(self):
+        if self.container in AUDIO_FORMATS:
+            return AUDIO_FORMATS[self.container][0]
+        return None
+
+    def __repr__(self):
+        return (
+            f"AudioInfo(container={self.container!r}, codec={self.codec!r}, "
+            f"duration={self.duration!r}, bitrate={self.bitrate!r})"
+        )
+
+
+# ftyp brands of audio-only MPEG-4 files: iTunes audio, audiobook, protected
+# audio, Flash audio
+AUDIO_MP4_BRANDS = {b"M4A ", b"M4B ", b"M4P ", b"F4A "}
+
+
+def _iso_bmff_is_audio(header):
+    """
+    Whether an ISO BMFF header (MP4, M4A, MOV, 3GP) is that of an audio file.
+
+    Audio brands in the ftyp box say so. Generic brands (isom, mp42, qt...)
+    are used for video as well, so then the track handlers in the moov box
+    decide: sound tracks and no video track. Without the moov box in the
+    header (not faststart) it is not known, and not treated as audio.
+    """
+    size = struct.unpack(">I", header[:4])[0]
+    ftyp = header[8 : min(size, len(header))]
+    # Major brand, minor version, then the compatible brands
+    brands = {ftyp[:4]} | {ftyp[i : i + 4] for i in range(8, len(ftyp) - 3, 4)}
+    if brands & AUDIO_MP4_BRANDS:
+        return True
+    handlers = set()
+    index = header.find(b"hdlr")
+    while index >= 0:
+        # hdlr: version and flags, pre_defined, then the handler type
+        handlers.add(header[index + 12 : index + 16])
+        index = header.find(b"hdlr", index + 4)
+    return b"soun" in handlers and b"vide" not in handlers
+
+
+def sniff_container(header):
+    """
+    Identify the container from the first bytes of a file.
+
+    Returns:
+        tuple: (container, codec) where either may be None when unknown
+    """
+    if header[:3] == b"ID3":
+        return "mp3", "mp3"
+    if len(header) >= 2 and header[0] == 0xFF and (header[1] & 0xE0) == 0xE0:
+        # MPEG audio frame sync; layer bits 01 are Layer III, 00 is raw ADTS AAC
+        if (header[1] & 0x06) == 0x02:
+            return "mp3", "mp3"
+        if (header[1] & 0x06) == 0x00:
+            return None, "aac"
+    if header[4:8] == b"ftyp":
+        # Video MP4/MOV too: those are not stored as .m4a
+        return ("m4a", None) if _iso_bmff_is_audio(header) else (None, None)
+    if header[:4] == b"\x1a\x45\xdf\xa3":  # EBML (Matroska/WebM)
+        if b"A_OPUS" in header:
+            return "webm", "opus"
+        if b"A_VORBIS" in header:
+            return "webm", "vorbis"
+        return "webm", None
+    if header[:4] == b"OggS":
+        if b"OpusHead" in header:
+            return "ogg", "opus"
+        if b"\x01vorbis" in header:
+            return "ogg", "vorbis"
+        if b"\x7fFLAC" in header:
+            return "ogg", "flac"
+        return "ogg", None
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav", "pcm"
+    if header[:4] == b"fLaC":
+        return "flac", "flac"
+    return None, None
+
+
+def _mutagen_info(audio_file):
+    """Duration, bitrate and codec from container headers via mutagen."""
+    try:
+        import mutagen
+    except ImportError:
+        return None, None, None
+
+    fileobj = getattr(audio_file, "file", audio_file)
+    try:
+        fileobj.seek(0)
+        parsed = mutagen.File(fileobj)
+    except Exception as e:
+        logger.info(f"Audio probe: mutagen could not parse {audio_file.name}: {e}")
+        return None, None, None
+    finally:
+        fileobj.seek(0)
+    if parsed is None or parsed.info is None:
+        return None, None, None
+
+    info = parsed.info
+    codec = getattr(info, "codec", None)
+    if codec and codec.startswith("mp4a"):
+        codec = "aac"
+    return (
+        getattr(info, "length", None) or None,
+        getattr(info, "bitrate", None) or None,
+        codec,
+    )
+
+
+def _demux_duration(audio_file, max_duration=None):
+    """
+    Duration by reading packet timestamps with `-c copy` (no decoding).
+
+    Used for containers such as browser-recorded WebM that carry no duration
+    in their headers. With max_duration set, ffmpeg stops reading once that
+    much audio has been seen, so an over-limit file costs at most the limit.
+    """
+    limit_args = ["-t", str(max_duration + 1)] if max_duration else []
+    try:
+        progress, _ = _run_ffmpeg(
+            audio_file,
+            [
+                "-map",
+                "0:a:0",
+                "-c",
+                "copy",
+                *limit_args,
+                "-f",
+                "null",
+                "-progress",
+                "pipe:1",
+                "-",
+            ],
+        )
+    except (TranscodeError, OSError) as e:
+        logger.info(f"Audio probe: could not demux {audio_file.name}: {e}")
+        return None
+
+    out_time_us = None
+    with progress:
+        for line in progress.read().decode("utf-8", errors="replace").splitlines():
+            key, _, value = line.partition("=")
+            if key in ("out_time_us", "out_time_ms") and value.strip().isdigit():
+                # Both keys are reported in microseconds
+                out_time_us = int(value)
+    return out_time_us / 1_000_000 if out_time_us else None
+
+
+# MPEG audio sample rates by version bits (MPEG 2.5, reserved, MPEG 2, MPEG 1)
+_MPEG_SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000),
+}
+
+
+def _mp3_header_duration(header):
+    """Duration from the Xing/Info or VBRI frame count of the first MP3 frame."""
+    offset = 0
+    if header[:3] == b"ID3" and len(header) >= 10:
+        # Syncsafe tag size, plus the 10 byte header and optional footer
+        size = (
+            (header[6] & 0x7F) << 21
+            | (header[7] & 0x7F) << 14
+            | (header[8] & 0x7F) << 7
+            | (header[9] & 0x7F)
+        )
+        offset = 10 + size + (10 if header[5] & 0x10 else 0)
+    if len(header) < offset + 4:
+        return None
+    b1, b2, b3 = header[offset + 1], header[offset + 2], header[offset + 3]
+    if header[offset] != 0xFF or (b1 & 0xE0) != 0xE0 or (b1 & 0x06) != 0x02:
+        return None
+
+    version = (b1 >> 3) & 0x03
+    rate_index = (b2 >> 2) & 0x03
+    if version not in _MPEG_SAMPLE_RATES or rate_index == 3:
+        return None
+    sample_rate = _MPEG_SAMPLE_RATES[version][rate_index]
+    samples_per_frame = 1152 if version == 3 else 576
+    mono = (b3 >> 6) == 0x03
+
+    if version == 3:
+        side_info = 17 if mono else 32
+    else:
+        side_info = 9 if mono else 17
+    xing = offset + 4 + side_info
+    frames = None
+    if header[xing : xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", header[xing + 4 : xing + 8])[0]
+        if flags & 0x01:
+            frames = struct.unpack(">I", header[xing + 8 : xing + 12])[0]
+    elif header[offset + 36 : offset + 40] == b"VBRI":
+        frames = struct.unpack(">I", header[offset + 50 : offset + 54])[0]
+    return frames * samples_per_frame / sample_rate if frames else None
+
+
+def _mp4_header_duration(header):
+    """Duration from the mvhd box, if the moov atom is within the header."""
+    index = header.find(b"mvhd")
+    if index < 0:
+        return None
+    version = header[index + 4]
+    if version == 1:
+        timescale, duration = struct.unpack(">IQ", header[index + 24 : index + 36])
+    else:
+        timescale, duration = struct.unpack(">II", header[index + 16 : index + 24])
+    return duration / timescale if timescale else None
+
+
+def _webm_header_duration(header):
+    """Duration from the Segment Info element (absent in MediaRecorder output)."""
+    index = header.find(b"\x44\x89")
+    if index < 0:
+        return None
+    size_byte = header[index + 2]
+    if size_byte == 0x84:
+        value = struct.unpack(">f", header[index + 3 : index + 7])[0]
+    elif size_byte == 0x88:
+        value = struct.unpack(">d", header[index + 3 : index + 11])[0]
+    else:
+        return None
+
+    timecode_scale = 1_000_000  # nanoseconds per tick (Matroska default)
+    scale_index = header.find(b"\x2a\xd7\xb1")
+    if scale_index >= 0:
+        length = header[scale_index + 3] & 0x0F  # 0x8n: n byte unsigned int
+        if 0 < length <= 8:
+            raw = header[scale_index + 4 : scale_index + 4 + length]
+            timecode_scale = int.from_bytes(raw, "big") or timecode_scale
+    return value * timecode_scale / 1e9 if value > 0 else None
+
+
+def _wav_header_duration(header):
+    """Duration from the fmt byte rate and the declared data chunk size."""
+    position = 12
+    byte_rate = None
+    while position + 8 <= len(header):
+        chunk_id = header[position : position + 4]
+        chunk_size = struct.unpack("<I", header[position + 4 : position + 8])[0]
+        if chunk_id == b"fmt ":
+            byte_rate = struct.unpack("<I", header[position + 16 : position + 20])[0]
+        elif chunk_id == b"data":
+            # 0 / 0xFFFFFFFF mean "unknown" in streamed WAV files
+            if byte_rate and chunk_size not in (0, 0xFFFFFFFF):
+                return chunk_size / byte_rate
+            return None
+        position += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def header_duration(header):
+    """
+    Duration declared in the first bytes of a file, without reading the rest.
+
+    Works on a partial upload: MP3 with a Xing/Info/VBRI frame, MP4 with the
+    moov atom up front (faststart), WebM/Matroska with a Duration element and
+    WAV. Returns None when the header doesn't declare a duration.
+    """
+    container, _ = sniff_container(header)
+    if header[4:8] == b"ftyp":
+        # Video MP4/MOV as well: the mvhd box is the same
+        container = "m4a"
+    parsers = {
+        "mp3": _mp3_header_duration,
+        "m4a": _mp4_header_duration,
+        "webm": _webm_header_duration,
+        "wav": _wav_header_duration,
+    }
+    if container not in parsers:
+        return None
+    try:
+        return parsers[container](header)
+    except (struct.error, IndexError, ZeroDivisionError):
+        return None
+
+
+def _file_size(audio_file):
+    try:
+        return audio_file.size
+    except (AttributeError, OSError, TypeError):
+        return None
+
+
+def probe_audio(audio_file, demux_fallback=True, max_duration=None):
+    """
+    Detect container, codec, duration and bitrate without decoding audio.
+
+    Magic bytes identify the container; mutagen reads duration and bitrate
+    from the headers. When the headers have no duration (WebM from
+    MediaRecorder) the packets are demuxed with `-c copy` if demux_fallback
+    is set.
+
+    Args:
+        audio_file: Uploaded file, FieldFile or any Django File-like object
+        demux_fallback: Whether to demux the file when headers lack a duration
+        max_duration: Stop demuxing past this many seconds; the returned
+            duration is then only known to exceed it
+
+    Returns:
+        AudioInfo: What could be determined (fields may be None)
+    """
+    audio_file.seek(0)
+    header = audio_file.read(SNIFF_BYTES)
+    audio_file.seek(0)
+    container, codec = sniff_container(header)
+
+    duration, bitrate, mutagen_codec = _mutagen_info(audio_file)
+    codec = codec or mutagen_codec
+
+    if duration is None:
+        duration = header_duration(header)
+    if duration is None and demux_fallback:
+        duration = _demux_duration(audio_file, max_duration=max_duration)
+    if bitrate is None and duration:
+        size = _file_size(audio_file)
+        bitrate = int(size * 8 / duration) if size else None
+
+    return AudioInfo(container, codec, duration, bitrate)
+
+
+# --- Split ---
+
+
+@contextmanager
+def local_audio_path(audio_file):
+    """
+    Yield a local path for the audio, copying it to a temp file if needed.
+
+    Several ffmpeg processes can then read (and seek in) the same input
+    concurrently, which a shared file object doesn't allow.
+    """
+    path = _local_path(audio_file)
+    if path:
+        yield path
+        return
+    extension = os.path.splitext(audio_file.name or "")[1].lower()
+    with tempfile.NamedTemporaryFile(suffix=extension) as tmp:
+        for chunk in audio_file.chunks(CHUNK_SIZE):
+            tmp.write(chunk)
+        tmp.flush()
+        audio_file.seek(0)
+        yield tmp.name
+
+
+def detect_silences(audio_path, noise_db=-35, min_silence=0.4):
+    """
+    Find silent stretches with ffmpeg's silencedetect filter.
+
+    Args:
+        audio_path: Local path of the audio
+        noise_db: Level below which audio counts as silence
+        min_silence: Shortest gap (seconds) reported
+
+    Returns:
+        list: (start, end) tuples in seconds
+    """
+    output, _ = _run_ffmpeg(
+        audio_path,
+        [
+            "-vn",
+            "-af",
+            f"silencedetect=noise={noise_db}dB:d={min_silence},"
+            "ametadata=mode=print:file=-",
+            "-f",
+            "null",
+            "-",
+        ],
+        allow_empty=True,
+    )
+    silences = []
+    start = None
+    with output:
+        for line in output.read().decode("utf-8", errors="replace").splitlines():
+            key, _, value = line.partition("=")
+            if key == "lavfi.silence_start":
+                start = max(float(value), 0.0)
+            elif key == "lavfi.silence_end" and start is not None:
+                silences.append((start, float(value)))
+                start = None
+    return silences
+
+
+def plan_segments(duration, silences, target_seconds, overlap_seconds):
+    """
+    Choose segment boundaries close to target_seconds apart, preferring the
+    middle of a silence within a third of the target of each ideal cut.
+
+    Segments overlap by overlap_seconds on each inner boundary so a word cut
+    at a boundary without silence still appears whole in one of them.
+
+    Returns:
+        list: (start, end) tuples in seconds covering the whole duration
+    """
+    window = target_seconds / 3
+    midpoints = [(start + end) / 2 for start, end in silences]
+    cuts = []
+    position = 0.0
+    # Stop early rather than leave a very short last segment
+    while duration - position > target_seconds * 1.5:
+        ideal = position + target_seconds
+        candidates = [
+            m for m in midpoints if abs(m - ideal) <= window and m > position + window
+        ]
+        cut = min(candidates, key=lambda m: abs(m - ideal)) if candidates else ideal
+        cuts.append(cut)
+        position = cut
+
+    bounds = [0.0, *cuts, duration]
+    segments = []
+    for index in range(len(bounds) - 1):
+        start, end = bounds[index], bounds[index + 1]
+        if index > 0:
+            start = max(0.0, start - overlap_seconds)
+        if index < len(bounds) - 2:
+            end = min(duration, end + overlap_seconds)
+        segments.append((start, end))
+    return segments
+
+
+def extract_segment(audio_path, start, end, name, proxy_format="opus"):
+    """
+    Encode [start, end) of a local audio file in a transcription proxy format.
+
+    Returns:
+        File: The segment, named name + the format's extension
+    """
+    extension, muxer, proxy_args = TRANSCRIPTION_PROXY_FORMATS[proxy_format]
+    output, _ = _run_ffmpeg(
+        audio_path,
+        ["-vn", "-t", f"{end - start:.3f}", *proxy_args, "-f", muxer, "pipe:1"],
+        input_args=["-ss", f"{start:.3f}"],
+    )
+    return File(output, name=name + extension)
+
+
+# --- Prepare ---
+
+
+def plan_recording_format(info):
+    """
+    Decide how an upload is stored.
+
+    Returns:
+        tuple: (action, target format) where action is PASSTHROUGH (keep the
+        bytes as-is), REMUX (copy the audio stream into another container)
+        or TRANSCODE (re-encode to AUDIO_OUTPUT_FORMAT)
+    """
+    passthrough_formats = settings.AUDIO_PASSTHROUGH_FORMATS
+    if (
+        info.container in passthrough_formats
+        and info.codec in AUDIO_FORMATS[info.container][2]
+    ):
+        return PASSTHROUGH, info.container
+
+    for target in passthrough_formats:
+        _, muxer, codecs, _ = AUDIO_FORMATS.get(target, (None, None, set(), None))
+        if info.codec in codecs and muxer not in ("ipod", "wav"):
+            return REMUX, target
+
+    return TRANSCODE, settings.AUDIO_OUTPUT_FORMAT
+
+
+def _proxy_file(data, base_name, proxy_format):
+    extension = TRANSCRIPTION_PROXY_FORMATS[proxy_format][0]
+    return File(data, name=f"{base_name}_proxy{extension}")
+
+
+def make_transcription_proxy(audio_file, info=None):
+    """
+    Encode a speech-optimized proxy of a stored recording for transcription.
+
+    Used when the recording itself isn't re-encoded (passthrough). Files that
+    are already at or below PROXY_SKIP_BITRATE are sent as they are.
+
+    Returns:
+        File: The proxy, or None if the recording should be sent as-is
+    """
+    proxy_format = settings.TRANSCRIPTION_PROXY_FORMAT
+    if not proxy_format:
+        return None
+    if info and info.bitrate and info.bitrate <= PROXY_SKIP_BITRATE:
+        return None
+    _, proxy_muxer, proxy_args = TRANSCRIPTION_PROXY_FORMATS[proxy_format]
+    try:
+        data = transcode_audio(
+            audio_file, output_format=proxy_muxer, codec_args=proxy_args
+        )
+    except (TranscodeError, OSError) as e:
+        # Not fatal: the stored recording is transcribed instead
+        logger.warning(f"Audio: could not encode transcription proxy: {e}")
+        return None
+    finally:
+        audio_file.seek(0)
+    base_name = os.path.splitext(os.path.basename(audio_file.name))[0]
+    return _proxy_file(data, base_name, proxy_format)
+
+
+def prepare_recording(audio_file, info=None):
+    """
+    Turn an upload into the file that gets stored, doing as little work as possible.
+
+    Uploads already in an accepted format are kept byte-for-byte, streams in
+    an accepted codec but another container are remuxed with `-c copy`, and
+    everything else is re-encoded to AUDIO_OUTPUT_FORMAT. When
+    TRANSCRIPTION_PROXY_FORMAT is set, a small speech-optimized rendition for
+    the transcription API is produced as well (in the same ffmpeg pass when
+    the recording is remuxed or re-encoded).
+
+    Args:
+        audio_file: The uploaded file from request.FILES (or a FieldFile)
+        info: AudioInfo from an earlier probe_audio() call, to avoid probing twice
+
+    Returns:
+        tuple: (File to store, AudioInfo of that file, transcription proxy File
+        or None), or (None, None, None) on failure
+    """
+    try:
+        info = info or probe_audio(audio_file)
+        action, target = plan_recording_format(info)
+        base_name = os.path.splitext(os.path.basename(audio_file.name))[0]
+        extension, muxer, _, encoder_args = AUDIO_FORMATS[target]
+        proxy_format = settings.TRANSCRIPTION_PROXY_FORMAT
+
+        if action == PASSTHROUGH:
+            logger.info(f"Audio: storing {audio_file.name} as-is ({info})")
+            if isinstance(audio_file, UploadedFile):
+                # Name the stored file after what it really is (e.g. .mp4 -> .m4a)
+                audio_file.name = base_name + extension
+            proxy = make_transcription_proxy(audio_file, info)
+            audio_file.seek(0)
+            return audio_file, info, proxy
+
+        if action == REMUX:
+            logger.info(f"Audio: remuxing {audio_file.name} to {target} ({info})")
+            codec_args = ["-acodec", "copy"]
+        else:
+            if encoder_args is None:
+                raise TranscodeError(f"'{target}' can't be used as AUDIO_OUTPUT_FORMAT")
+            logger.info(f"Audio: transcoding {audio_file.name} to {target} ({info})")
+            codec_args = encoder_args
+
+        data = proxy = None
+        if proxy_format:
+            try:
+                data, proxy_data = transcode_with_proxy(
+                    audio_file, muxer, codec_args, proxy_format
+                )
+            except (TranscodeError, OSError) as e:
+                # As on the passthrough path the proxy is optional: encode
+                # the recording alone, and transcribe it instead
+                logger.warning(
+                    f"Audio: encoding with a transcription proxy failed, "
+                    f"retrying without: {e}"
+                )
+                audio_file.seek(0)
+            else:
+                if proxy_data is not None:
+                    proxy = _proxy_file(proxy_data, base_name, proxy_format)
+        if data is None:
+            data = transcode_audio(
+                audio_file, output_format=muxer, codec_args=codec_args
+            )
+
+        output = File(data, name=base_name + extension)
+        output_info = probe_audio(output)
+        # Encoding doesn't change the length, and the source probe is the one
+        # to trust (the output may have no header, or a partial one)
+        output_info.duration = info.duration or output_info.duration
+        return output, output_info, proxy
+
+    except TranscodeError as e:
+        logger.error(f"FFmpeg conversion error: {e}")
+        return None, None, None
+    except Exception as e:
+        logger.error(f"Error preparing recording: {str(e)}", exc_info=True)
+        return None, None, None
@@ -0,0 +1,272 @@
+# Process-wide registry of external API clients (OpenAI, Gemini, X) with
+# shared connection pools, per-provider concurrency limits, one retry policy
+# and per-call metrics
+import logging
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger("project")
+
+OPENAI = "openai"
+GEMINI = "gemini"
+X = "x"
+
+# HTTP statuses worth retrying: timeouts, throttling and server errors
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+_lock = threading.Lock()
+_pid = None
+_clients = {}
+_semaphores = {}
+_metrics = {}
+
+
+def _reset_after_fork():
+    """Pools and locks must not be shared with a parent process; rebuild them."""
+    global _pid
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _clients.clear()
+        _semaphores.clear()
+
+
+def _get_or_create(key, factory):
+    with _lock:
+        _reset_after_fork()
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = factory()
+        return client
+
+
+def _semaphore(provider):
+    with _lock:
+        _reset_after_fork()
+        semaphore = _semaphores.get(provider)
+        if semaphore is None:
+            limit = settings.PROVIDER_CONCURRENCY.get(provider)
+            semaphore = _semaphores[provider] = (
+                threading.BoundedSemaphore(limit) if limit else None
+            )
+        return semaphore
+
+
+# --- Clients ---
+
+
+def get_openai_client():
+    """
+    The shared OpenAI client.
+
+    It keeps a pool of keep-alive connections (PROVIDER_HTTP_POOL_SIZE). The
+    client's own retries are off; use call() so the registry's policy applies.
+    """
+
+    def factory():
+        import httpx
+        from openai import OpenAI
+
+        pool_size = settings.PROVIDER_HTTP_POOL_SIZE
+        return OpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            max_retries=0,
+            http_client=httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=pool_size, max_keepalive_connections=pool_size
+                ),
+                timeout=httpx.Timeout(settings.PROVIDER_TIMEOUT, connect=10.0),
+            ),
+        )
+
+    return _get_or_create((OPENAI,), factory)
+
+
+def get_gemini_chat(
+    model="gemini-2.0-flash", temperature=0, max_tokens=2000, timeout=30
+):
+    """The shared Gemini chat model for this configuration (via langchain)."""
+
+    def factory():
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return ChatGoogleGenerativeAI(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            max_retries=0,
+        )
+
+    return _get_or_create((GEMINI, model, temperature, max_tokens, timeout), factory)
+
+
+def _x_session():
+    def factory():
+        import requests
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=4, pool_maxsize=settings.PROVIDER_HTTP_POOL_SIZE
+        )
+        session.mount("https://", adapter)
+        return session
+
+    return _get_or_create((X, "session"), factory)
+
+
+def get_x_client(bearer_token):
+    """
+    A tweepy v2 Client for a user's OAuth 2.0 token.
+
+    Clients are cheap and per user, but they all share one pooled HTTP session.
+    """
+    import tweepy
+
+    client = tweepy.Client(bearer_token=bearer_token)
+    client.session = _x_session()
+    return client
+
+
+def get_x_api(consumer_key, consumer_secret, access_token, access_token_secret):
+    """A tweepy v1.1 API (media upload etc.) for OAuth 1.0a user credentials."""
+    import tweepy
+
+    auth = tweepy.OAuth1UserHandler(
+        consumer_key, consumer_secret, access_token, access_token_secret
+    )
+    api = tweepy.API(auth)
+    api.session = _x_session()
+    return api
+
+
+# --- Calls ---
+
+
+def _status_code(exc):
+    """HTTP status of a provider exception, whichever SDK raised it."""
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def _is_transport_error(exc):
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    # SDK connection/timeout errors without importing every SDK here
+    name = type(exc).__name__
+    return any(part in name for part in ("Connection", "Timeout", "Transport"))
+
+
+def is_retryable(exc, idempotent=True):
+    """
+    Whether a failed call may be repeated.
+
+    Throttling (429) is always retried since the request was refused. Server
+    errors and dropped connections are only retried for idempotent calls: the
+    request may have been processed (e.g. a tweet posted) before it failed.
+    """
+    status = _status_code(exc)
+    if status == 429:
+        return True
+    if not idempotent:
+        return False
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    return _is_transport_error(exc)
+
+
+def retry_delay(attempt):
+    """Exponential backoff with full jitter for the given retry (1-based)."""
+    ceiling = min(
+        settings.PROVIDER_RETRY_MAX_DELAY,
+        settings.PROVIDER_RETRY_BASE_DELAY * (2 ** (attempt - 1)),
+    )
+    return random.uniform(0, ceiling)
+
+
+def _record(provider, operation, seconds, error=None, retried=False):
+    with _lock:
+        stats = _metrics.setdefault(
+            (provider, operation),
+            {"calls": 0, "errors": 0, "retries": 0, "seconds": 0.0, "max_seconds": 0.0},
+        )
+        if retried:
+            stats["retries"] += 1
+            return
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        if error is not None:
+            stats["errors"] += 1
+
+
+def call(provider, operation, func, *args, idempotent=True, **kwargs):
+    """
+    Run one provider API call under the registry's limits and retry policy.
+
+    Waits for a slot in the provider's concurrency limit, calls func, and
+    retries transient failures (see is_retryable) up to PROVIDER_MAX_RETRIES
+    times with jittered exponential backoff. The slot is released while
+    backing off. Latency and errors are recorded per (provider, operation).
+
+    Args:
+        provider: OPENAI, GEMINI or X
+        operation: Short label for metrics and logs, e.g. "embeddings"
+        func: The SDK method to call
+        idempotent: Whether repeating the call after a server error is safe
+
+    Returns:
+        Whatever func returns; the last exception is raised when retries run out
+    """
+    semaphore = _semaphore(provider)
+    attempt = 0
+    while True:
+        attempt += 1
+        if semaphore is not None:
+            semaphore.acquire()
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            if attempt <= settings.PROVIDER_MAX_RETRIES and is_retryable(e, idempotent):
+                delay = retry_delay(attempt)
+                _record(provider, operation, elapsed, retried=True)
+                logger.warning(
+                    f"{provider} {operation} failed ({e}), retry {attempt} in {delay:.1f}s"
+                )
+            else:
+                _record(provider, operation, elapsed, error=e)
+                raise
+        else:
+            _record(provider, operation, time.perf_counter() - start)
+            return result
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+        time.sleep(delay)
+
+
+def provider_metrics():
+    """
+    Per-call metrics for this process.
+
+    Returns:
+        dict: {"provider.operation": {calls, errors, retries, seconds, max_seconds, avg_seconds}}
+    """
+    with _lock:
+        snapshot = {f"{p}.{op}": dict(stats) for (p, op), stats in _metrics.items()}
+    for stats in snapshot.values():
+        stats["avg_seconds"] = (
+            stats["seconds"] / stats["calls"] if stats["calls"] else 0.0
+        )
+    return snapshot
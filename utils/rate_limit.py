@@ -0,0 +1,31 @@
+# Thread-safe token bucket for pacing calls to external APIs
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` acquisitions per second on average, with
+    bursts of up to `burst`. acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)